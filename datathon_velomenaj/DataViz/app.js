@@ -7,6 +7,36 @@ L.tileLayer('https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png', {
     maxZoom: 20
 }).addTo(map);
 
+// ========================
+// DATA SOURCE
+// ========================
+// ?api=http://127.0.0.1:8765 : couches lues par emprise via src/serving/server.py
+// (seule la vue courante est chargée) ; sinon fichiers statiques data/*.geojson.
+const API = new URLSearchParams(window.location.search).get('api');
+
+function layerUrl(name) {
+    if (!API) return `data/${name}.geojson`;
+    return `${API}/layers/${name}?bbox=${map.getBounds().pad(0.25).toBBoxString()}`;
+}
+
+function refreshLayer(name) {
+    fetch(layerUrl(name))
+        .then(r => r.json())
+        .then(data => {
+            if (name === 'amenities') amenitiesData = data;
+            layers[name].clearLayers();
+            layers[name].addData(data);
+        });
+}
+
+if (API) {
+    map.on('moveend', () => {
+        ['amenities', 'counters', 'predictions', 'tension'].forEach(name => {
+            if (layers[name]) refreshLayer(name);
+        });
+    });
+}
+
 // ========================
 // UTILS
 // ========================
@@ -70,7 +100,7 @@ let selectedYear = 'Global'; // Default
 let amenitiesData = null; // Store data for re-styling
 
 // 1. AMENITIES (Scored)
-fetch('data/amenities.geojson')
+fetch(layerUrl('amenities'))
     .then(r => r.json())
     .then(data => {
         amenitiesData = data;
@@ -115,7 +145,7 @@ fetch('data/amenities.geojson')
     });
 
 // 2. COUNTERS (Volume) - Circle Shape
-fetch('data/counters.geojson')
+fetch(layerUrl('counters'))
     .then(r => r.json())
     .then(data => {
         layers.counters = L.geoJSON(data, {
@@ -142,7 +172,7 @@ fetch('data/counters.geojson')
     });
 
 // 3. PREDICTIONS - Star Shape (Colored)
-fetch('data/predictions.geojson')
+fetch(layerUrl('predictions'))
     .then(r => r.json())
     .then(data => {
         console.log("APP.JS: LOADING PREDICTIONS WITH GEOGRAPHIC SQUARES (v3)");
@@ -176,7 +206,7 @@ fetch('data/predictions.geojson')
     });
 
 // 4. TENSION ZONES (Gap Analysis)
-fetch('data/tension.geojson')
+fetch(layerUrl('tension'))
     .then(r => r.json())
     .then(data => {
         layers.tension = L.geoJSON(data, {
@@ -220,7 +250,7 @@ if (btnCloseStats) {
 function loadStats() {
     if (statsChart) return; // Already loaded
 
-    fetch('data/stats.json')
+    fetch(API ? `${API}/stats` : 'data/stats.json')
         .then(r => r.json())
         .then(data => {
             // Data prep
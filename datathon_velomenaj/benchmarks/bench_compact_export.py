@@ -0,0 +1,93 @@
+"""
+Benchmark: export GeoJSON vs format binaire compact (src/export/compact_writer.py)
+──────────────────────────────────────────────────────────────────────────────────
+Même table synthétique que bench_geojson_export (lignes autour de Lyon), avec
+une carte `yearly_scores` par feature comme amenities.geojson. Compare :
+  - taille transférée (brute et gzip, comme servie par un serveur HTTP) ;
+  - durée d'écriture ;
+  - durée de lecture côté client (json.loads vs lecture des sections binaires).
+
+Usage (depuis la racine du projet):
+  python benchmarks/bench_compact_export.py [--n 100000] [--vertices 20] [--years 12]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.bench_geojson_export import make_table
+from src.export.compact_writer import read_compact, write_compact
+from src.export.geojson_writer import write_geojson
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def sizes(*paths):
+    raw = sum(os.path.getsize(p) for p in paths)
+    zipped = 0
+    for p in paths:
+        with open(p, "rb") as f:
+            zipped += len(gzip.compress(f.read(), compresslevel=6))
+    return raw, zipped
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--vertices", type=int, default=20)
+    parser.add_argument("--years", type=int, default=12)
+    parser.add_argument("--precision", type=int, default=6)
+    args = parser.parse_args()
+
+    df = make_table(args.n, args.vertices)
+    rng = np.random.default_rng(0)
+    years = [str(2014 + i) for i in range(args.years)]
+    df["yearly_scores"] = [
+        {y: round(float(s), 6) for y, s in zip(years, row) if s > 0.2}
+        for row in rng.random((args.n, args.years))
+    ]
+    props = ["amenagement_id", "score", "nom", "yearly_scores"]
+
+    print(f"=== Export: {args.n:,} lines ({args.vertices} vertices), {args.years} yearly scores ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        geojson_path = os.path.join(tmp, "amenities.geojson")
+        basename = os.path.join(tmp, "amenities")
+
+        _, t_write_geo = timed(lambda: write_geojson(
+            df, geojson_path, properties=props, geometry_col="geometry_coords", precision=args.precision))
+        _, t_write_bin = timed(lambda: write_compact(
+            df, basename, properties=props, geometry_col="geometry_coords"))
+
+        def load_geojson():
+            with open(geojson_path, encoding="utf-8") as f:
+                return json.load(f)
+
+        _, t_read_geo = timed(load_geojson)
+        (_, coords, _, _, _), t_read_bin = timed(lambda: read_compact(f"{basename}.json"))
+
+        raw_geo, gz_geo = sizes(geojson_path)
+        raw_bin, gz_bin = sizes(f"{basename}.bin", f"{basename}.json")
+
+    print(f"  {'':<16} {'raw MB':>9} {'gzip MB':>9} {'write s':>9} {'parse s':>9}")
+    print(f"  {'GeoJSON':<16} {raw_geo / 1e6:9.2f} {gz_geo / 1e6:9.2f} {t_write_geo:9.2f} {t_read_geo:9.2f}")
+    print(f"  {'compact':<16} {raw_bin / 1e6:9.2f} {gz_bin / 1e6:9.2f} {t_write_bin:9.2f} {t_read_bin:9.2f}")
+    print(f"  ratio: raw x{raw_geo / raw_bin:.1f} | gzip x{gz_geo / gz_bin:.1f} | parse x{t_read_geo / t_read_bin:.1f}")
+    print(f"  vertices decoded: {len(coords):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: export GeoJSON — ancien `save_geojson` (iterrows) vs writer en flux
+───────────────────────────────────────────────────────────────────────────────
+Génère une table synthétique (points ou lignes autour de Lyon), l'exporte avec
+les deux implémentations et affiche durée, débit et taille du fichier.
+
+Usage (depuis la racine du projet):
+  python benchmarks/bench_geojson_export.py [--n 100000] [--vertices 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.export.geojson_writer import write_geojson
+
+
+def legacy_save_geojson(df_pandas, filename, lat_col="lat", lon_col="lon", properties=[], geometry_col=None):
+    """Copie de l'ancien save_geojson (scripts/prepare_dataviz_data.py), référence du benchmark."""
+    features = []
+
+    for _, row in df_pandas.iterrows():
+        props = {prop: row[prop] for prop in properties if prop in row and pd.notnull(row[prop])}
+
+        if geometry_col and geometry_col in row and row[geometry_col]:
+            coords = row[geometry_col]
+            if isinstance(coords, str):
+                try:
+                    coords = json.loads(coords)
+                except:
+                    continue
+
+            geometry = {"type": "LineString", "coordinates": coords}
+        else:
+            if pd.isnull(row[lat_col]) or pd.isnull(row[lon_col]):
+                continue
+            geometry = {"type": "Point", "coordinates": [float(row[lon_col]), float(row[lat_col])]}
+
+        features.append({"type": "Feature", "properties": props, "geometry": geometry})
+
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f, indent=None)
+
+
+def make_table(n, vertices, seed=42):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "amenagement_id": [f"pvo_patrimoine_voirie.pvoamenagementcyclable.{i}" for i in range(n)],
+        "score": rng.random(n).round(6),
+        "nom": rng.choice(["Berges du Rhône", "Rue Garibaldi", "Cours Lafayette"], n),
+        "lat": 45.70 + rng.random(n) * 0.15,
+        "lon": 4.75 + rng.random(n) * 0.20,
+    })
+    if vertices:
+        steps = rng.normal(0, 0.0003, size=(n, vertices, 2)).cumsum(axis=1)
+        coords = steps + df[["lon", "lat"]].to_numpy()[:, None, :]
+        df["geometry_coords"] = list(coords.tolist())
+    return df
+
+
+def run(label, fn, path, n):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(path) / 1e6
+    print(f"  {label:<28} {elapsed:8.2f}s  {n / elapsed:12,.0f} features/s  {size_mb:8.1f} MB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--vertices", type=int, default=20, help="0 = points")
+    parser.add_argument("--precision", type=int, default=6)
+    args = parser.parse_args()
+
+    df = make_table(args.n, args.vertices)
+    props = ["amenagement_id", "score", "nom"]
+    geometry_col = "geometry_coords" if args.vertices else None
+    kind = f"lines ({args.vertices} vertices)" if args.vertices else "points"
+
+    print(f"=== GeoJSON export: {args.n:,} features, {kind} ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.geojson")
+        stream_path = os.path.join(tmp, "stream.geojson")
+        rounded_path = os.path.join(tmp, "stream_rounded.geojson")
+
+        t_legacy = run("legacy save_geojson", lambda: legacy_save_geojson(
+            df, legacy_path, properties=props, geometry_col=geometry_col), legacy_path, args.n)
+        t_stream = run("write_geojson", lambda: write_geojson(
+            df, stream_path, properties=props, geometry_col=geometry_col), stream_path, args.n)
+        run(f"write_geojson (precision={args.precision})", lambda: write_geojson(
+            df, rounded_path, properties=props, geometry_col=geometry_col, precision=args.precision),
+            rounded_path, args.n)
+
+        with open(legacy_path, encoding="utf-8") as a, open(stream_path, encoding="utf-8") as b:
+            identical = a.read() == b.read()
+
+    print(f"  speedup: x{t_legacy / t_stream:.1f} | identical output: {identical}")
+
+
+if __name__ == "__main__":
+    main()
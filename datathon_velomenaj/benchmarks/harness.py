@@ -0,0 +1,444 @@
+"""
+Benchmark: suite reproductible des chemins chauds (liaison, flux, scoring, export)
+─────────────────────────────────────────────────────────────────────────────────
+Génère des entrées synthétiques (graine fixe) à une échelle paramétrable et
+mesure, pour chaque cas, la durée (min et médiane sur --repeats) et la
+mémoire de pointe :
+  - linking  : index spatial + liaison points ↔ aménagements (src/spatial_usage/linking.py)
+  - flux     : flux pondéré gold_flow_amenagement_daily, produit creux × dense (linking.flow_daily)
+  - scoring  : moments incrémentaux + scores globaux (src/scoring/pipeline.py)
+  - scan     : scores par relecture complète, backend local (scan_scores)
+  - ranking  : percent_rank par année, comme le scoring annuel de Scoring2
+  - export   : GeoJSON en flux (src/export/geojson_writer.py)
+  - query_daily / query_compact : listing + requêtes par compteur et par mois
+    sur les mesures en partitions date= puis compactées (src/ingestion_silver/compaction.py)
+  - window_parquet / window_store : moyennes fenêtrées (10 aménagements sur un an,
+    tous sur un mois) relues en Parquet puis depuis le stock dense (src/scoring/flow_store.py)
+
+Chaque cas tourne dans un processus neuf : peak_rss_mb est le pic RSS de ce
+processus (génération des entrées comprise), peak_traced_mb le pic des
+allocations Python/NumPy pendant le cas seul (tracemalloc ; les tampons Arrow
+n'y figurent pas).
+
+Chaque exécution ajoute une ligne JSON à l'historique (commit git, versions,
+échelle, résultats) et se compare à la dernière exécution de même échelle.
+
+Usage (depuis la racine du projet):
+  python benchmarks/harness.py [--scale small|medium|large] [--cases linking flux]
+  python benchmarks/harness.py --points 1000 --amenagements 20000 --vertices 30 --days 365
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.common.backend import LocalBackend
+from src.common.geometry import MULTILINESTRING_TYPE
+from src.export.geojson_writer import write_geojson
+from src.ingestion_silver.compaction import compact, measures_filter
+from src.scoring.flow_store import FlowStore, update as update_flow_store
+from src.scoring.pipeline import ScoreState, compute_scores, fold_files, list_input_files, scan_scores
+from src.scoring.ranking import grouped_percent_rank
+from src.spatial_usage.linking import AmenagementIndex, flow_daily, link_points
+
+HISTORY_FILE = project_root / "benchmarks" / "results" / "history.jsonl"
+
+SCALES = {
+    "small": {"points": 200, "amenagements": 2_000, "vertices": 20, "days": 90},
+    "medium": {"points": 500, "amenagements": 10_000, "vertices": 30, "days": 365},
+    "large": {"points": 2_000, "amenagements": 50_000, "vertices": 40, "days": 1_825},
+}
+
+BBOX = (4.75, 45.70, 4.95, 45.85)  # Métropole de Lyon (lon/lat)
+BUFFER_M = 100.0
+SEED = 42
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. ENTRÉES SYNTHÉTIQUES
+# ═════════════════════════════════════════════════════════════
+
+def make_amenagements(n, vertices, seed=SEED):
+    """Table Arrow amenagement_id, nom, score, geometry (MultiLineString, marche aléatoire ~30 m)."""
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(BBOX[:2], BBOX[2:], size=(n, 1, 2))
+    coords = start + rng.normal(0, 0.0003, size=(n, vertices, 2)).cumsum(axis=1)
+    return pa.table({
+        "amenagement_id": pa.array([str(i) for i in range(n)]),
+        "nom": pa.array(rng.choice(["Berges du Rhône", "Rue Garibaldi", "Cours Lafayette"], n)),
+        "score": pa.array(rng.random(n).round(6)),
+        "geometry": pa.array(coords[:, None, :, :].tolist(), type=MULTILINESTRING_TYPE),
+    })
+
+
+def make_points(n, seed=SEED):
+    rng = np.random.default_rng(seed + 1)
+    return pd.DataFrame({
+        "point_id": [str(100_000 + i) for i in range(n)],
+        "point_type": rng.choice(["auto", "manual"], n, p=[0.9, 0.1]),
+        "lat": rng.uniform(BBOX[1], BBOX[3], n),
+        "lon": rng.uniform(BBOX[0], BBOX[2], n),
+    })
+
+
+def make_measures(points, days, seed=SEED):
+    """Une mesure par point et par jour (~5 % de jours manquants)."""
+    rng = np.random.default_rng(seed + 2)
+    n = len(points) * days
+    dates = np.datetime64("2020-01-01") + np.tile(np.arange(days), len(points))
+    measures = pd.DataFrame({
+        "point_id": np.repeat(points["point_id"].to_numpy(), days),
+        "date": dates.astype("datetime64[D]"),
+        "flux": rng.gamma(2.0, 300.0, n).round(),
+    })
+    return measures[rng.random(n) > 0.05].reset_index(drop=True)
+
+
+def make_flow_daily(n_amenagements, days, seed=SEED):
+    """gold_flow_amenagement_daily : une ligne par aménagement et par jour."""
+    rng = np.random.default_rng(seed + 3)
+    n = n_amenagements * days
+    return pd.DataFrame({
+        "amenagement_id": np.repeat(np.arange(n_amenagements).astype(str), days),
+        "date": np.datetime64("2020-01-01") + np.tile(np.arange(days), n_amenagements).astype("timedelta64[D]"),
+        "flux_estime": rng.gamma(2.0, 300.0, n).round(2),
+    })
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. CAS (préparation non chronométrée, puis exécution)
+# ═════════════════════════════════════════════════════════════
+
+def _links(scale):
+    amenagements = make_amenagements(scale["amenagements"], scale["vertices"])
+    points = make_points(scale["points"])
+    index = AmenagementIndex.from_dataframe(amenagements, cell_m=BUFFER_M)
+    return link_points(points, index, BUFFER_M), points
+
+
+def setup_linking(scale, tmp):
+    return make_amenagements(scale["amenagements"], scale["vertices"]), make_points(scale["points"])
+
+
+def run_linking(ctx):
+    amenagements, points = ctx
+    index = AmenagementIndex.from_dataframe(amenagements, cell_m=BUFFER_M)
+    return len(points), len(link_points(points, index, BUFFER_M))
+
+
+def setup_flux(scale, tmp):
+    links, points = _links(scale)
+    return make_measures(points, scale["days"]), links
+
+
+def run_flux(ctx):
+    measures, links = ctx
+    return len(measures), len(flow_daily(measures, links))
+
+
+def _write_flow(scale, tmp):
+    path = os.path.join(tmp, "gold_flow_amenagement_daily")
+    os.makedirs(path, exist_ok=True)
+    table = pa.Table.from_pandas(make_flow_daily(scale["amenagements"], scale["days"]), preserve_index=False)
+    pq.write_table(table, os.path.join(path, "part-0.parquet"))
+    return path, table.num_rows
+
+
+def setup_scoring(scale, tmp):
+    return _write_flow(scale, tmp)[0]
+
+
+def run_scoring(path):
+    state = ScoreState()
+    n_rows = fold_files(state, path, sorted(list_input_files(path)))
+    return n_rows, int(compute_scores(state)["score"].notna().sum())
+
+
+def setup_scan(scale, tmp):
+    return _write_flow(scale, tmp)
+
+
+def run_scan(ctx):
+    path, n_rows = ctx
+    scores = scan_scores(LocalBackend(), path)
+    return n_rows, int(scores["score"].notna().sum())
+
+
+def setup_ranking(scale, tmp):
+    flow = make_flow_daily(scale["amenagements"], scale["days"])
+    flow["year"] = flow["date"].dt.year
+    return flow
+
+
+def run_ranking(flow):
+    yearly = flow.groupby(["amenagement_id", "year"], as_index=False)["flux_estime"].mean()
+    yearly["usage_score"] = grouped_percent_rank(yearly, "flux_estime", ["year"])
+    return len(flow), len(yearly)
+
+
+def setup_export(scale, tmp):
+    table = make_amenagements(scale["amenagements"], scale["vertices"])
+    return table.to_pandas(), os.path.join(tmp, "amenities.geojson")
+
+
+def run_export(ctx):
+    df, path = ctx
+    n = write_geojson(df, path, properties=["amenagement_id", "score", "nom"], geometry_col="geometry", precision=6)
+    return len(df), n
+
+
+def _write_daily_measures(scale, tmp):
+    """Mesures union au format date=YYYY-MM-DD (un fichier par jour), comme Spark .partitionBy("date")."""
+    points = make_points(scale["points"])
+    measures = make_measures(points, scale["days"]).merge(points, on="point_id")
+    measures["date"] = measures["date"].dt.strftime("%Y-%m-%d")
+    path = os.path.join(tmp, "silver_measures_union")
+    for date, part in measures.groupby("date"):
+        os.makedirs(os.path.join(path, f"date={date}"))
+        pq.write_table(pa.Table.from_pandas(part.drop(columns="date"), preserve_index=False),
+                       os.path.join(path, f"date={date}", "part-0.parquet"))
+    return path, points, len(measures)
+
+
+def _measure_queries(path, points, n_rows):
+    """Listing + requête par compteurs (10 points, tout l'historique) + requête par période (1 mois) + scan 2 colonnes."""
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    ids = points["point_id"].iloc[::max(1, len(points) // 10)][:10].tolist()
+    by_counter = dataset.to_table(filter=ds.field("point_id").isin(ids)).num_rows
+    if "year" in dataset.schema.names:
+        month = measures_filter(start="2020-03-01", end="2020-03-31")
+    else:
+        month = (ds.field("date") >= "2020-03-01") & (ds.field("date") <= "2020-03-31")
+    by_period = dataset.to_table(filter=month).num_rows
+    dataset.to_table(columns=["point_id", "flux"])
+    return n_rows, by_counter + by_period
+
+
+def setup_query_daily(scale, tmp):
+    return _write_daily_measures(scale, tmp)
+
+
+def setup_query_compact(scale, tmp):
+    path, points, n_rows = _write_daily_measures(scale, tmp)
+    compact(path, path + "_compact")
+    return path + "_compact", points, n_rows
+
+
+def run_query(ctx):
+    return _measure_queries(*ctx)
+
+
+def _window_flow(scale, tmp):
+    flow = make_flow_daily(scale["amenagements"], scale["days"])
+    flow["n_channels"] = 1
+    path = os.path.join(tmp, "gold_flow_amenagement_daily")
+    os.makedirs(path)
+    pq.write_table(pa.Table.from_pandas(flow, preserve_index=False), os.path.join(path, "part-0.parquet"))
+    ids = flow["amenagement_id"].drop_duplicates().iloc[::97][:10].tolist()
+    return path, ids, len(flow)
+
+
+# Requêtes fenêtrées : moyenne de 10 aménagements sur un an, puis tous les aménagements sur un mois
+WINDOWS = (("2020-03-01", "2021-02-28"), ("2020-06-01", "2020-06-30"))
+
+
+def setup_window_parquet(scale, tmp):
+    return _window_flow(scale, tmp)
+
+
+def run_window_parquet(ctx):
+    path, ids, n_rows = ctx
+    (s0, e0), (s1, e1) = WINDOWS
+    daily = pd.read_parquet(path, columns=["amenagement_id", "date", "flux_estime"])
+    one = daily[daily["amenagement_id"].isin(ids) & daily["date"].between(s0, e0)]
+    month = daily[daily["date"].between(s1, e1)]
+    out = one.groupby("amenagement_id")["flux_estime"].mean()
+    out_month = month.groupby("amenagement_id")["flux_estime"].mean()
+    return n_rows, len(out) + len(out_month)
+
+
+def setup_window_store(scale, tmp):
+    path, ids, n_rows = _window_flow(scale, tmp)
+    update_flow_store(path, os.path.join(tmp, "gold_flow_store"))
+    return os.path.join(tmp, "gold_flow_store"), ids, n_rows
+
+
+def run_window_store(ctx):
+    path, ids, n_rows = ctx
+    (s0, e0), (s1, e1) = WINDOWS
+    store = FlowStore(path)
+    return n_rows, len(store.mean(s0, e0, ids)) + len(store.mean(s1, e1))
+
+
+CASES = {
+    "linking": (setup_linking, run_linking),
+    "flux": (setup_flux, run_flux),
+    "scoring": (setup_scoring, run_scoring),
+    "scan": (setup_scan, run_scan),
+    "ranking": (setup_ranking, run_ranking),
+    "export": (setup_export, run_export),
+    "query_daily": (setup_query_daily, run_query),
+    "query_compact": (setup_query_compact, run_query),
+    "window_parquet": (setup_window_parquet, run_window_parquet),
+    "window_store": (setup_window_store, run_window_store),
+}
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. MESURES
+# ═════════════════════════════════════════════════════════════
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == "darwin" else rss / 1e3  # octets (macOS) / Ko (Linux)
+
+
+def measure_case(name, scale, repeats):
+    """Exécuté dans un processus neuf : durées, lignes, pics mémoire d'un cas."""
+    setup, run = CASES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = setup(scale, tmp)
+
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            rows_in, rows_out = run(ctx)
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        run(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "seconds_min": round(min(times), 4),
+        "seconds_median": round(float(np.median(times)), 4),
+        "repeats": repeats,
+        "rows_in": int(rows_in),
+        "rows_out": int(rows_out),
+        "rows_per_s": round(rows_in / min(times)) if min(times) > 0 else None,
+        "peak_traced_mb": round(peak / 1e6, 1),
+        "peak_rss_mb": round(_max_rss_mb(), 1),
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=project_root, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+    }
+
+
+# ═════════════════════════════════════════════════════════════
+# 4. HISTORIQUE ET COMPARAISON
+# ═════════════════════════════════════════════════════════════
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, record):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def previous_run(history, scale):
+    """Dernière exécution à la même échelle (même machine si possible)."""
+    same = [r for r in history if r["scale"] == scale]
+    same_host = [r for r in same if r["env"].get("host") == platform.node()]
+    return (same_host or same or [None])[-1]
+
+
+def print_report(record, baseline):
+    ref = f"vs {(baseline['env'].get('commit') or '?')[:8]}" if baseline else ""
+    print(f"  {'case':<14} {'min s':>9} {'median s':>9} {'rows in':>12} {'rows out':>11} "
+          f"{'traced MB':>10} {'RSS MB':>8}  {ref}")
+    for name, r in record["results"].items():
+        line = (f"  {name:<14} {r['seconds_min']:9.3f} {r['seconds_median']:9.3f} {r['rows_in']:12,} "
+                f"{r['rows_out']:11,} {r['peak_traced_mb']:10.1f} {r['peak_rss_mb']:8.1f}")
+        old = baseline["results"].get(name) if baseline else None
+        if old and old["seconds_min"] > 0:
+            ratio = r["seconds_min"] / old["seconds_min"]
+            flag = " ⚠️" if ratio > 1.2 else ""
+            line += f"  x{ratio:.2f} time, {r['peak_traced_mb'] - old['peak_traced_mb']:+.1f} MB{flag}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks reproductibles des chemins chauds")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for key in ("points", "amenagements", "vertices", "days"):
+        parser.add_argument(f"--{key}", type=int, help=f"remplace `{key}` de l'échelle")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--history", default=str(HISTORY_FILE))
+    parser.add_argument("--no-save", action="store_true", help="ne pas ajouter à l'historique")
+    args = parser.parse_args()
+
+    scale = dict(SCALES[args.scale])
+    scale.update({k: getattr(args, k) for k in scale if getattr(args, k) is not None})
+
+    print(f"=== Benchmarks: {scale} ===")
+    results = {}
+    for name in args.cases:
+        # Processus neuf par cas : pic RSS isolé, pas de cache d'un cas à l'autre
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results[name] = pool.submit(measure_case, name, scale, args.repeats).result()
+        print(f"  ✓ {name:<14} {results[name]['seconds_min']:.3f}s")
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "env": environment(),
+        "scale": scale,
+        "repeats": args.repeats,
+        "results": results,
+    }
+    baseline = previous_run(load_history(args.history), scale)
+    print_report(record, baseline)
+
+    if not args.no_save:
+        append_history(args.history, record)
+        print(f"✅ Appended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,54 @@
-import time
+"""
+Script: Géocodage des sites de comptage manuel
+──────────────────────────────────────────────
+Input:
+  - data/bronze/comptage_manuel/comptage_manuel_clean.csv
+Output:
+  - data/bronze/comptage_manuel/manual_sites_geo.csv
+  - exports/leaflet/manual_sites_preview.html
+
+Cache persistant (SQLite, data/bronze/comptage_manuel/geocode_cache.sqlite) :
+  - clé = (endpoint, requête normalisée (casse, accents composés, espaces)) :
+    un serveur local de test n'alimente jamais les résultats de production ;
+  - statut ok / ok_fallback / hardcoded / not_found, avec une durée de
+    validité (TTL) par statut ; les erreurs réseau ne sont jamais mises
+    en cache.
+Seuls les sites absents du cache (ou expirés) sont géocodés, par un pool
+de workers qui partagent une limite de débit globale (1 requête/s par
+défaut, politique Nominatim). L'endpoint est configurable (--endpoint ou
+GEOCODE_URL) pour tester contre un serveur HTTP local.
+
+Usage:
+  python scripts/geocode_manual_sites.py [--workers 4] [--rate 1.0]
+         [--endpoint http://localhost:8080/search] [--refresh] [--no-map]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
 import sys
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-import folium
-import os 
-
 import pandas as pd
 import requests
 
 MANUAL_COUNTS_CSV = "data/bronze/comptage_manuel/comptage_manuel_clean.csv"
 OUT_CSV = "data/bronze/comptage_manuel/manual_sites_geo.csv"
+CACHE_PATH = "data/bronze/comptage_manuel/geocode_cache.sqlite"
+MAP_OUT = "exports/leaflet/manual_sites_preview.html"
+
+# Durée de validité du cache par statut (jours)
+CACHE_TTL_DAYS = {
+    "ok": 180,
+    "ok_fallback": 180,
+    "hardcoded": 30,
+    "not_found": 30,
+}
 
 # ----------------------------
 # Helpers (logs)
@@ -46,147 +85,276 @@ HARDCODED_COORDS = {
     "Quai Clémenceau/Castellane": (45.799144, 4.846415),
 }
 
+# ----------------------------
+# Cache persistant
+# ----------------------------
+def normalize_query(q: str) -> str:
+    """Clé de cache : NFC, minuscules, espaces normalisés."""
+    q = unicodedata.normalize("NFC", q).casefold()
+    return " ".join(q.replace(",", " , ").split()).replace(" , ", ", ")
+
+
+def normalize_endpoint(url: str) -> str:
+    """Endpoint dans la clé de cache : sans espaces ni « / » final."""
+    return url.strip().rstrip("/")
+
+
+class GeocodeCache:
+    """
+    Cache SQLite thread-safe : (endpoint, requête normalisée) → résultat du site.
+
+    Les entrées de l'ancienne table `geocode` (clé sans endpoint) ne sont
+    pas reprises : leur provenance est inconnue.
+    """
+
+    def __init__(self, path, endpoint, ttl_days=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.endpoint = normalize_endpoint(endpoint)
+        self.ttl_days = dict(CACHE_TTL_DAYS, **(ttl_days or {}))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode_by_endpoint ("
+            " endpoint TEXT NOT NULL, query TEXT NOT NULL, status TEXT NOT NULL, result TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL, PRIMARY KEY (endpoint, query))"
+        )
+        self._conn.commit()
+
+    def get(self, query):
+        """Résultat en cache et encore valide, sinon None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result, fetched_at FROM geocode_by_endpoint WHERE endpoint = ? AND query = ?",
+                (self.endpoint, normalize_query(query)),
+            ).fetchone()
+        if row is None:
+            return None
+        status, result, fetched_at = row
+        if time.time() - fetched_at > self.ttl_days.get(status, 0) * 86400:
+            return None
+        return json.loads(result)
+
+    def put(self, query, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_by_endpoint (endpoint, query, status, result, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.endpoint, normalize_query(query), result["status"],
+                 json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+# ----------------------------
+# Limite de débit globale
+# ----------------------------
+class RateLimiter:
+    """Au plus `rate` requêtes par seconde, tous threads confondus."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
 # ----------------------------
 # Nominatim (avec retry)
 # ----------------------------
-URL = "https://nominatim.openstreetmap.org/search"
+URL = os.environ.get("GEOCODE_URL", "https://nominatim.openstreetmap.org/search")
 HEADERS = {"User-Agent": "lyon-cycling-project/1.0 (contact: younessetahiri01@gmail.com)"}
 
-def nominatim_search(session: requests.Session, q: str, limit: int = 3, timeout: int = 20, retries: int = 2):
+_local = threading.local()
+
+
+def _session():
+    # requests.Session n'est pas garanti thread-safe : une session par worker
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+        _local.session.headers.update(HEADERS)
+    return _local.session
+
+
+def nominatim_search(limiter: RateLimiter, q: str, url: str = URL, limit: int = 3, timeout: int = 20,
+                     retries: int = 2):
     params = {"q": q, "format": "json", "limit": limit}
     last_err = None
     for attempt in range(retries + 1):
+        limiter.wait()
         try:
-            r = session.get(URL, params=params, timeout=timeout)
+            r = _session().get(url, params=params, timeout=timeout)
             r.raise_for_status()
             return r.json(), None
         except Exception as e:
             last_err = e
             # backoff simple
             sleep_s = 2 * (attempt + 1)
-            log(f"   ↳ WARN attempt {attempt+1}/{retries+1} failed: {e} (sleep {sleep_s}s)")
+            log(f"   ↳ WARN '{q}' attempt {attempt+1}/{retries+1} failed: {e} (sleep {sleep_s}s)")
             time.sleep(sleep_s)
     return None, last_err
 
+# ----------------------------
+# Géocodage d'un site
+# ----------------------------
+def _found(name, query, data, status, mode):
+    best = data[0]
+    return {
+        "manual_site_name": name,
+        "address_query": query,
+        "lat": float(best["lat"]),
+        "lon": float(best["lon"]),
+        "display_name": best.get("display_name", ""),
+        "status": status,
+        "n_candidates": len(data),
+        "mode": mode,
+    }
+
+
+def geocode_site(name: str, limiter: RateLimiter, url: str = URL):
+    """normal → fallback → hardcoded → not_found / error (même ordre qu'avant)."""
+    # 1) normal query
+    q_normal = f"{name}, Lyon, France"
+    data, e = nominatim_search(limiter, q_normal, url)
+    if data:
+        return _found(name, q_normal, data, "ok", "normal")
+
+    # 2) fallback address (si défini)
+    fb = FALLBACK_ADDRESS.get(name)
+    if fb:
+        data2, e2 = nominatim_search(limiter, fb, url)
+        if data2:
+            return _found(name, fb, data2, "ok_fallback", "fallback")
+        e = e or e2
+
+    # 3) hardcoded coords (dernier recours)
+    if name in HARDCODED_COORDS:
+        lat, lon = HARDCODED_COORDS[name]
+        return {
+            "manual_site_name": name,
+            "address_query": fb if fb else q_normal,
+            "lat": float(lat),
+            "lon": float(lon),
+            "display_name": "",
+            "status": "hardcoded",
+            "n_candidates": 0,
+            "mode": "hardcoded",
+        }
+
+    # 4) error vs not_found
+    if e is not None:
+        return {"manual_site_name": name, "address_query": q_normal, "status": "error", "error": str(e)}
+    return {"manual_site_name": name, "address_query": q_normal, "status": "not_found"}
+
+
+def _from_cache(name, cached):
+    result = dict(cached, manual_site_name=name)
+    # Les coordonnées hardcodées font foi même si le code a changé depuis
+    if result["status"] == "hardcoded" and name in HARDCODED_COORDS:
+        result["lat"], result["lon"] = map(float, HARDCODED_COORDS[name])
+    return result
+
 # ----------------------------
 # Main
 # ----------------------------
+def geocode_sites(sites, cache, limiter, url=URL, workers=4, refresh=False):
+    """Résultats dans l'ordre de `sites` ; seuls les absents du cache sont requêtés."""
+    results = {}
+    misses = []
+    for name in sites:
+        cached = None if refresh else cache.get(f"{name}, Lyon, France")
+        if cached is not None:
+            results[name] = _from_cache(name, cached)
+        else:
+            misses.append(name)
+
+    log(f"Cache: {len(results)} hits, {len(misses)} misses")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(geocode_site, name, limiter, url): name for name in misses}
+        for i, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            result = future.result()
+            results[name] = result
+            if result["status"] != "error":
+                cache.put(f"{name}, Lyon, France", result)
+            coords = f" ({result['lat']:.7f}, {result['lon']:.7f})" if "lat" in result else ""
+            log(f"[{i}/{len(misses)}] '{name}' → {result['status'].upper()}{coords}")
+
+    return [results[name] for name in sites]
+
+
+def save_preview_map(geo, map_out=MAP_OUT):
+    import folium
+
+    os.makedirs(os.path.dirname(map_out), exist_ok=True)
+    m = folium.Map(location=[45.77, 4.83], zoom_start=12)
+
+    for _, r in geo.iterrows():
+        if r.get("status") in ("ok", "ok_fallback", "hardcoded"):
+            folium.Marker(
+                location=[r["lat"], r["lon"]],
+                popup=f"""
+                <b>{r['manual_site_name']}</b><br>
+                status: {r['status']}<br>
+                {r.get('display_name','')}
+                """
+            ).add_to(m)
+
+    m.save(map_out)
+    print(f"✅ map saved: {map_out}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Géocodage des sites de comptage manuel")
+    parser.add_argument("--input", default=MANUAL_COUNTS_CSV)
+    parser.add_argument("--output", default=OUT_CSV)
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--endpoint", default=URL)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1.0, help="requêtes/s max (global)")
+    parser.add_argument("--refresh", action="store_true", help="ignorer le cache (il est mis à jour)")
+    parser.add_argument("--no-map", action="store_true")
+    args = parser.parse_args()
+
     log("Starting manual sites geocoding")
     log("Reading manual counts CSV")
 
-    df = pd.read_csv(MANUAL_COUNTS_CSV)
+    df = pd.read_csv(args.input)
     sites = sorted(df["Point comptage"].dropna().astype(str).str.strip().unique())
 
     log(f"Found {len(sites)} unique manual sites")
 
-    session = requests.Session()
-    session.headers.update(HEADERS)
-
-    results = []
-    ok = nf = err = fb_used = hc_used = 0
-
-    for i, name in enumerate(sites, start=1):
-        name = str(name).strip()
-        log(f"[{i}/{len(sites)}] Geocoding: '{name}'")
-
-        # 1) normal query
-        q_normal = f"{name}, Lyon, France"
-        data, e = nominatim_search(session, q_normal)
-
-        if data and len(data) > 0:
-            best = data[0]
-            lat = float(best["lat"])
-            lon = float(best["lon"])
-            results.append({
-                "manual_site_name": name,
-                "address_query": q_normal,
-                "lat": lat,
-                "lon": lon,
-                "display_name": best.get("display_name", ""),
-                "status": "ok",
-                "n_candidates": len(data),
-                "mode": "normal",
-            })
-            ok += 1
-            log(f"   ↳ OK [normal] ({lat:.7f}, {lon:.7f})")
-            time.sleep(1.0)
-            continue
-
-        # 2) fallback address (si défini)
-        fb = FALLBACK_ADDRESS.get(name)
-        if fb:
-            log(f"   ↳ NOT FOUND → fallback: '{fb}'")
-            data2, e2 = nominatim_search(session, fb)
-
-            if data2 and len(data2) > 0:
-                best = data2[0]
-                lat = float(best["lat"])
-                lon = float(best["lon"])
-                results.append({
-                    "manual_site_name": name,
-                    "address_query": fb,
-                    "lat": lat,
-                    "lon": lon,
-                    "display_name": best.get("display_name", ""),
-                    "status": "ok_fallback",
-                    "n_candidates": len(data2),
-                    "mode": "fallback",
-                })
-                ok += 1
-                fb_used += 1
-                log(f"   ↳ OK [fallback] ({lat:.7f}, {lon:.7f})")
-                time.sleep(1.0)
-                continue
-            else:
-                log("   ↳ NOT FOUND (even after fallback)")
-
-        # 3) hardcoded coords (dernier recours)
-        if name in HARDCODED_COORDS:
-            lat, lon = HARDCODED_COORDS[name]
-            results.append({
-                "manual_site_name": name,
-                "address_query": fb if fb else q_normal,
-                "lat": float(lat),
-                "lon": float(lon),
-                "display_name": "",
-                "status": "hardcoded",
-                "n_candidates": 0,
-                "mode": "hardcoded",
-            })
-            hc_used += 1
-            log(f"   ↳ HARDCODED ({lat:.7f}, {lon:.7f})")
-            time.sleep(0.2)
-            continue
-
-        # 4) error vs not_found
-        if e is not None:
-            results.append({
-                "manual_site_name": name,
-                "address_query": q_normal,
-                "status": "error",
-                "error": str(e),
-            })
-            err += 1
-            log(f"   ↳ ERROR: {e}")
-        else:
-            results.append({
-                "manual_site_name": name,
-                "address_query": q_normal,
-                "status": "not_found",
-            })
-            nf += 1
-            log("   ↳ NOT FOUND")
-
-        time.sleep(1.0)
+    cache = GeocodeCache(args.cache, endpoint=args.endpoint)
+    try:
+        results = geocode_sites(sites, cache, RateLimiter(args.rate), url=args.endpoint,
+                                workers=args.workers, refresh=args.refresh)
+    finally:
+        cache.close()
 
     out = pd.DataFrame(results)
-    out.to_csv(OUT_CSV, index=False)
+    out.to_csv(args.output, index=False)
 
+    counts = out["status"].value_counts()
     log("Geocoding finished")
-    log(f"Results: OK={ok}, NOT_FOUND={nf}, ERROR={err}, FALLBACK_USED={fb_used}, HARDCODED_USED={hc_used}")
-    log(f"Output written to: {OUT_CSV}")
-    log("Status counts:\n" + str(out["status"].value_counts()))
+    log(f"Results: OK={counts.get('ok', 0) + counts.get('ok_fallback', 0)}, NOT_FOUND={counts.get('not_found', 0)}, "
+        f"ERROR={counts.get('error', 0)}, FALLBACK_USED={counts.get('ok_fallback', 0)}, "
+        f"HARDCODED_USED={counts.get('hardcoded', 0)}")
+    log(f"Output written to: {args.output}")
+    log("Status counts:\n" + str(counts))
+
+    if not args.no_map:
+        save_preview_map(out)
+
 
 if __name__ == "__main__":
     try:
@@ -194,24 +362,3 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         log("Interrupted by user (Ctrl+C)")
         sys.exit(1)
-
-MAP_OUT = "exports/leaflet/manual_sites_preview.html"
-os.makedirs(os.path.dirname(MAP_OUT), exist_ok=True)
-
-geo = pd.read_csv("data/bronze/comptage_manuel/manual_sites_geo.csv")
-
-m = folium.Map(location=[45.77, 4.83], zoom_start=12)
-
-for _, r in geo.iterrows():
-    if r.get("status") in ("ok", "ok_fallback", "hardcoded"):
-        folium.Marker(
-            location=[r["lat"], r["lon"]],
-            popup=f"""
-            <b>{r['manual_site_name']}</b><br>
-            status: {r['status']}<br>
-            {r.get('display_name','')}
-            """
-        ).add_to(m)
-
-m.save(MAP_OUT)
-print(f"✅ map saved: {MAP_OUT}")
\ No newline at end of file
@@ -1,8 +1,32 @@
-import numpy as np
-import pandas as pd
+"""
+Script: Générateur synthétique de gold_flow_amenagement_daily (tests de charge)
+───────────────────────────────────────────────────────────────────────────────
+Mêmes profils d'usage que la version initiale (high_stable, medium_growing,
+high_declining, low_stable, erratic, AMEN_RECENT*), mais :
+  - tirages NumPy vectorisés sur des blocs (jours × aménagements), sans
+    boucle Python par aménagement ni par jour ;
+  - écriture Parquet bloc par bloc, partitionnée par année
+    (`year=YYYY/part-NNNNN.parquet`) : la mémoire est bornée par un bloc ;
+  - --scale N complète la liste d'IDs avec des IDs synthétiques pour
+    tester le scoring et les exports à l'échelle (100k+ aménagements).
+
+Usage:
+  python scripts/mock_gold_amenagement.py [--ids ids.txt] [--scale 100000]
+         [--output gold_flow_amenagement_daily_mock] [--csv]
+"""
+
+import argparse
 import logging
+import os
+import shutil
 import time
 
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
 # =========================
 # LOGGING SETUP
 # =========================
@@ -14,40 +38,14 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# =========================
-# 0) LIRE ids.txt (1 id / ligne)
-# =========================
-IDS_PATH = "ids.txt"
-logger.info("Lecture des IDs depuis %s", IDS_PATH)
-
-with open(IDS_PATH, "r", encoding="utf-8") as f:
-    amenagements_ids = [line.strip() for line in f if line.strip()]
-
-# Supprimer doublons en gardant l'ordre
-seen = set()
-amenagements_ids = [x for x in amenagements_ids if not (x in seen or seen.add(x))]
-
-if not amenagements_ids:
-    logger.error("ids.txt est vide")
-    raise ValueError("ids.txt est vide")
-
-logger.info("Nombre d'aménagements chargés : %d", len(amenagements_ids))
-
 # =========================
 # PARAMÈTRES GLOBAUX
 # =========================
 START_DATE = "2014-01-01"
 END_DATE = "2025-12-01"
+RECENT_START_DATE = "2025-06-01"
 SEED = 42
 
-np.random.seed(SEED)
-
-dates_full = pd.date_range(start=START_DATE, end=END_DATE, freq="D")
-dates_recent = pd.date_range(start="2025-06-01", end=END_DATE, freq="D")
-
-logger.info("Période globale : %s → %s", START_DATE, END_DATE)
-logger.info("Jours (full): %d | Jours (recent): %d", len(dates_full), len(dates_recent))
-
 # =========================
 # PROFILS D'USAGE
 # =========================
@@ -62,92 +60,178 @@ PROFILES = {
 profile_names = list(PROFILES.keys())
 profile_probs = [0.2, 0.25, 0.15, 0.25, 0.15]
 
-# =========================
-# GÉNÉRATION DES DONNÉES
-# =========================
-rows = []
-start_time = time.time()
-
-log_every = max(1, len(amenagements_ids) // 10)  # log tous les 10 %
-
-for idx, amenagement_id in enumerate(amenagements_ids, start=1):
-    is_recent = amenagement_id.startswith("AMEN_RECENT")
-
-    if is_recent:
-        dates = dates_recent
-        base_flux = np.random.uniform(50, 150)
-        trend = 0.0
-        noise_level = 0.35
-    else:
-        dates = dates_full
-        profile = np.random.choice(profile_names, p=profile_probs)
-        cfg = PROFILES[profile]
-
-        base_flux = np.random.uniform(*cfg["base_flux"])
-        trend = cfg["trend"]
-        noise_level = cfg["noise"]
-
-    n_channels = np.random.randint(1, 5)
-
-    for t, date in enumerate(dates):
-        trend_factor = 1 + trend * t
-        seasonal = 1 + 0.30 * np.sin(2 * np.pi * t / 365)
-        noise = np.random.normal(0, noise_level)
-
-        flux = base_flux * trend_factor * seasonal * (1 + noise)
-        flux = max(0, flux)
-
-        rows.append(
-            {
-                "amenagement_id": amenagement_id,
-                "date": date.date(),
-                "flux_estime": int(round(flux)),
-                "n_channels": n_channels,
-            }
-        )
+RECENT_PROFILE = {"base_flux": (50, 150), "trend": 0.0, "noise": 0.35}
 
-    if idx % log_every == 0 or idx == len(amenagements_ids):
-        elapsed = time.time() - start_time
-        logger.info(
-            "Progression: %d / %d aménagements (%.1f%%) | lignes générées: %d | %.1fs écoulées",
-            idx,
-            len(amenagements_ids),
-            100 * idx / len(amenagements_ids),
-            len(rows),
-            elapsed,
-        )
 
 # =========================
-# DATAFRAME FINAL
+# 0) IDs
 # =========================
-logger.info("Construction du DataFrame pandas")
-df = pd.DataFrame(rows)
+def load_ids(path, scale=None):
+    """IDs uniques de `path` (ordre conservé), complétés jusqu'à `scale` par des IDs synthétiques."""
+    ids = []
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            ids = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+        logger.info("Nombre d'aménagements chargés depuis %s : %d", path, len(ids))
+
+    if scale and scale > len(ids):
+        n_extra = scale - len(ids)
+        ids += [f"AMEN_SYN_{i:07d}" for i in range(n_extra)]
+        logger.info("Ajout de %d IDs synthétiques (--scale %d)", n_extra, scale)
+
+    if not ids:
+        logger.error("Aucun ID : ids.txt vide ou absent, et pas de --scale")
+        raise ValueError("ids.txt est vide")
+    return ids
+
 
 # =========================
-# CONTRÔLES DE COHÉRENCE
+# 1) PARAMÈTRES PAR AMÉNAGEMENT
 # =========================
-logger.info("Vérification de cohérence des IDs")
+def draw_parameters(ids, rng, recent_offset):
+    """
+    Tire profil, flux de base, tendance, bruit et n_channels pour tous les IDs
+    d'un coup. `offset` = premier jour actif (0, ou début de la période récente).
+    """
+    n = len(ids)
+    is_recent = np.char.startswith(np.asarray(ids, dtype=str), "AMEN_RECENT")
 
-generated_ids = set(df["amenagement_id"].unique())
-expected_ids = set(amenagements_ids)
+    profile_idx = rng.choice(len(profile_names), size=n, p=profile_probs)
+    low = np.array([PROFILES[p]["base_flux"][0] for p in profile_names])[profile_idx]
+    high = np.array([PROFILES[p]["base_flux"][1] for p in profile_names])[profile_idx]
+    trend = np.array([PROFILES[p]["trend"] for p in profile_names])[profile_idx]
+    noise = np.array([PROFILES[p]["noise"] for p in profile_names])[profile_idx]
 
-assert generated_ids == expected_ids, (
-    "❌ Incohérence IDs.\n"
-    f"Manquants: {sorted(expected_ids - generated_ids)[:10]}\n"
-    f"En trop: {sorted(generated_ids - expected_ids)[:10]}"
-)
+    low[is_recent], high[is_recent] = RECENT_PROFILE["base_flux"]
+    trend[is_recent] = RECENT_PROFILE["trend"]
+    noise[is_recent] = RECENT_PROFILE["noise"]
+
+    return {
+        "base_flux": rng.uniform(low, high),
+        "trend": trend,
+        "noise": noise,
+        "n_channels": rng.integers(1, 5, size=n).astype(np.int32),
+        "offset": np.where(is_recent, recent_offset, 0),
+    }
 
-logger.info("Cohérence des IDs OK")
 
 # =========================
-# SORTIE
+# 2) GÉNÉRATION PAR BLOC
 # =========================
-output_csv = "gold_flow_amenagement_daily_mock.csv"
-logger.info("Écriture du fichier CSV : %s", output_csv)
+def generate_block(params, dates, rng):
+    """
+    Flux journaliers d'un bloc d'aménagements, calculés par broadcasting
+    (jours × aménagements). Lignes triées par date puis aménagement.
+
+    Retourne (day_idx, id_idx, flux) pour les lignes actives.
+    """
+    n_days, n_ids = len(dates), len(params["base_flux"])
+    t = np.arange(n_days)[:, None] - params["offset"][None, :]
+
+    trend_factor = 1 + params["trend"] * t
+    seasonal = 1 + 0.30 * np.sin(2 * np.pi * t / 365)
+    noise = rng.standard_normal((n_days, n_ids)) * params["noise"]
+
+    flux = params["base_flux"] * trend_factor * seasonal * (1 + noise)
+    flux = np.rint(np.maximum(flux, 0)).astype(np.int32)
+
+    day_idx, id_idx = np.nonzero(t >= 0)
+    return day_idx, id_idx, flux[day_idx, id_idx]
+
+
+def block_table(ids, params, dates, day_idx, id_idx, flux):
+    id_dict = pa.array(ids, type=pa.string())
+    return pa.table({
+        "amenagement_id": pa.DictionaryArray.from_arrays(pa.array(id_idx.astype(np.int32)), id_dict),
+        "date": pa.array(dates.values.astype("datetime64[D]")[day_idx]),
+        "flux_estime": pa.array(flux),
+        "n_channels": pa.array(params["n_channels"][id_idx]),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génération de gold_flow_amenagement_daily synthétique")
+    parser.add_argument("--ids", default="ids.txt")
+    parser.add_argument("--scale", type=int, default=None, help="nombre total d'aménagements (IDs synthétiques ajoutés)")
+    parser.add_argument("--output", default="gold_flow_amenagement_daily_mock")
+    parser.add_argument("--chunk-rows", type=int, default=5_000_000, help="lignes max par bloc")
+    parser.add_argument("--csv", action="store_true", help="écrire aussi l'ancien CSV (output + .csv)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    amenagements_ids = load_ids(args.ids, args.scale)
+
+    dates_full = pd.date_range(start=START_DATE, end=END_DATE, freq="D")
+    recent_offset = int(np.searchsorted(dates_full, pd.Timestamp(RECENT_START_DATE)))
+    years = dates_full.year.to_numpy()
+
+    logger.info("Période globale : %s → %s", START_DATE, END_DATE)
+    logger.info("Jours (full): %d | Jours (recent): %d", len(dates_full), len(dates_full) - recent_offset)
+
+    rng = np.random.default_rng(args.seed)
+    params = draw_parameters(amenagements_ids, rng, recent_offset)
+
+    if os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+    csv_writer = None
+
+    ids_per_block = max(1, args.chunk_rows // len(dates_full))
+    n_blocks = -(-len(amenagements_ids) // ids_per_block)
+    start_time = time.time()
+    total_rows = 0
+    generated_ids = set()
+
+    for block, start in enumerate(range(0, len(amenagements_ids), ids_per_block)):
+        stop = start + ids_per_block
+        block_ids = amenagements_ids[start:stop]
+        block_params = {k: v[start:stop] for k, v in params.items()}
+
+        day_idx, id_idx, flux = generate_block(block_params, dates_full, rng)
+        table = block_table(block_ids, block_params, dates_full, day_idx, id_idx, flux)
+
+        # Lignes triées par date → chaque année est une tranche contiguë
+        row_years = years[day_idx]
+        bounds = np.searchsorted(row_years, np.unique(row_years))
+        for year, lo, hi in zip(np.unique(row_years), bounds, list(bounds[1:]) + [len(row_years)]):
+            year_dir = os.path.join(args.output, f"year={year}")
+            os.makedirs(year_dir, exist_ok=True)
+            pq.write_table(table.slice(lo, hi - lo), os.path.join(year_dir, f"part-{block:05d}.parquet"))
+
+        if args.csv:
+            plain = table.set_column(0, "amenagement_id", table.column("amenagement_id").cast(pa.string()))
+            if csv_writer is None:
+                csv_writer = pv.CSVWriter(f"{args.output}.csv", plain.schema)
+            csv_writer.write_table(plain)
+
+        total_rows += table.num_rows
+        generated_ids.update(block_ids[i] for i in np.unique(id_idx))
+        elapsed = time.time() - start_time
+        logger.info(
+            "Progression: bloc %d / %d | aménagements %d / %d | lignes générées: %d | %.1fs écoulées",
+            block + 1, n_blocks, min(stop, len(amenagements_ids)), len(amenagements_ids), total_rows, elapsed,
+        )
+
+    if csv_writer is not None:
+        csv_writer.close()
+
+    # =========================
+    # CONTRÔLES DE COHÉRENCE
+    # =========================
+    logger.info("Vérification de cohérence des IDs")
+    expected_ids = set(amenagements_ids)
+
+    assert generated_ids == expected_ids, (
+        "❌ Incohérence IDs.\n"
+        f"Manquants: {sorted(expected_ids - generated_ids)[:10]}\n"
+        f"En trop: {sorted(generated_ids - expected_ids)[:10]}"
+    )
+    logger.info("Cohérence des IDs OK")
+
+    logger.info("✅ Génération terminée avec succès")
+    logger.info("Lignes totales : %d", total_rows)
+    logger.info("Aménagements : %d", len(expected_ids))
+    logger.info("Sortie : %s (Parquet partitionné par année)", args.output)
 
-df.to_csv(output_csv, index=False)
 
-logger.info("✅ Génération terminée avec succès")
-logger.info("Lignes totales : %d", len(df))
-logger.info("Aménagements : %d", df["amenagement_id"].nunique())
-logger.info("Période : %s → %s", df["date"].min(), df["date"].max())
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-./scripts/run_silver.sh
-./scripts/run_usage.sh
-./scripts/run_scoring.sh
+# Graphe complet (config/pipeline.yml) : seules les étapes périmées sont relancées,
+# les étapes indépendantes en parallèle
+python -m src.orchestration.dag "$@"
 
 echo "✅ Pipeline complet terminé."
 echo "📦 Exports Leaflet attendus dans: exports/leaflet/"
@@ -0,0 +1,5 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Gold → scores → prédiction → DataViz
+python -m src.orchestration.dag --only scoring prediction dataviz "$@"
@@ -0,0 +1,5 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Bronze → silver (étapes sautées si entrées, code et paramètres inchangés)
+python -m src.orchestration.dag --only cleaning silver_measures geometry compaction "$@"
@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Silver → gold (liaison points de mesure ↔ aménagements, flux journaliers,
+# cube horaire et profils pendulaire / loisir)
+python -m src.orchestration.dag --only usage usage_cube "$@"
@@ -0,0 +1,226 @@
+"""
+Module: Backend d'exécution (Spark ou local Arrow/pandas)
+─────────────────────────────────────────────────────────
+Chaque point d'entrée démarrait sa propre SparkSession `local[*]` pour des
+tables qui tiennent en mémoire, puis appelait aussitôt `.toPandas()` :
+le démarrage de la JVM et py4j dominaient le temps d'exécution.
+
+Les étapes (scoring, liaison, export) sont écrites une seule fois contre
+l'API pandas :
+  - backend "local" : lecture Arrow (pyarrow.dataset, partitions Hive),
+    DataFrames pandas, aucun démarrage de JVM ;
+  - backend "spark" : mêmes appels sur l'API pandas de Spark
+    (`pyspark.pandas`, `spark.read...pandas_api()`), exécutés en distribué.
+Seules les agrégations lourdes passent par le backend ; leurs résultats
+(une ligne par aménagement / point) reviennent en pandas via `to_pandas`.
+
+Choix du backend (`get_backend`) :
+  1. argument explicite, sinon variable d'environnement VELOMENAJ_BACKEND,
+     sinon `execution.backend` de config.yml ;
+  2. "auto" : local si la taille totale des entrées est inférieure à
+     `execution.local_max_mb`, Spark sinon (et local si pyspark est absent).
+
+Durées, lignes et mémoire par étape : src/common/telemetry.py.
+
+Usage:
+  from src.common.backend import get_backend
+  backend = get_backend(inputs=[path])
+  with report.stage("scoring", backend):
+      daily = backend.read_parquet(path, columns=[...])
+      agg = backend.to_pandas(daily.groupby("amenagement_id").agg(...))
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+ENV_VAR = "VELOMENAJ_BACKEND"
+DEFAULT_LOCAL_MAX_MB = 2048
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. BACKEND LOCAL (Arrow / pandas)
+# ═════════════════════════════════════════════════════════════
+
+def _json_files(path):
+    """Fichier JSON lines, ou fichiers part-* d'un répertoire écrit par Spark."""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.endswith(".json") and not name.startswith(("_", "."))
+    )
+
+
+class LocalBackend:
+    """Lecture Arrow, calcul pandas, dans le processus courant."""
+
+    name = "local"
+
+    def read_parquet(self, path, columns=None):
+        dataset = ds.dataset(str(path), format="parquet", partitioning="hive")
+        return dataset.to_table(columns=columns).to_pandas()
+
+    def read_csv(self, path, sep=","):
+        table = pv.read_csv(
+            str(path),
+            parse_options=pv.ParseOptions(delimiter=sep),
+            convert_options=pv.ConvertOptions(strings_can_be_null=True),
+        )
+        return table.to_pandas()
+
+    def read_json(self, path):
+        """JSON lines ; les partitions Hive (year=YYYY/) deviennent des colonnes, comme avec Spark."""
+        path = str(path)
+        if os.path.isfile(path):
+            return pd.read_json(path, lines=True)
+        frames = []
+        for root, dirs, _ in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(("_", ".")))
+            partition = dict(p.split("=", 1) for p in Path(os.path.relpath(root, path)).parts if "=" in p)
+            for file in _json_files(root):
+                if os.path.getsize(file) == 0:
+                    continue
+                df = pd.read_json(file, lines=True)
+                for key, value in partition.items():
+                    df[key] = int(value) if value.lstrip("-").isdigit() else value
+                frames.append(df)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def write_json(self, df, path):
+        """Même disposition que Spark : répertoire + part-00000.json (JSON lines)."""
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith(("part-", "_SUCCESS")):
+                os.remove(os.path.join(path, name))
+        tmp_path = os.path.join(path, ".part-00000.json.tmp")
+        df.to_json(tmp_path, orient="records", lines=True, force_ascii=False)
+        os.replace(tmp_path, os.path.join(path, "part-00000.json"))
+
+    def to_pandas(self, df):
+        return df
+
+    def stop(self):
+        pass
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. BACKEND SPARK (API pandas de Spark)
+# ═════════════════════════════════════════════════════════════
+
+class SparkBackend:
+    """Mêmes méthodes que LocalBackend, sur des DataFrames pyspark.pandas."""
+
+    name = "spark"
+
+    def __init__(self, app_name="Velomenaj", driver_memory="6g"):
+        self.app_name = app_name
+        self.driver_memory = driver_memory
+        self._spark = None
+
+    @property
+    def spark(self):
+        """SparkSession créée à la première utilisation seulement."""
+        if self._spark is None:
+            # Force python vars to match driver (Driver vs Worker)
+            os.environ["PYSPARK_DRIVER_PYTHON"] = sys.executable
+            os.environ["PYSPARK_PYTHON"] = sys.executable
+            from pyspark.sql import SparkSession
+
+            self._spark = (
+                SparkSession.builder
+                .master("local[*]")
+                .appName(self.app_name)
+                .config("spark.driver.memory", self.driver_memory)
+                .getOrCreate()
+            )
+            self._spark.sparkContext.setLogLevel("WARN")
+        return self._spark
+
+    @staticmethod
+    def _uri(path):
+        return "file:" + os.path.abspath(path)
+
+    def read_parquet(self, path, columns=None):
+        df = self.spark.read.parquet(self._uri(path))
+        if columns is not None:
+            df = df.select(*columns)
+        return df.pandas_api()
+
+    def read_csv(self, path, sep=","):
+        return self.spark.read.option("header", "true").option("delimiter", sep).csv(self._uri(path)).pandas_api()
+
+    def read_json(self, path):
+        return self.spark.read.json(self._uri(path)).pandas_api()
+
+    def write_json(self, df, path):
+        sdf = df.to_spark() if hasattr(df, "to_spark") else self.spark.createDataFrame(df)
+        sdf.write.mode("overwrite").json(self._uri(path))
+
+    def to_pandas(self, df):
+        return df.to_pandas() if hasattr(df, "to_pandas") else df
+
+    def stop(self):
+        if self._spark is not None:
+            self._spark.stop()
+            self._spark = None
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. CHOIX DU BACKEND
+# ═════════════════════════════════════════════════════════════
+
+def load_execution_config():
+    """Section `execution` de config.yml (vide si absente)."""
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        return (yaml.safe_load(f) or {}).get("execution", {}) or {}
+
+
+def input_size_bytes(paths):
+    """Taille totale des fichiers sous `paths` (fichiers ou répertoires)."""
+    total = 0
+    for path in paths:
+        path = str(path)
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+            continue
+        for root, _, names in os.walk(path):
+            total += sum(os.path.getsize(os.path.join(root, n)) for n in names)
+    return total
+
+
+def _spark_available():
+    try:
+        import pyspark  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_backend(name=None, inputs=(), app_name="Velomenaj", config=None):
+    """
+    Backend "local" ou "spark". name / VELOMENAJ_BACKEND / config.yml ;
+    "auto" choisit selon la taille des `inputs`.
+    """
+    config = load_execution_config() if config is None else config
+    name = name or os.environ.get(ENV_VAR) or config.get("backend", "auto")
+
+    if name == "auto":
+        size_mb = input_size_bytes(inputs) / 1e6
+        limit_mb = config.get("local_max_mb", DEFAULT_LOCAL_MAX_MB)
+        name = "local" if size_mb <= limit_mb or not _spark_available() else "spark"
+        print(f"ℹ️ Backend auto : {size_mb:,.1f} Mo d'entrées (seuil {limit_mb:,} Mo) → {name}")
+
+    if name == "local":
+        return LocalBackend()
+    if name == "spark":
+        return SparkBackend(app_name=app_name, driver_memory=config.get("spark_driver_memory", "6g"))
+    raise ValueError(f"Backend inconnu : {name!r} (local, spark ou auto)")
+
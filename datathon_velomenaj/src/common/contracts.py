@@ -0,0 +1,348 @@
+"""
+Module: Validation des contrats de données (une passe Arrow par table)
+──────────────────────────────────────────────────────────────────────
+Moteur commun aux contrats silver (src/ingestion_silver/checks.py) et
+gold (src/scoring/checks.py), décrits dans config/schemas.md.
+
+Les contrôles ad hoc des notebooks lançaient une passe par règle : plusieurs
+`.count()`, un `groupBy().size()` pour les doublons, un assert par colonne.
+Ici toutes les règles d'une table sont évaluées dans UNE passe en flux sur
+les row groups Parquet, avec les noyaux pyarrow.compute :
+  - not_null, in_range, allowed : masque booléen par lot ;
+  - foreign_key : `is_in` contre les clés de la table référencée, chargées
+    une seule fois (colonne seule) ;
+  - unique (clé primaire) : clés accumulées, comptées en fin de passe
+    (seule règle dont la mémoire croît avec la table).
+Le résultat est un rapport structuré : nombre de violations par règle,
+exemples de lignes fautives, sévérité. `enforce()` sert de barrière dans le
+pipeline : ContractViolation si une règle de sévérité "error" échoue.
+
+Usage:
+  from src.common.contracts import Contract, NotNull, Unique, validate, enforce
+  contract = Contract("gold_flow_amenagement_daily", rules=[Unique(["amenagement_id", "date"])])
+  report = validate(contract, "data/gold/gold_flow_amenagement_daily")
+  print(report.summary())
+"""
+
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+ERROR = "error"
+WARN = "warn"
+MAX_EXAMPLES = 5
+BATCH_SIZE = 1 << 17
+
+
+def _is_string(t):
+    return pa.types.is_string(t) or pa.types.is_large_string(t) or pa.types.is_dictionary(t)
+
+
+_TYPE_CHECKS = {
+    "string": _is_string,
+    "integer": pa.types.is_integer,
+    "number": lambda t: pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t),
+    "boolean": pa.types.is_boolean,
+    # Partitions Hive et exports pandas : date en "YYYY-MM-DD"
+    "date": lambda t: pa.types.is_date(t) or pa.types.is_timestamp(t) or _is_string(t),
+    "timestamp": pa.types.is_timestamp,
+    "list": lambda t: pa.types.is_list(t) or pa.types.is_large_list(t),
+}
+
+
+class ContractViolation(ValueError):
+    """Une table ne respecte pas son contrat (règles de sévérité "error")."""
+
+    def __init__(self, reports):
+        self.reports = reports
+        super().__init__("\n".join(r.summary() for r in reports if not r.ok))
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. RÈGLES
+# ═════════════════════════════════════════════════════════════
+
+class Rule:
+    """Règle vectorisée : `mask(batch)` → booléen par ligne (True = violation)."""
+
+    kind = "rule"
+
+    def __init__(self, columns, severity=ERROR):
+        self.columns = [columns] if isinstance(columns, str) else list(columns)
+        self.severity = severity
+
+    @property
+    def name(self):
+        return f"{self.kind}({', '.join(self.columns)})"
+
+    def start(self, base_dir):
+        """Préparation avant la passe (ex. chargement des clés référencées)."""
+
+    def mask(self, batch):
+        raise NotImplementedError
+
+    def finish(self):
+        """(nombre de violations, exemples) pour les règles à état ; None sinon."""
+        return None
+
+
+class NotNull(Rule):
+    kind = "not_null"
+
+    def mask(self, batch):
+        masks = [pc.is_null(batch.column(c)) for c in self.columns]
+        out = masks[0]
+        for m in masks[1:]:
+            out = pc.or_(out, m)
+        return out
+
+
+class InRange(Rule):
+    """min <= valeur <= max (bornes optionnelles) ; les nulls ne sont pas des violations."""
+
+    kind = "in_range"
+
+    def __init__(self, column, min=None, max=None, severity=ERROR):
+        super().__init__(column, severity)
+        self.min, self.max = min, max
+
+    @property
+    def name(self):
+        return f"in_range({self.columns[0]}, {self.min}, {self.max})"
+
+    def mask(self, batch):
+        col = batch.column(self.columns[0])
+        out = pa.array([False] * len(col))
+        if self.min is not None:
+            out = pc.or_(out, pc.less(col, self.min))
+        if self.max is not None:
+            out = pc.or_(out, pc.greater(col, self.max))
+        return pc.fill_null(out, False)
+
+
+class Allowed(Rule):
+    """Valeur dans un ensemble fixe (nulls ignorés)."""
+
+    kind = "allowed"
+
+    def __init__(self, column, values, severity=ERROR):
+        super().__init__(column, severity)
+        self.values = pa.array(list(values))
+
+    def mask(self, batch):
+        col = batch.column(self.columns[0])
+        if pa.types.is_dictionary(col.type):
+            col = col.cast(col.type.value_type)
+        return pc.and_(pc.is_valid(col), pc.invert(pc.is_in(col, value_set=self.values.cast(col.type))))
+
+
+class ForeignKey(Rule):
+    """Valeur présente dans `ref_table.ref_column` (comparaison en string, nulls ignorés)."""
+
+    kind = "foreign_key"
+
+    def __init__(self, column, ref_table, ref_column=None, severity=ERROR):
+        super().__init__(column, severity)
+        self.ref_table = ref_table
+        self.ref_column = ref_column or column
+        self._keys = None
+
+    @property
+    def name(self):
+        return f"foreign_key({self.columns[0]} → {self.ref_table}.{self.ref_column})"
+
+    def start(self, base_dir):
+        ref = self.ref_table if isinstance(self.ref_table, pa.Table) else \
+            ds.dataset(os.path.join(base_dir, self.ref_table), format="parquet", partitioning="hive") \
+            .to_table(columns=[self.ref_column])
+        keys = ref.column(self.ref_column)
+        self._keys = pc.unique(_as_string(keys.combine_chunks() if isinstance(keys, pa.ChunkedArray) else keys))
+
+    def mask(self, batch):
+        col = _as_string(batch.column(self.columns[0]))
+        return pc.and_(pc.is_valid(col), pc.invert(pc.is_in(col, value_set=self._keys)))
+
+
+class Unique(Rule):
+    """Clé primaire : aucune combinaison de `columns` répétée (clés accumulées sur la passe)."""
+
+    kind = "unique"
+
+    def start(self, base_dir):
+        self._keys = []
+
+    def mask(self, batch):
+        self._keys.append(pa.table({c: batch.column(c) for c in self.columns}))
+        return None
+
+    def finish(self):
+        if not self._keys:
+            return 0, []
+        keys = pa.concat_tables(self._keys, promote_options="permissive")
+        self._keys = []
+        counts = keys.group_by(self.columns).aggregate([([], "count_all")])
+        dup = counts.filter(pc.greater(counts.column("count_all"), 1))
+        n = int(pc.sum(dup.column("count_all")).as_py() or 0) - dup.num_rows
+        return n, dup.slice(0, MAX_EXAMPLES).to_pylist()
+
+
+def _as_string(arr):
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.cast(arr.type.value_type)
+    return arr if pa.types.is_string(arr.type) else pc.cast(arr, pa.string())
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. CONTRAT ET RAPPORT
+# ═════════════════════════════════════════════════════════════
+
+class Contract:
+    """
+    Contrat d'une table : colonnes attendues {nom: famille de type}
+    (string, integer, number, boolean, date, timestamp, list) et règles.
+    """
+
+    def __init__(self, table, columns=None, rules=(), key=None):
+        self.table = table
+        self.columns = dict(columns or {})
+        self.rules = list(rules)
+        # Colonnes reportées dans les exemples de violations
+        self.key = list(key or next((r.columns for r in self.rules if isinstance(r, Unique)), []))
+
+    def needed_columns(self):
+        names = list(self.key) + [c for r in self.rules for c in r.columns]
+        return list(dict.fromkeys(names))
+
+
+class ContractReport:
+    def __init__(self, table, source):
+        self.table = table
+        self.source = source
+        self.rows = 0
+        self.batches = 0
+        self.seconds = None
+        self.violations = []
+
+    @property
+    def ok(self):
+        return not any(v["severity"] == ERROR for v in self.violations)
+
+    def add(self, rule, count, examples=(), detail=None, severity=None):
+        self.violations.append({
+            "rule": rule,
+            "severity": severity or ERROR,
+            "count": int(count),
+            "examples": list(examples),
+            **({"detail": detail} if detail else {}),
+        })
+
+    def to_dict(self):
+        return {
+            "table": self.table,
+            "source": self.source,
+            "ok": self.ok,
+            "rows": self.rows,
+            "batches": self.batches,
+            "seconds": self.seconds,
+            "violations": self.violations,
+        }
+
+    def summary(self):
+        head = f"{'✅' if self.ok else '❌'} {self.table}: {self.rows:,} lignes, {len(self.violations)} règle(s) violée(s)"
+        lines = [head]
+        for v in self.violations:
+            icon = "❌" if v["severity"] == ERROR else "⚠️"
+            example = f" ex. {v['examples'][0]}" if v["examples"] else ""
+            lines.append(f"   {icon} {v['rule']}: {v.get('detail') or format(v['count'], ',')}{example}")
+        return "\n".join(lines)
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. VALIDATION EN UNE PASSE
+# ═════════════════════════════════════════════════════════════
+
+def _dataset(source):
+    """Répertoire / fichier Parquet (partitions Hive), liste de fichiers, Dataset, Table ou DataFrame."""
+    if isinstance(source, ds.Dataset):
+        return source, "<dataset>"
+    if isinstance(source, pd.DataFrame):
+        source = pa.Table.from_pandas(source, preserve_index=False)
+    if isinstance(source, pa.Table):
+        return ds.dataset(source), "<table>"
+    if isinstance(source, (list, tuple)):
+        return ds.dataset([str(p) for p in source], format="parquet"), f"{len(source)} fichier(s)"
+    return ds.dataset(str(source), format="parquet", partitioning="hive"), str(source)
+
+
+def validate(contract, source, base_dir=None, filter=None, batch_size=BATCH_SIZE):
+    """
+    Évalue toutes les règles du contrat en une passe sur `source`.
+
+    - base_dir : répertoire des tables référencées par les ForeignKey
+      (par défaut, le parent de `source`)
+    - filter   : expression pyarrow.dataset (ex. partitions réécrites seulement)
+    """
+    start = time.perf_counter()
+    dataset, label = _dataset(source)
+    report = ContractReport(contract.table, label)
+    if base_dir is None and isinstance(source, (str, os.PathLike)):
+        base_dir = os.path.dirname(os.path.normpath(str(source)))
+
+    # Schéma : colonnes absentes ou de mauvais type (les règles qui en dépendent sont ignorées)
+    schema = dataset.schema
+    missing = {c for c in contract.needed_columns() + list(contract.columns) if c not in schema.names}
+    for name in sorted(missing):
+        report.add(f"column({name})", 0, detail="colonne absente")
+    for name, family in contract.columns.items():
+        if name in schema.names and not _TYPE_CHECKS[family](schema.field(name).type):
+            report.add(f"type({name})", 0, detail=f"{schema.field(name).type} au lieu de {family}")
+
+    rules = [r for r in contract.rules if not set(r.columns) & missing]
+    for rule in rules:
+        rule.start(base_dir)
+    key = [c for c in contract.key if c not in missing]
+    counts = {rule.name: 0 for rule in rules}
+    examples = {rule.name: [] for rule in rules}
+
+    columns = [c for c in contract.needed_columns() if c not in missing]
+    for batch in dataset.to_batches(columns=columns, filter=filter, batch_size=batch_size):
+        report.rows += batch.num_rows
+        report.batches += 1
+        for rule in rules:
+            mask = rule.mask(batch)
+            if mask is None:
+                continue
+            n = pc.sum(mask).as_py() or 0
+            if n:
+                counts[rule.name] += n
+                if len(examples[rule.name]) < MAX_EXAMPLES:
+                    shown = list(dict.fromkeys(key + rule.columns))
+                    bad = batch.select(shown).filter(mask).slice(0, MAX_EXAMPLES - len(examples[rule.name]))
+                    examples[rule.name].extend(bad.to_pylist())
+
+    for rule in rules:
+        final = rule.finish()
+        if final is not None:
+            counts[rule.name], examples[rule.name] = final
+        if counts[rule.name]:
+            report.add(rule.name, counts[rule.name], examples[rule.name], severity=rule.severity)
+
+    report.seconds = round(time.perf_counter() - start, 3)
+    return report
+
+
+def enforce(contracts_and_sources, **kwargs):
+    """
+    Barrière du pipeline : valide chaque (contrat, source) et lève
+    ContractViolation si une règle "error" échoue. Retourne les rapports.
+    """
+    reports = [validate(contract, source, **kwargs) for contract, source in contracts_and_sources]
+    for report in reports:
+        print(report.summary())
+    if not all(r.ok for r in reports):
+        raise ContractViolation(reports)
+    return reports
@@ -0,0 +1,236 @@
+"""
+Module: Noyau géométrique partagé (Lambert-93, distances point ↔ tracé)
+───────────────────────────────────────────────────────────────────────
+Toutes les étapes (liaison spatiale, zones de tension, centroïdes) mesurent
+les distances de la même façon :
+  - projection UNE fois des coordonnées WGS84 (lon, lat) en Lambert-93
+    (EPSG:2154, mètres), formules IGN de la conique conforme sécante ;
+  - distance exacte point ↔ segment (pas seulement aux sommets), vectorisée
+    avec NumPy sur des tableaux de points et de segments.
+
+Les tracés sont manipulés sous forme "aplatie" : un tableau par coordonnée
+plus deux tableaux d'appartenance (owner = géométrie, part = LineString).
+"""
+
+import json
+
+import numpy as np
+import pyarrow as pa
+
+# ═════════════════════════════════════════════════════════════
+# 1. PROJECTION LAMBERT-93 (EPSG:2154)
+# ═════════════════════════════════════════════════════════════
+
+GRS80_A = 6378137.0
+GRS80_E = 0.08181919104281579
+
+L93_LON0 = np.radians(3.0)
+L93_LAT0 = np.radians(46.5)
+L93_LAT1 = np.radians(44.0)
+L93_LAT2 = np.radians(49.0)
+L93_X0 = 700000.0
+L93_Y0 = 6600000.0
+
+# Type Parquet/Arrow de la colonne `geometry` (MultiLineString, [lon, lat])
+MULTILINESTRING_TYPE = pa.list_(pa.list_(pa.list_(pa.float64())))
+
+
+def _m(phi):
+    return np.cos(phi) / np.sqrt(1 - (GRS80_E * np.sin(phi)) ** 2)
+
+
+def _t(phi):
+    es = GRS80_E * np.sin(phi)
+    return np.tan(np.pi / 4 - phi / 2) / ((1 - es) / (1 + es)) ** (GRS80_E / 2)
+
+
+_N = (np.log(_m(L93_LAT1)) - np.log(_m(L93_LAT2))) / (np.log(_t(L93_LAT1)) - np.log(_t(L93_LAT2)))
+_AF = GRS80_A * _m(L93_LAT1) / (_N * _t(L93_LAT1) ** _N)
+_RHO0 = _AF * _t(L93_LAT0) ** _N
+
+
+def to_lambert93(lon, lat):
+    """WGS84 (degrés) → Lambert-93 (mètres). Accepte scalaires ou tableaux."""
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+
+    rho = _AF * _t(lat) ** _N
+    theta = _N * (lon - L93_LON0)
+
+    x = L93_X0 + rho * np.sin(theta)
+    y = L93_Y0 + _RHO0 - rho * np.cos(theta)
+    return x, y
+
+
+def from_lambert93(x, y, n_iter=6):
+    """Lambert-93 (mètres) → WGS84 (degrés), latitude par itération."""
+    dx = np.asarray(x, dtype=np.float64) - L93_X0
+    dy = _RHO0 - (np.asarray(y, dtype=np.float64) - L93_Y0)
+
+    rho = np.hypot(dx, dy)
+    theta = np.arctan2(dx, dy)
+    t = (rho / _AF) ** (1 / _N)
+
+    lon = theta / _N + L93_LON0
+    lat = np.pi / 2 - 2 * np.arctan(t)
+    for _ in range(n_iter):
+        es = GRS80_E * np.sin(lat)
+        lat = np.pi / 2 - 2 * np.arctan(t * ((1 - es) / (1 + es)) ** (GRS80_E / 2))
+
+    return np.degrees(lon), np.degrees(lat)
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. TRACÉS APLATIS
+# ═════════════════════════════════════════════════════════════
+
+def flatten_lines(geometries):
+    """
+    Aplatit une séquence de géométries en tableaux de sommets.
+
+    Chaque géométrie est une liste de coordonnées MultiLineString
+    ([[[lon, lat], ...], ...]), LineString ([[lon, lat], ...]) ou la même
+    chose en string JSON. Les géométries vides/invalides sont ignorées.
+    Une colonne Arrow de listes imbriquées (colonne `geometry` de la couche
+    silver) est lue directement depuis ses buffers, sans boucle Python.
+
+    Retourne (owner, part, lon, lat) :
+      - owner[i] : position dans `geometries` de la géométrie du sommet i
+      - part[i]  : identifiant global de la LineString du sommet i
+    """
+    if isinstance(geometries, (pa.Array, pa.ChunkedArray)):
+        return _flatten_lines_arrow(geometries)
+
+    owners, parts, lons, lats = [], [], [], []
+    n_parts = 0
+
+    for pos, coords in enumerate(geometries):
+        if coords is None or (isinstance(coords, float) and np.isnan(coords)):
+            continue
+        if isinstance(coords, str):
+            try:
+                coords = json.loads(coords)
+            except ValueError:
+                continue
+        if len(coords) == 0:
+            continue
+
+        # LineString simple → une seule partie
+        if len(coords[0]) and np.isscalar(coords[0][0]):
+            coords = [coords]
+
+        for segment in coords:
+            arr = np.asarray(list(segment), dtype=np.float64).reshape(-1, 2)
+            if len(arr) == 0:
+                continue
+            lons.append(arr[:, 0])
+            lats.append(arr[:, 1])
+            owners.append(np.full(len(arr), pos, dtype=np.int64))
+            parts.append(np.full(len(arr), n_parts, dtype=np.int64))
+            n_parts += 1
+
+    if not owners:
+        empty_i, empty_f = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return empty_i, empty_i, empty_f, empty_f
+
+    return np.concatenate(owners), np.concatenate(parts), np.concatenate(lons), np.concatenate(lats)
+
+
+def _flatten_lines_arrow(geometries):
+    """flatten_lines pour une colonne Arrow list<list<double>> ou list<list<list<double>>>."""
+    if isinstance(geometries, pa.ChunkedArray):
+        geometries = geometries.combine_chunks()
+    n_geometries = len(geometries)
+
+    # Nombre de parties par géométrie (1 pour une LineString) ; une
+    # géométrie nulle a des offsets égaux, donc 0 partie / 0 sommet
+    arr = geometries
+    if pa.types.is_list(arr.type.value_type.value_type):
+        o = arr.offsets.to_numpy()
+        parts_per_geom = np.diff(o)
+        arr = arr.values.slice(o[0], o[-1] - o[0])
+    else:
+        parts_per_geom = np.ones(n_geometries, dtype=np.int64)
+
+    # arr : une LineString par élément (list<list<double>>)
+    o = arr.offsets.to_numpy()
+    vertices_per_part = np.diff(o)
+    positions = arr.values.slice(o[0], o[-1] - o[0])
+    po = positions.offsets.to_numpy()
+    leaves = positions.values.cast(pa.float64()).to_numpy(zero_copy_only=False)
+
+    part_owner = np.repeat(np.arange(n_geometries, dtype=np.int64), parts_per_geom)
+    owner = np.repeat(part_owner, vertices_per_part)
+    part = np.repeat(np.arange(len(vertices_per_part), dtype=np.int64), vertices_per_part)
+    lon = leaves[po[:-1] - po[0]]
+    lat = leaves[po[:-1] - po[0] + 1]
+    return owner, part, lon, lat
+
+
+def segment_starts(part):
+    """Indices i des sommets qui ouvrent un segment [i, i+1] dans la même LineString."""
+    part = np.asarray(part)
+    return np.flatnonzero(part[:-1] == part[1:])
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. DISTANCES ET MESURES
+# ═════════════════════════════════════════════════════════════
+
+def point_segment_distance(px, py, ax, ay, bx, by):
+    """
+    Distance euclidienne exacte entre des points P et des segments [A, B].
+
+    Tous les arguments sont des tableaux (ou scalaires) diffusables entre eux ;
+    les segments dégénérés (A == B) se réduisent à la distance au point A.
+    """
+    px, py, ax, ay, bx, by = (np.asarray(v, dtype=np.float64) for v in (px, py, ax, ay, bx, by))
+    abx, aby = bx - ax, by - ay
+    apx, apy = px - ax, py - ay
+
+    len2 = abx * abx + aby * aby
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(len2 > 0, (apx * abx + apy * aby) / len2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+
+    return np.hypot(apx - t * abx, apy - t * aby)
+
+
+def line_measures(owner, part, x, y, n_geometries):
+    """
+    Longueur (m), nombre de sommets et centroïde (moyenne des milieux de
+    segments pondérée par leur longueur) de chaque géométrie, en Lambert-93.
+
+    Les géométries sans segment de longueur non nulle ont pour centroïde
+    la moyenne de leurs sommets.
+    """
+    starts = segment_starts(part)
+    seg_len = np.hypot(x[starts + 1] - x[starts], y[starts + 1] - y[starts])
+    mid_x = (x[starts] + x[starts + 1]) / 2
+    mid_y = (y[starts] + y[starts + 1]) / 2
+    seg_owner = owner[starts]
+
+    # float64 même sans aucun segment (bincount sur des poids vides → int64)
+    length = np.bincount(seg_owner, weights=seg_len, minlength=n_geometries).astype(np.float64)
+    n_vertices = np.bincount(owner, minlength=n_geometries)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cx = np.bincount(seg_owner, weights=seg_len * mid_x, minlength=n_geometries) / length
+        cy = np.bincount(seg_owner, weights=seg_len * mid_y, minlength=n_geometries) / length
+        vx = np.bincount(owner, weights=x, minlength=n_geometries) / n_vertices
+        vy = np.bincount(owner, weights=y, minlength=n_geometries) / n_vertices
+
+    degenerate = length <= 0
+    cx[degenerate] = vx[degenerate]
+    cy[degenerate] = vy[degenerate]
+
+    return length, n_vertices, cx, cy
+
+
+def line_bounds(owner, lon, lat, n_geometries):
+    """Bounding box (min_lon, min_lat, max_lon, max_lat) de chaque géométrie, NaN si vide."""
+    bounds = np.full((4, n_geometries), np.nan)
+    if len(owner):
+        for row, values, reduce in ((0, lon, np.fmin), (1, lat, np.fmin), (2, lon, np.fmax), (3, lat, np.fmax)):
+            reduce.at(bounds[row], owner, values)
+    return tuple(bounds)
@@ -0,0 +1,259 @@
+"""
+Module: Télémétrie des exécutions (durées, lignes, octets, mémoire, skew)
+─────────────────────────────────────────────────────────────────────────
+Remplace les `print` de progression dispersés ("✓ Loaded Parquet",
+"Total Scored Amenities: {out.count()}") par un rapport structuré par étape.
+
+Principe:
+  - `RunReport(name)` regroupe les étapes d'une exécution ; `report.stage()`
+    mesure la durée réelle et le pic RSS du processus, et collecte lignes
+    et octets lus / écrits.
+  - Les comptages viennent des sorties déjà écrites, jamais d'une action
+    supplémentaire : pieds de page Parquet (num_rows) et nombre de lignes
+    des fichiers JSON lines. Un `df.count()` Spark relançait tout le plan.
+  - Pour une sortie en plusieurs fichiers part-* (Spark), la taille des
+    fichiers donne celle des partitions : skew = max / médiane.
+  - `report.write()` écrit data/_runs/<run_id>/<name>.json. Le run_id vient
+    de VELOMENAJ_RUN_ID (posé par src/orchestration/dag.py pour toutes les
+    étapes d'un même passage), sinon de l'horodatage.
+  - Utilisé comme gestionnaire de contexte, le rapport est écrit à la sortie
+    du bloc, y compris sur exception (statut "failed") : une exécution en
+    échec laisse aussi son rapport.
+
+Usage:
+  from src.common.telemetry import RunReport
+  with RunReport("scoring") as report:    # report.write() à la sortie du bloc
+      with report.stage("scoring", backend) as st:
+          st.read(input_dir)
+          ...
+          st.wrote(output_dir)      # lignes et skew lus sur les fichiers écrits
+  print(report.path)
+"""
+
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+RUN_ID_ENV = "VELOMENAJ_RUN_ID"
+REPORT_DIR = PROJECT_ROOT / "data" / "_runs"
+CHUNK_SIZE = 1 << 20
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. MESURES SANS ACTION SUPPLÉMENTAIRE
+# ═════════════════════════════════════════════════════════════
+
+def max_rss_mb():
+    """Pic RSS du processus depuis son démarrage."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == "darwin" else rss / 1e3  # octets (macOS) / Ko (Linux)
+
+
+def data_files(path):
+    """Fichiers de données sous path (fichier seul, ou part-* ; _SUCCESS, .crc exclus)."""
+    path = str(path)
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(("_", ".")))
+        files.extend(os.path.join(root, n) for n in sorted(names) if not n.startswith(("_", ".")))
+    return files
+
+
+def count_rows(path):
+    """Lignes d'un fichier Parquet (pied de page) ou JSON lines ; None sinon."""
+    if path.endswith(".parquet"):
+        return pq.read_metadata(path).num_rows
+    if path.endswith((".json", ".jsonl")):
+        n, last = 0, b"\n"
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                n += chunk.count(b"\n")
+                last = chunk[-1:]
+        return n + (last != b"\n")
+    return None
+
+
+def output_stats(path, rows=True):
+    """
+    {files, bytes, rows, partitions} d'une sortie. `rows` est None si un
+    fichier n'est pas comptable (GeoJSON, CSV…). `partitions` (si plusieurs
+    fichiers part-*) : nombre, taille max / médiane en Mo, skew = max / médiane.
+    """
+    files = data_files(path) if os.path.exists(path) else []
+    sizes = np.array([os.path.getsize(f) for f in files], dtype=np.int64)
+    stats = {"files": len(files), "bytes": int(sizes.sum()), "rows": None}
+
+    if rows and files:
+        counts = [count_rows(f) for f in files]
+        if all(c is not None for c in counts):
+            stats["rows"] = int(sum(counts))
+
+    # Fichiers part-* (Spark, pyarrow) : un par partition écrite
+    sizes = np.array([size for f, size in zip(files, sizes) if os.path.basename(f).startswith("part-")],
+                     dtype=np.int64)
+    if len(sizes) > 1:
+        median = float(np.median(sizes))
+        stats["partitions"] = {
+            "count": len(sizes),
+            "max_mb": round(sizes.max() / 1e6, 3),
+            "median_mb": round(median / 1e6, 3),
+            "skew": round(sizes.max() / median, 2) if median > 0 else None,
+        }
+    return stats
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. ÉTAPES ET RAPPORT
+# ═════════════════════════════════════════════════════════════
+
+class StageMetrics:
+    """Mesures d'une étape ; rows_in / rows_out peuvent aussi être posés directement."""
+
+    def __init__(self, name, backend=None):
+        self.name = name
+        self.backend = getattr(backend, "name", backend)
+        self.status = "ok"
+        self.seconds = None
+        self.rows_in = None
+        self.rows_out = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_rss_mb = None
+        self.rss_growth_mb = None
+        self.outputs = {}
+        self.counters = {}
+
+    def read(self, *paths):
+        """
+        Ajoute la taille des entrées lues (fichiers ou répertoires) ; les
+        lignes des entrées Parquet viennent des pieds de page, sans lecture.
+        """
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            files = data_files(path)
+            self.bytes_read += sum(os.path.getsize(f) for f in files)
+            if files and all(f.endswith(".parquet") for f in files):
+                self.rows_in = (self.rows_in or 0) + sum(count_rows(f) for f in files)
+
+    def wrote(self, path, rows=None):
+        """
+        Sortie écrite : octets, lignes (comptées sur les fichiers si `rows`
+        n'est pas fourni) et tailles des partitions. Retourne le nombre de lignes.
+        """
+        stats = output_stats(path, rows=rows is None)
+        if rows is not None:
+            stats["rows"] = int(rows)
+        key = str(path)
+        if os.path.isabs(key) and key.startswith(str(PROJECT_ROOT) + os.sep):
+            key = os.path.relpath(key, PROJECT_ROOT)
+        self.outputs[key] = stats
+        self.bytes_written += stats["bytes"]
+        if stats["rows"] is not None:
+            self.rows_out = (self.rows_out or 0) + stats["rows"]
+        return stats["rows"]
+
+    def add(self, **counters):
+        """Compteurs libres (ex. tension_zones=135)."""
+        self.counters.update(counters)
+
+    def summary(self):
+        parts = [f"{self.seconds:.2f}s"]
+        if self.rows_in is not None or self.rows_out is not None:
+            fmt = lambda n: "?" if n is None else f"{n:,}"
+            parts.append(f"{fmt(self.rows_in)} → {fmt(self.rows_out)} lignes")
+        if self.bytes_read:
+            parts.append(f"lu {self.bytes_read / 1e6:,.1f} Mo")
+        if self.bytes_written:
+            parts.append(f"écrit {self.bytes_written / 1e6:,.1f} Mo")
+        skews = [s["partitions"]["skew"] for s in self.outputs.values() if s.get("partitions", {}).get("skew")]
+        if skews:
+            parts.append(f"skew x{max(skews):.1f}")
+        parts.append(f"RSS {self.peak_rss_mb:,.0f} Mo")
+        backend = f" [{self.backend}]" if self.backend else ""
+        return f"⏱️ {self.name}{backend} : " + " · ".join(parts)
+
+    def to_dict(self):
+        return {k: v for k, v in vars(self).items() if v not in (None, {}) or k in ("rows_in", "rows_out")}
+
+
+class RunReport:
+    """
+    Étapes d'une exécution de script ; `write()` produit le rapport JSON,
+    appelé à la sortie de `with RunReport(...)` même si le bloc échoue.
+    """
+
+    def __init__(self, name, run_id=None, report_dir=REPORT_DIR):
+        self.name = name
+        self.run_id = run_id or os.environ.get(RUN_ID_ENV) or datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.report_dir = Path(report_dir)
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.stages = []
+        self.failed = False
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.failed = True
+        path = self.write()
+        if exc_type is not None:
+            print(f"❌ {self.name} en échec, rapport : {path}")
+        return False
+
+    @contextmanager
+    def stage(self, name, backend=None):
+        metrics = StageMetrics(name, backend)
+        rss_before = max_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield metrics
+        except BaseException:
+            metrics.status = "failed"
+            raise
+        finally:
+            metrics.seconds = round(time.perf_counter() - start, 3)
+            metrics.peak_rss_mb = round(max_rss_mb(), 1)
+            metrics.rss_growth_mb = round(metrics.peak_rss_mb - rss_before, 1)
+            self.stages.append(metrics)
+            print(metrics.summary())
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "argv": sys.argv,
+            "host": platform.node(),
+            "pid": os.getpid(),
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - self._start, 3),
+            "peak_rss_mb": round(max_rss_mb(), 1),
+            "status": "failed" if self.failed or any(s.status == "failed" for s in self.stages) else "ok",
+            "stages": [s.to_dict() for s in self.stages],
+        }
+
+    def write(self):
+        """data/_runs/<run_id>/<name>.json (écriture atomique) ; retourne le chemin."""
+        path = self.report_dir / self.run_id / f"{self.name}.json"
+        os.makedirs(path.parent, exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+        self.path = path
+        return path
@@ -0,0 +1,324 @@
+"""
+Module: Export binaire compact (coordonnées quantifiées + colonnes typées)
+──────────────────────────────────────────────────────────────────────────
+Variante de `write_geojson` (mêmes sources, mêmes arguments) pour les
+couches lourdes du tableau de bord (amenities + yearly_scores) :
+  - coordonnées quantifiées en int32 (pas de 1e-5 degré ≈ 1,1 m en latitude,
+    0,8 m en longitude autour de Lyon), codées en deltas le long de chaque
+    ligne : les deltas sont petits et se compressent très bien (gzip/brotli) ;
+  - propriétés stockées en colonnes typées (float64, float32, int32, uint8), les
+    chaînes en dictionnaire (codes int32 + chaînes uniques), les dicts
+    (`yearly_scores`) en matrice dense float32 (features × clés, scores
+    à 6 décimales : précision float32 suffisante) ;
+  - un manifeste JSON décrit chaque section du fichier binaire.
+
+Fichiers produits pour `write_compact(source, "DataViz/data/amenities")` :
+  - amenities.bin  : sections concaténées, alignées sur 8 octets, little-endian
+  - amenities.json : manifeste
+
+Manifeste (version 1) :
+  {
+    "format": "velomenaj-compact", "version": 1, "binary": "amenities.bin",
+    "n_features": N,
+    "geometry": {
+      "type": "Point" | "LineString" | "MultiLineString",
+      "scale": 1e-05,                   # degrés par unité entière
+      "coords": <section int32, 2·V>,   # x, y entrelacés ; 1er sommet de chaque
+                                        # partie absolu, les suivants en deltas
+      "part_offsets": <uint32, P+1>,    # partie → sommets
+      "feature_parts": <uint32, N+1>    # feature → parties
+    },
+    "properties": {
+      "<nom>": {"kind": "number", "data": <float64|int32, N>}        # NaN = nul
+             | {"kind": "bool", "data": <uint8, N>}                 # 255 = nul
+             | {"kind": "string", "codes": <int32, N>,              # -1 = nul
+                "dictionary": <uint8 utf-8>, "dictionary_offsets": <uint32, K+1>}
+             | {"kind": "map", "keys": [...], "data": <float32, N·K>}  # NaN = absent
+    }
+  }
+  Section = {"dtype": "int32", "offset": octets, "length": éléments}.
+
+Côté navigateur : `new Int32Array(buffer, offset, length)` etc., sans
+analyse de texte ; `read_compact` est la lecture de référence en Python.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.export.geojson_writer import (
+    DEFAULT_CHUNK_SIZE,
+    _column,
+    _columns,
+    _flatten_levels,
+    _iter_chunks,
+    _line_array,
+    _num_rows,
+    _to_float,
+)
+
+FORMAT = "velomenaj-compact"
+VERSION = 1
+DEFAULT_SCALE = 1e-5
+ALIGN = 8
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. GÉOMÉTRIES → SOMMETS QUANTIFIÉS
+# ═════════════════════════════════════════════════════════════
+
+def _line_chunk(col):
+    """
+    (xy float64 (V, 2), sommets par partie, parties par feature, type) depuis
+    une colonne LineString / MultiLineString ; None si aucune géométrie.
+    """
+    col, depth = _line_array(col)
+    if depth < 2:
+        return None
+    offsets, leaves = _flatten_levels(col)
+
+    # Positions [x, y, (z)] → on garde x, y
+    position_starts = offsets[-1][:-1]
+    xy = np.column_stack([leaves[position_starts], leaves[position_starts + 1]])
+
+    if depth == 2:
+        part_vertices = np.diff(offsets[0])
+        feature_parts = np.ones(len(col), dtype=np.int64)
+        geom_type = "LineString"
+    else:
+        part_vertices = np.diff(offsets[1])
+        feature_parts = np.diff(offsets[0])
+        geom_type = "MultiLineString"
+    return xy, part_vertices, feature_parts, geom_type
+
+
+def _point_chunk(chunk, lat_col, lon_col):
+    lat = _to_float(_column(chunk, lat_col))
+    lon = _to_float(_column(chunk, lon_col))
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    xy = np.column_stack([lon[valid], lat[valid]])
+    return xy, np.ones(int(valid.sum()), dtype=np.int64), valid.astype(np.int64), "Point"
+
+
+def _drop_empty(xy, part_vertices, feature_parts):
+    """Retire les parties vides puis les features sans partie ; retourne aussi le masque des features gardées."""
+    part_owner = np.repeat(np.arange(len(feature_parts)), feature_parts)
+    keep_part = part_vertices > 0
+    feature_parts = np.bincount(part_owner[keep_part], minlength=len(feature_parts))
+    keep_feature = feature_parts > 0
+    return xy, part_vertices[keep_part], feature_parts[keep_feature], keep_feature
+
+
+def quantize_deltas(xy, part_vertices, scale=DEFAULT_SCALE):
+    """Coordonnées → int32 quantifiés, en deltas à l'intérieur de chaque partie."""
+    q = np.rint(xy / scale)
+    if len(q) and np.abs(q).max() > np.iinfo(np.int32).max:
+        raise ValueError(f"Coordonnées hors de la plage int32 pour scale={scale}")
+    q = q.astype(np.int64)
+    deltas = q.copy()
+    deltas[1:] -= q[:-1]
+    starts = np.concatenate([[0], np.cumsum(part_vertices)[:-1]]).astype(np.int64)
+    deltas[starts] = q[starts]
+    return deltas.astype(np.int32)
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. PROPRIÉTÉS → COLONNES TYPÉES
+# ═════════════════════════════════════════════════════════════
+
+def _arrow_values(col):
+    if isinstance(col, pd.Series):
+        try:
+            return pa.array(col, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.array([None if v is None else json.dumps(v, ensure_ascii=False) for v in col.tolist()])
+    return col
+
+
+def _encode_property(values):
+    """Tableau Arrow d'une propriété → (description, {suffixe de section: tableau NumPy})."""
+    t = values.type
+    if pa.types.is_dictionary(t):
+        values, t = values.cast(t.value_type), t.value_type
+
+    if pa.types.is_boolean(t):
+        data = np.where(values.is_null().to_numpy(zero_copy_only=False), 255,
+                        values.fill_null(False).to_numpy(zero_copy_only=False)).astype(np.uint8)
+        return {"kind": "bool"}, {"data": data}
+
+    if pa.types.is_integer(t) and values.null_count == 0:
+        data = values.to_numpy(zero_copy_only=False)
+        if len(data) == 0 or (data.min() >= np.iinfo(np.int32).min and data.max() <= np.iinfo(np.int32).max):
+            return {"kind": "number"}, {"data": data.astype(np.int32)}
+
+    if pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t):
+        return {"kind": "number"}, {"data": values.cast(pa.float64()).to_numpy(zero_copy_only=False)}
+
+    if pa.types.is_map(t) or pa.types.is_struct(t):
+        rows = [None if v is None else dict(v) for v in values.to_pylist()]
+        keys = sorted({str(k) for row in rows if row for k in row})
+        index = {k: j for j, k in enumerate(keys)}
+        data = np.full((len(rows), len(keys)), np.nan, dtype=np.float32)
+        for i, row in enumerate(rows):
+            for k, v in (row or {}).items():
+                if v is not None:
+                    data[i, index[str(k)]] = float(v)
+        return {"kind": "map", "keys": keys}, {"data": data.ravel()}
+
+    if not (pa.types.is_string(t) or pa.types.is_large_string(t)):
+        values = pa.array([None if v is None else json.dumps(v, ensure_ascii=False, default=str)
+                           for v in values.to_pylist()], type=pa.string())
+
+    encoded = pc.dictionary_encode(values.cast(pa.string()))
+    codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+    words = [w.encode("utf-8") for w in encoded.dictionary.to_pylist()]
+    offsets = np.concatenate([[0], np.cumsum([len(w) for w in words], dtype=np.int64)]).astype(np.uint32)
+    blob = np.frombuffer(b"".join(words), dtype=np.uint8)
+    return {"kind": "string"}, {"codes": codes, "dictionary": blob, "dictionary_offsets": offsets}
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. ÉCRITURE / LECTURE
+# ═════════════════════════════════════════════════════════════
+
+def write_compact(source, basename, lat_col="lat", lon_col="lon", properties=(), geometry_col=None,
+                  scale=DEFAULT_SCALE, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Écrit `basename.bin` + `basename.json` et retourne le nombre de features.
+
+    Mêmes règles que write_geojson : features sans géométrie ignorées,
+    propriétés absentes de la source ignorées ; écriture atomique.
+    """
+    xy_parts, part_vertices, feature_parts = [], [], []
+    prop_values = {}
+    geom_type = None
+
+    for chunk in _iter_chunks(source, chunk_size):
+        if _num_rows(chunk) == 0:
+            continue
+        columns = _columns(chunk)
+        parsed = None
+        if geometry_col and geometry_col in columns:
+            parsed = _line_chunk(_column(chunk, geometry_col))
+        if parsed is None:
+            parsed = _point_chunk(chunk, lat_col, lon_col)
+
+        xy, vertices, parts, chunk_type = parsed
+        xy, vertices, parts, keep = _drop_empty(xy, vertices, parts)
+        if geom_type is None or chunk_type == "MultiLineString":
+            geom_type = chunk_type
+        xy_parts.append(xy)
+        part_vertices.append(vertices)
+        feature_parts.append(parts)
+
+        mask = pa.array(keep)
+        for prop in properties:
+            if prop in columns:
+                prop_values.setdefault(prop, []).append(_arrow_values(_column(chunk, prop)).filter(mask))
+
+    xy = np.concatenate(xy_parts) if xy_parts else np.zeros((0, 2))
+    part_vertices = np.concatenate(part_vertices) if part_vertices else np.zeros(0, dtype=np.int64)
+    feature_parts = np.concatenate(feature_parts) if feature_parts else np.zeros(0, dtype=np.int64)
+    n_features = len(feature_parts)
+
+    sections = {
+        "geometry.coords": quantize_deltas(xy, part_vertices, scale).ravel(),
+        "geometry.part_offsets": np.concatenate([[0], np.cumsum(part_vertices)]).astype(np.uint32),
+        "geometry.feature_parts": np.concatenate([[0], np.cumsum(feature_parts)]).astype(np.uint32),
+    }
+    manifest_props = {}
+    for prop, chunks in prop_values.items():
+        if len({c.type for c in chunks}) > 1:
+            # ex. structs dont les clés diffèrent d'un lot à l'autre : type commun inféré
+            chunks = [pa.array([v for c in chunks for v in c.to_pylist()])]
+        values = pa.chunked_array(chunks).combine_chunks() if len(chunks) > 1 else chunks[0]
+        description, arrays = _encode_property(values)
+        manifest_props[prop] = description
+        sections.update({f"properties.{prop}.{key}": array for key, array in arrays.items()})
+
+    bin_path, manifest_path = f"{basename}.bin", f"{basename}.json"
+    layout = {}
+    with open(f"{bin_path}.tmp", "wb") as f:
+        offset = 0
+        for name, array in sections.items():
+            array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+            pad = -offset % ALIGN
+            f.write(b"\0" * pad)
+            offset += pad
+            layout[name] = {"dtype": array.dtype.name, "offset": offset, "length": int(array.size)}
+            f.write(array.tobytes())
+            offset += array.nbytes
+
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "binary": os.path.basename(bin_path),
+        "n_features": n_features,
+        "geometry": {
+            "type": geom_type or "Point",
+            "scale": scale,
+            "coords": layout["geometry.coords"],
+            "part_offsets": layout["geometry.part_offsets"],
+            "feature_parts": layout["geometry.feature_parts"],
+        },
+        "properties": {
+            prop: {**description, **{
+                key.rsplit(".", 1)[1]: section for key, section in layout.items()
+                if key.startswith(f"properties.{prop}.") and key.count(".") == prop.count(".") + 2
+            }}
+            for prop, description in manifest_props.items()
+        },
+    }
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+    os.replace(f"{bin_path}.tmp", bin_path)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return n_features
+
+
+def read_compact(manifest_path):
+    """
+    Lecture de référence : (manifeste, coordonnées float64 (V, 2) absolues,
+    part_offsets, feature_parts, {propriété: valeurs}).
+    """
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    with open(os.path.join(os.path.dirname(manifest_path), manifest["binary"]), "rb") as f:
+        buffer = f.read()
+
+    def section(spec):
+        return np.frombuffer(buffer, dtype=np.dtype(spec["dtype"]).newbyteorder("<"),
+                             count=spec["length"], offset=spec["offset"])
+
+    geometry = manifest["geometry"]
+    part_offsets = section(geometry["part_offsets"]).astype(np.int64)
+    deltas = section(geometry["coords"]).reshape(-1, 2).astype(np.int64)
+
+    # Cumul des deltas, moins le cumul atteint avant le début de chaque partie
+    q = np.cumsum(deltas, axis=0)
+    starts = part_offsets[:-1]
+    before = np.zeros((len(starts), 2), dtype=np.int64)
+    has_prev = (starts > 0) & (np.diff(part_offsets) > 0)
+    before[has_prev] = q[starts[has_prev] - 1]
+    q -= np.repeat(before, np.diff(part_offsets), axis=0)
+    coords = q * geometry["scale"]
+
+    props = {}
+    n = manifest["n_features"]
+    for name, spec in manifest["properties"].items():
+        if spec["kind"] == "string":
+            codes = section(spec["codes"])
+            blob = section(spec["dictionary"]).tobytes()
+            offsets = section(spec["dictionary_offsets"])
+            words = [blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+            props[name] = [words[c] if c >= 0 else None for c in codes]
+        elif spec["kind"] == "map":
+            props[name] = section(spec["data"]).reshape(n, len(spec["keys"]))
+        else:
+            props[name] = section(spec["data"])
+    return manifest, coords, part_offsets, section(geometry["feature_parts"]).astype(np.int64), props
@@ -0,0 +1,326 @@
+"""
+Module: Écriture GeoJSON en flux, colonne par colonne
+──────────────────────────────────────────────────────
+Remplace la boucle `iterrows()` de `save_geojson` (scripts/prepare_dataviz_data.py) :
+  - les features sont produites par lots (chunks) directement depuis les
+    colonnes (Arrow / NumPy / pandas), sans dict Python par ligne ;
+  - chaque lot est écrit sur disque dès qu'il est prêt : la mémoire reste
+    bornée par la taille d'un lot, pas par la taille du fichier ;
+  - les coordonnées sont formatées en un seul passage sur les buffers
+    Arrow, avec une précision configurable (décimales fixes).
+
+Sources acceptées : pandas DataFrame, pyarrow Table, ou itérable de
+RecordBatch (ex. `pq.ParquetFile(path).iter_batches()`).
+
+Sans précision, le format de sortie est identique à `json.dump(..., indent=None)`
+(séparateurs ", " et ": ") ; les propriétés nulles sont omises.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+_encode = json.JSONEncoder().encode
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. LECTURE DES COLONNES
+# ═════════════════════════════════════════════════════════════
+
+def _iter_chunks(source, chunk_size):
+    """Découpe la source en lots (pandas DataFrame ou pyarrow RecordBatch/Table)."""
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_size):
+            yield source.iloc[start:start + chunk_size]
+    elif isinstance(source, (pa.Table, pa.RecordBatch)):
+        for start in range(0, source.num_rows, chunk_size):
+            yield source.slice(start, chunk_size)
+    else:
+        for batch in source:
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size)
+
+
+def _columns(chunk):
+    if isinstance(chunk, pd.DataFrame):
+        return list(chunk.columns)
+    return chunk.schema.names
+
+
+def _num_rows(chunk):
+    return len(chunk) if isinstance(chunk, pd.DataFrame) else chunk.num_rows
+
+
+def _column(chunk, name):
+    col = chunk[name]
+    if isinstance(col, pa.ChunkedArray):
+        col = col.combine_chunks()
+    return col
+
+
+def _is_null(value):
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    return value is pd.NaT
+
+
+def _to_pylist(col):
+    """Colonne → liste Python (types natifs, maps Arrow → dict)."""
+    if isinstance(col, pd.Series):
+        return col.tolist()
+    if pa.types.is_map(col.type):
+        return [None if v is None else dict(v) for v in col.to_pylist()]
+    return col.to_pylist()
+
+
+def _to_float(col):
+    if isinstance(col, pd.Series):
+        return pd.to_numeric(col, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return col.cast(pa.float64()).to_numpy(zero_copy_only=False)
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. FRAGMENTS JSON (propriétés, géométries)
+# ═════════════════════════════════════════════════════════════
+
+def _property_fragments(chunk, properties):
+    """
+    Une liste de fragments `"nom": valeur` par propriété (None si nulle),
+    calculée colonne par colonne.
+    """
+    columns = set(_columns(chunk))
+    out = []
+    for prop in properties:
+        if prop not in columns:
+            continue
+        key = _encode(prop) + ": "
+        values = _to_pylist(_column(chunk, prop))
+        out.append([None if _is_null(v) else key + _encode(v) for v in values])
+    return out
+
+
+def _flatten_levels(arr):
+    """
+    Épluche un tableau Arrow de listes imbriquées.
+
+    Retourne (offsets, leaves) : une liste d'offsets NumPy (du niveau externe
+    vers le niveau interne, chacun ramené à 0) et les feuilles en float64.
+    Seule la plage de valeurs référencée par `arr` est parcourue, ce qui
+    garde le coût d'un lot proportionnel à sa taille.
+    """
+    offsets = []
+    while pa.types.is_list(arr.type) or pa.types.is_large_list(arr.type):
+        o = arr.offsets.to_numpy()
+        arr = arr.values.slice(o[0], o[-1] - o[0])
+        offsets.append(o - o[0])
+    leaves = arr.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    return offsets, leaves
+
+
+def _join_level(items, offsets):
+    return ["[" + ", ".join(items[start:end]) + "]" for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def _finite_rows(offsets, leaves):
+    """
+    Masque par ligne : True si toutes ses feuilles sont finies. NaN et ±inf
+    (coordonnée nulle comprise) s'écriraient `NaN` / `Infinity`, du JSON
+    invalide. Les offsets composés donnent la plage de feuilles de chaque ligne.
+    """
+    bounds = offsets[0]
+    for level in offsets[1:]:
+        bounds = level[bounds]
+    bad = np.concatenate([[0], np.cumsum(~np.isfinite(leaves))])
+    return bad[bounds[1:]] == bad[bounds[:-1]]
+
+
+def _coordinates_json(col, precision):
+    """
+    Texte JSON des coordonnées de chaque ligne, construit depuis les buffers
+    Arrow : les positions [x, y] sont formatées en un seul passage sur les
+    feuilles, puis assemblées niveau par niveau grâce aux offsets.
+
+    Retourne (textes, masque des lignes aux coordonnées toutes finies).
+    """
+    offsets, leaves = _flatten_levels(col)
+    finite = _finite_rows(offsets, leaves)
+    fmt = "%r" if precision is None else f"%.{int(precision)}f"
+    if precision is not None:
+        leaves = np.round(leaves, precision)
+
+    position_offsets = offsets[-1]
+    if len(position_offsets) > 1 and np.all(np.diff(position_offsets) == 2):
+        pair_fmt = f"[{fmt}, {fmt}]"
+        xy = leaves.reshape(-1, 2).tolist()
+        items = [pair_fmt % (x, y) for x, y in xy]
+    else:
+        items = _join_level([fmt % v for v in leaves.tolist()], position_offsets.tolist())
+
+    for level in reversed(offsets[:-1]):
+        items = _join_level(items, level.tolist())
+    return items, finite
+
+
+def _nesting_depth(value):
+    depth = 0
+    while isinstance(value, (list, tuple)) and len(value):
+        depth, value = depth + 1, value[0]
+    return depth
+
+
+def _lines_from_values(values):
+    """
+    Coordonnées Python décodées → tableau Arrow d'une seule profondeur.
+
+    Dans un lot mêlant LineString et MultiLineString, chaque LineString
+    devient un MultiLineString à une partie. Les lignes encore non
+    convertibles (coordonnées mal formées) sont mises à None une par une,
+    et leur nombre est signalé.
+    """
+    if any(_nesting_depth(v) >= 3 for v in values):
+        values = [[v] if _nesting_depth(v) == 2 else v for v in values]
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    depth = max((_nesting_depth(v) for v in values), default=0)
+    line_type = pa.float64()
+    for _ in range(max(depth, 2)):
+        line_type = pa.list_(line_type)
+    rows, lost = [], 0
+    for v in values:
+        try:
+            rows.append(pa.scalar(v, type=line_type).as_py())
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            rows.append(None)
+            lost += v is not None
+    if lost:
+        print(f"⚠️ {lost} géométrie(s) mal formée(s) ignorée(s)")
+    return pa.array(rows, type=line_type)
+
+
+def _line_array(col):
+    """
+    Colonne de coordonnées → (tableau Arrow de listes imbriquées, profondeur).
+
+    Les strings JSON (ancien format) et les colonnes pandas d'objets sont
+    décodées ; profondeur 0 si la colonne ne contient aucune géométrie.
+    """
+    if isinstance(col, pd.Series):
+        col = _lines_from_values([_decode_geometry(v) for v in col.tolist()])
+    elif pa.types.is_string(col.type) or pa.types.is_large_string(col.type):
+        col = _lines_from_values([_decode_geometry(v) for v in col.to_pylist()])
+
+    if pa.types.is_null(col.type):
+        return col, 0
+
+    depth, t = 0, col.type
+    while pa.types.is_list(t) or pa.types.is_large_list(t):
+        depth, t = depth + 1, t.value_type
+    return col, depth
+
+
+def _line_fragments(col, precision):
+    """
+    Géométries LineString / MultiLineString depuis une colonne de coordonnées.
+
+    La profondeur d'imbrication donne le type : [[x, y], ...] → LineString,
+    [[[x, y], ...], ...] → MultiLineString. Les strings JSON (ancien format)
+    sont acceptées et décodées.
+    """
+    col, depth = _line_array(col)
+    if depth == 0:
+        return [None] * len(col)
+
+    prefix = '{"type": "MultiLineString", "coordinates": ' if depth >= 3 else '{"type": "LineString", "coordinates": '
+
+    # Lignes nulles ou vides, ou coordonnée non finie : pas de géométrie, la feature est ignorée
+    empty = pc.list_value_length(col).fill_null(0).to_numpy(zero_copy_only=False) == 0
+    coords, finite = _coordinates_json(col, precision)
+    lost = int((~finite & ~empty).sum())
+    if lost:
+        print(f"⚠️ {lost} géométrie(s) aux coordonnées non finies ignorée(s)")
+
+    keep = (finite & ~empty).tolist()
+    return [prefix + text + "}" if ok else None for text, ok in zip(coords, keep)]
+
+
+def _decode_geometry(value):
+    """Décode les strings JSON (None si invalide, la ligne sera ignorée)."""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return None if _is_null(value) else value
+
+
+def _point_fragments(chunk, lat_col, lon_col, precision):
+    lat = _to_float(_column(chunk, lat_col))
+    lon = _to_float(_column(chunk, lon_col))
+    fmt = "%r" if precision is None else f"%.{int(precision)}f"
+    point_fmt = '{"type": "Point", "coordinates": [' + fmt + ", " + fmt + "]}"
+
+    valid = np.isfinite(lat) & np.isfinite(lon)  # NaN / ±inf : JSON invalide, point ignoré
+    return [
+        point_fmt % (x, y) if ok else None
+        for x, y, ok in zip(lon.tolist(), lat.tolist(), valid.tolist())
+    ]
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. ÉCRITURE
+# ═════════════════════════════════════════════════════════════
+
+def write_geojson(source, filename, lat_col="lat", lon_col="lon", properties=(), geometry_col=None,
+                  precision=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Écrit une FeatureCollection en flux et retourne le nombre de features.
+
+    - geometry_col : colonne de coordonnées de lignes (sinon Point lat/lon)
+    - precision    : nombre de décimales des coordonnées (None = inchangé)
+
+    Le fichier est écrit dans `filename + ".tmp"` puis renommé : un export
+    interrompu ne laisse jamais un GeoJSON tronqué à la place de l'ancien.
+    """
+    tmp_path = f"{filename}.tmp"
+    n_features = 0
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write('{"type": "FeatureCollection", "features": [')
+
+        for chunk in _iter_chunks(source, chunk_size):
+            if _num_rows(chunk) == 0:
+                continue
+
+            if geometry_col and geometry_col in _columns(chunk):
+                geometries = _line_fragments(_column(chunk, geometry_col), precision)
+            else:
+                geometries = _point_fragments(chunk, lat_col, lon_col, precision)
+
+            props = _property_fragments(chunk, properties)
+            features = []
+            for i, geometry in enumerate(geometries):
+                if geometry is None:
+                    continue
+                body = ", ".join(col[i] for col in props if col[i] is not None)
+                features.append('{"type": "Feature", "properties": {' + body + '}, "geometry": ' + geometry + "}")
+
+            if features:
+                f.write((", " if n_features else "") + ", ".join(features))
+                n_features += len(features)
+
+        f.write("]}")
+
+    os.replace(tmp_path, filename)
+    return n_features
@@ -0,0 +1,459 @@
+"""
+Module: Pyramide de tuiles vectorielles (MVT) pour les couches DataViz
+──────────────────────────────────────────────────────────────────────
+Les couches de DataViz/data (amenities, counters, tension, coverage, …)
+sont découpées en tuiles z/x/y au format Mapbox Vector Tile v2 (protobuf) :
+le client ne télécharge que les tuiles visibles, à une résolution adaptée
+au zoom, au lieu de GeoJSON monolithiques.
+
+Principe, pour chaque zoom z de minzoom à maxzoom :
+  - projection Web Mercator (EPSG:3857) une seule fois, en coordonnées
+    "monde" [0, 1] ;
+  - passage en coordonnées entières de la grille du zoom (2^z · extent) puis
+    simplification Douglas-Peucker (tolérance en unités de tuile) : les
+    tracés qui se réduisent à un point disparaissent aux petits zooms ;
+  - découpage des tracés au cadre de chaque tuile (plus une marge `buffer`)
+    par Liang-Barsky, encodage MVT (MoveTo/LineTo, deltas zigzag) ;
+  - une tuile regroupe toutes les couches ; les tuiles vides ne sont pas
+    écrites.
+
+Géométries prises en charge : Point, MultiPoint, LineString,
+MultiLineString (celles des exports DataViz). Les propriétés dict sont
+aplaties (`yearly_scores.2023`), les listes sérialisées en JSON.
+
+Output:
+  - DataViz/tiles/{z}/{x}/{y}.pbf (non compressées)
+  - DataViz/tiles/metadata.json (TileJSON 3.0, champs par couche)
+
+Usage:
+  python -m src.export.vector_tiles [--input DataViz/data] [--output DataViz/tiles]
+         [--layers amenities counters tension coverage] [--minzoom 10] [--maxzoom 16]
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.geometry import point_segment_distance
+
+DEFAULT_LAYERS = ["amenities", "counters", "tension", "coverage"]
+EXTENT = 4096
+BUFFER = 64
+TOLERANCE = 8.0  # unités de tuile (1/512 de la tuile ≈ 0,5 px à 256 px)
+MAX_LAT = 85.0511287798
+
+POINT, LINESTRING = 1, 2
+_MOVE_TO, _LINE_TO = 1, 2
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. PROTOBUF (encodage minimal)
+# ═════════════════════════════════════════════════════════════
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field_varint(field, value):
+    return _varint(field << 3) + _varint(value)
+
+
+def _field_bytes(field, payload):
+    return _varint((field << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _field_packed(field, values):
+    return _field_bytes(field, b"".join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    """Message Value : string(1), double(3), uint64(5), sint64(6), bool(7)."""
+    if isinstance(value, (bool, np.bool_)):
+        return _field_varint(7, int(value))
+    if isinstance(value, (int, np.integer)):
+        value = int(value)
+        return _field_varint(5, value) if value >= 0 else _field_varint(6, _zigzag(value))
+    if isinstance(value, (float, np.floating)):
+        return _varint((3 << 3) | 1) + np.float64(value).tobytes()
+    return _field_bytes(1, str(value).encode("utf-8"))
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. PROJECTION, SIMPLIFICATION, DÉCOUPAGE
+# ═════════════════════════════════════════════════════════════
+
+def to_world(lon, lat):
+    """WGS84 (degrés) → Web Mercator normalisé [0, 1] (origine en haut à gauche)."""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2.0
+    return x, y
+
+
+def simplify(points, tolerance):
+    """Douglas-Peucker sur un tableau (n, 2) ; extrémités conservées."""
+    n = len(points)
+    if n <= 2 or tolerance <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        inner = points[i + 1:j]
+        d = point_segment_distance(inner[:, 0], inner[:, 1], *points[i], *points[j])
+        k = int(np.argmax(d))
+        if d[k] > tolerance:
+            keep[i + 1 + k] = True
+            stack += [(i, i + 1 + k), (i + 1 + k, j)]
+    return points[keep]
+
+
+def _dedupe(points):
+    """Supprime les sommets consécutifs identiques (après arrondi)."""
+    if len(points) < 2:
+        return points
+    same = np.all(points[1:] == points[:-1], axis=1)
+    return points[np.concatenate([[True], ~same])]
+
+
+def _clip_segment(x0, y0, x1, y1, box):
+    """Liang-Barsky : segment découpé au cadre, ou None s'il est dehors."""
+    xmin, ymin, xmax, ymax = box
+    dx, dy = x1 - x0, y1 - y0
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return None
+    return (x0 + t0 * dx, y0 + t0 * dy), (x0 + t1 * dx, y0 + t1 * dy), t1 < 1.0
+
+
+def clip_line(points, box):
+    """Découpe une polyligne (n, 2) au cadre ; retourne la liste des morceaux intérieurs."""
+    xmin, ymin, xmax, ymax = box
+    if (points[:, 0].min() >= xmin and points[:, 0].max() <= xmax
+            and points[:, 1].min() >= ymin and points[:, 1].max() <= ymax):
+        return [points]
+
+    parts, current = [], []
+    for (x0, y0), (x1, y1) in zip(points[:-1].tolist(), points[1:].tolist()):
+        clipped = _clip_segment(x0, y0, x1, y1, box)
+        if clipped is None:
+            if len(current) >= 2:
+                parts.append(current)
+            current = []
+            continue
+        start, end, exits = clipped
+        if not current or current[-1] != start:
+            if len(current) >= 2:
+                parts.append(current)
+            current = [start]
+        current.append(end)
+        if exits:
+            parts.append(current)
+            current = []
+    if len(current) >= 2:
+        parts.append(current)
+    return [np.array(part) for part in parts]
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. ENCODAGE DES FEATURES ET DES TUILES
+# ═════════════════════════════════════════════════════════════
+
+def _encode_points(points):
+    """Commandes MVT d'un (Multi)Point en coordonnées entières de tuile."""
+    commands = [(_MOVE_TO & 7) | (len(points) << 3)]
+    cx = cy = 0
+    for x, y in points:
+        commands += [_zigzag(x - cx), _zigzag(y - cy)]
+        cx, cy = x, y
+    return commands
+
+
+def _encode_lines(parts):
+    """Commandes MVT d'une (Multi)LineString ; le curseur est partagé entre morceaux."""
+    commands = []
+    cx = cy = 0
+    for part in parts:
+        commands += [(_MOVE_TO & 7) | (1 << 3), _zigzag(part[0][0] - cx), _zigzag(part[0][1] - cy)]
+        cx, cy = part[0]
+        commands.append((_LINE_TO & 7) | ((len(part) - 1) << 3))
+        for x, y in part[1:]:
+            commands += [_zigzag(x - cx), _zigzag(y - cy)]
+            cx, cy = x, y
+    return commands
+
+
+def _flatten_properties(properties, prefix=""):
+    flat = {}
+    for key, value in properties.items():
+        name = f"{prefix}{key}"
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            continue
+        if isinstance(value, dict):
+            flat.update(_flatten_properties(value, f"{name}."))
+        elif isinstance(value, (list, tuple)):
+            flat[name] = json.dumps(value, ensure_ascii=False)
+        else:
+            flat[name] = value
+    return flat
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """
+    Message Layer MVT v2. `features` : liste de (id, type, commandes, propriétés),
+    clés et valeurs dédupliquées dans la couche.
+    """
+    keys, values = {}, {}
+    encoded = []
+    for feature_id, geom_type, commands, properties in features:
+        tags = []
+        for key, value in properties.items():
+            value_key = (type(value).__name__, value)
+            tags += [keys.setdefault(key, len(keys)), values.setdefault(value_key, len(values))]
+        encoded.append(_field_bytes(2, b"".join([
+            _field_varint(1, feature_id),
+            _field_packed(2, tags) if tags else b"",
+            _field_varint(3, geom_type),
+            _field_packed(4, commands),
+        ])))
+
+    return b"".join([
+        _field_varint(15, 2),
+        _field_bytes(1, name.encode("utf-8")),
+        *encoded,
+        *(_field_bytes(3, key.encode("utf-8")) for key in keys),
+        *(_field_bytes(4, _encode_value(value)) for _, value in values),
+        _field_varint(5, extent),
+    ])
+
+
+# ═════════════════════════════════════════════════════════════
+# 4. PYRAMIDE
+# ═════════════════════════════════════════════════════════════
+
+def _feature_parts(geometry):
+    """(type MVT, [tableaux (n, 2) en coordonnées monde]) ou None si non géré."""
+    kind, coords = geometry.get("type"), geometry.get("coordinates")
+    if kind == "Point":
+        parts, geom_type = [[coords]], POINT
+    elif kind == "MultiPoint":
+        parts, geom_type = [coords], POINT
+    elif kind == "LineString":
+        parts, geom_type = [coords], LINESTRING
+    elif kind == "MultiLineString":
+        parts, geom_type = coords, LINESTRING
+    else:
+        return None
+    world = []
+    for part in parts:
+        lonlat = np.asarray(part, dtype=np.float64).reshape(-1, 2)
+        if len(lonlat):
+            world.append(np.column_stack(to_world(lonlat[:, 0], lonlat[:, 1])))
+    return (geom_type, world) if world else None
+
+
+def prepare_layer(features):
+    """GeoJSON features → [(id, type, parts monde, propriétés aplaties)], géométries non gérées ignorées."""
+    prepared, skipped = [], 0
+    for i, feature in enumerate(features):
+        parsed = _feature_parts(feature.get("geometry") or {})
+        if parsed is None:
+            skipped += 1
+            continue
+        geom_type, world = parsed
+        prepared.append((i + 1, geom_type, world, _flatten_properties(feature.get("properties") or {})))
+    if skipped:
+        print(f"⚠️ {skipped} feature(s) ignorée(s) (géométrie absente ou non gérée)")
+    return prepared
+
+
+def _tiles_at_zoom(layers, z, extent, buffer, tolerance, only=None):
+    """{(x, y): {couche: [features encodées]}} pour un zoom ; `only=(x, y)` : cette tuile seulement."""
+    scale = float(extent * (1 << z))
+    n_tiles = 1 << z
+    tiles = defaultdict(lambda: defaultdict(list))
+
+    for layer_name, features in layers.items():
+        for feature_id, geom_type, world, properties in features:
+            if geom_type == POINT:
+                pts = np.rint(np.concatenate(world) * scale).astype(np.int64)
+                tx, ty = pts[:, 0] // extent, pts[:, 1] // extent
+                for key in set(zip(tx.tolist(), ty.tolist())):
+                    if only is not None and key != only:
+                        continue
+                    inside = (tx == key[0]) & (ty == key[1])
+                    local = pts[inside] - np.array(key) * extent
+                    tiles[key][layer_name].append((feature_id, POINT, _encode_points(local.tolist()), properties))
+                continue
+
+            lines = []
+            for part in world:
+                line = _dedupe(np.rint(simplify(part * scale, tolerance)))
+                if len(line) >= 2:
+                    lines.append(line)
+            if not lines:
+                continue
+
+            stacked = np.concatenate(lines)
+            x0, y0 = np.floor((stacked.min(axis=0) - buffer) / extent).astype(int)
+            x1, y1 = np.floor((stacked.max(axis=0) + buffer) / extent).astype(int)
+            if only is not None:
+                x0, y0, x1, y1 = max(x0, only[0]), max(y0, only[1]), min(x1, only[0]), min(y1, only[1])
+            for tx in range(max(x0, 0), min(x1, n_tiles - 1) + 1):
+                for ty in range(max(y0, 0), min(y1, n_tiles - 1) + 1):
+                    origin = np.array([tx * extent, ty * extent], dtype=np.float64)
+                    box = (-buffer, -buffer, extent + buffer, extent + buffer)
+                    parts = []
+                    for line in lines:
+                        for piece in clip_line(line - origin, box):
+                            piece = _dedupe(np.rint(piece).astype(np.int64))
+                            if len(piece) >= 2:
+                                parts.append(piece.tolist())
+                    if parts:
+                        tiles[(tx, ty)][layer_name].append((feature_id, LINESTRING, _encode_lines(parts), properties))
+    return tiles
+
+
+def _tile_payload(tile_layers, extent):
+    return b"".join(_field_bytes(3, encode_layer(name, features, extent)) for name, features in tile_layers.items())
+
+
+def encode_tile(prepared, z, x, y, extent=EXTENT, buffer=BUFFER, tolerance=TOLERANCE):
+    """
+    Une tuile z/x/y à la demande (src/serving/server.py) ; b"" si vide.
+    `prepared` : {couche: prepare_layer(...)}, restreint de préférence aux
+    features qui touchent la tuile.
+    """
+    tiles = _tiles_at_zoom(prepared, z, extent, buffer, tolerance, only=(x, y))
+    return _tile_payload(tiles[(x, y)], extent) if (x, y) in tiles else b""
+
+
+def write_tile_pyramid(layers, output_dir, minzoom=10, maxzoom=16, extent=EXTENT,
+                       buffer=BUFFER, tolerance=TOLERANCE):
+    """
+    Écrit {z}/{x}/{y}.pbf et metadata.json dans output_dir (vidé au préalable).
+
+    `layers` : {nom de couche: liste de features GeoJSON}. Retourne le nombre
+    de tuiles écrites.
+    """
+    prepared = {name: prepare_layer(features) for name, features in layers.items()}
+
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+    n_written, n_bytes = 0, 0
+    for z in range(minzoom, maxzoom + 1):
+        tiles = _tiles_at_zoom(prepared, z, extent, buffer, tolerance)
+        for (x, y), tile_layers in tiles.items():
+            payload = _tile_payload(tile_layers, extent)
+            tile_dir = os.path.join(output_dir, str(z), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            with open(os.path.join(tile_dir, f"{y}.pbf"), "wb") as f:
+                f.write(payload)
+            n_written += 1
+            n_bytes += len(payload)
+        print(f"  z{z}: {len(tiles)} tuile(s)")
+
+    with open(os.path.join(output_dir, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(_tilejson(prepared, minzoom, maxzoom), f, indent=2, ensure_ascii=False)
+
+    print(f"✅ {n_written} tuiles écrites dans {output_dir} ({n_bytes / 1e6:.2f} Mo)")
+    return n_written
+
+
+def _tilejson(prepared, minzoom, maxzoom):
+    """TileJSON 3.0 : emprise, centre et champs de chaque couche."""
+    vector_layers, world = [], []
+    for name, features in prepared.items():
+        fields = {}
+        for _, _, parts, properties in features:
+            world.extend(parts)
+            for key, value in properties.items():
+                is_number = isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+                fields.setdefault(key, "Number" if is_number else "Boolean" if isinstance(value, bool) else "String")
+        vector_layers.append({"id": name, "fields": fields, "minzoom": minzoom, "maxzoom": maxzoom})
+
+    tilejson = {
+        "tilejson": "3.0.0",
+        "tiles": ["{z}/{x}/{y}.pbf"],
+        "minzoom": minzoom,
+        "maxzoom": maxzoom,
+        "vector_layers": vector_layers,
+    }
+    if world:
+        stacked = np.concatenate(world)
+        (wx0, wy0), (wx1, wy1) = stacked.min(axis=0), stacked.max(axis=0)
+        lon = lambda x: x * 360.0 - 180.0
+        lat = lambda y: float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y)))))
+        tilejson["bounds"] = [lon(wx0), lat(wy1), lon(wx1), lat(wy0)]
+        tilejson["center"] = [lon((wx0 + wx1) / 2), lat((wy0 + wy1) / 2), minzoom]
+    return tilejson
+
+
+def load_geojson_layers(input_dir, names):
+    """{nom: features} depuis input_dir/<nom>.geojson ; couches absentes ignorées."""
+    layers = {}
+    for name in names:
+        path = os.path.join(input_dir, f"{name}.geojson")
+        if not os.path.exists(path):
+            print(f"⚠️ Couche absente : {path}")
+            continue
+        with open(path, encoding="utf-8") as f:
+            layers[name] = json.load(f).get("features", [])
+    return layers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export des couches DataViz en tuiles vectorielles (MVT)")
+    parser.add_argument("--input", default=str(PROJECT_ROOT / "DataViz" / "data"))
+    parser.add_argument("--output", default=str(PROJECT_ROOT / "DataViz" / "tiles"))
+    parser.add_argument("--layers", nargs="+", default=DEFAULT_LAYERS)
+    parser.add_argument("--minzoom", type=int, default=10)
+    parser.add_argument("--maxzoom", type=int, default=16)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="simplification (unités de tuile)")
+    args = parser.parse_args()
+
+    layers = load_geojson_layers(args.input, args.layers)
+    write_tile_pyramid(layers, args.output, args.minzoom, args.maxzoom, tolerance=args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Module: Export annuel pour viz2 (scores par année, totaux des compteurs)
+────────────────────────────────────────────────────────────────────────
+Remplace export_velo_par_anne.ipynb (groupBy Spark, `.collect()` de toutes
+les lignes, dict Python imbriqué, `json.dump(indent=4)`) et la copie à la
+main des fichiers annuels de scores dans src/viz2/src/data.
+
+Principe:
+  - Une unité de travail = une année. Pour chaque année :
+      scores/<année>.json        scores de l'année (ScoreEntry de viz2) :
+                                 les lignes JSON de
+                                 amenagement_scoring_yearly_json/year=<année>/
+                                 recopiées telles quelles dans un tableau
+      velo_par_annee/<année>.json  {point_id: total} : somme du flux par
+                                 compteur, lue dans la partition year=<année>
+                                 de la copie compactée des mesures
+                                 (src/ingestion_silver/compaction.py)
+    JSON compact, écrit depuis les colonnes agrégées (Arrow), sans
+    repasser par une ligne Python par mesure.
+  - Incrémental : le manifeste garde l'empreinte des partitions source de
+    chaque année (taille + mtime des fichiers de mesures, contenu des
+    fichiers de scores, réécrits en entier par Spark à chaque exécution).
+    Seules les années dont l'empreinte a changé sont réécrites ; les années
+    passées, figées, ne sont pas recalculées.
+  - Les années à réécrire sont traitées en parallèle (threads : lecture
+    Parquet et agrégation Arrow libèrent le GIL).
+  - velo_par_annee.json (format historique {année: {point_id: total}}) est
+    réassemblé à partir des fichiers annuels, sans recalcul.
+
+Input:
+  - data/silver/silver_measures_union_compact/year=YYYY/month=MM/
+  - amenagement_scoring_yearly_json/year=YYYY/part-*.json (Scoring2.ipynb)
+
+Output:
+  - src/viz2/src/data/scores/<année>.json
+  - src/viz2/src/data/velo_par_annee/<année>.json, velo_par_annee.json
+  - src/viz2/src/data/_export_manifest.json
+  - data/_runs/<run_id>/yearly_export.json (rapport d'exécution)
+
+Usage:
+  python -m src.export.yearly_export [--measures ...] [--scores ...] [--output ...] [--jobs 4] [--full]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pyarrow.compute as pc
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.telemetry import RunReport
+from src.ingestion_silver.compaction import read_measures
+from src.ingestion_silver.pipeline import load_manifest, save_manifest
+
+MANIFEST_NAME = "_export_manifest.json"
+COUNTERS_DIR = "velo_par_annee"
+SCORES_DIR = "scores"
+DEFAULT_JOBS = 4
+
+_YEAR_DIR = re.compile(r"year=(\d{4})")
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. EMPREINTES DES PARTITIONS SOURCE PAR ANNÉE
+# ═════════════════════════════════════════════════════════════
+
+def _year_dirs(root):
+    """{année: chemin du répertoire year=YYYY} ; {} si la table est absente."""
+    if not os.path.isdir(root):
+        return {}
+    matches = (_YEAR_DIR.fullmatch(d) for d in sorted(os.listdir(root)))
+    return {int(m[1]): os.path.join(root, m[0]) for m in matches if m}
+
+
+def _data_files(year_dir, suffix):
+    for root, dirs, names in os.walk(year_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(("_", ".")))
+        for name in sorted(names):
+            if not name.startswith(("_", ".")) and name.endswith(suffix):
+                yield os.path.join(root, name)
+
+
+def measures_fingerprint(year_dir):
+    """{chemin relatif: [taille, mtime_ns]} des fichiers Parquet de l'année (comme le manifeste de compaction)."""
+    out = {}
+    for path in _data_files(year_dir, ".parquet"):
+        stat = os.stat(path)
+        out[os.path.relpath(path, year_dir).replace(os.sep, "/")] = [stat.st_size, stat.st_mtime_ns]
+    return out
+
+
+def scores_fingerprint(year_dir):
+    """Empreinte du contenu des fichiers JSON de l'année : leurs noms changent à chaque écriture Spark."""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in _data_files(year_dir, ".json"):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def source_fingerprints(measures_path, scores_path):
+    """{"YYYY": {"measures": ..., "scores": ...}} ; une source absente pour l'année vaut None."""
+    measures, scores = _year_dirs(measures_path), _year_dirs(scores_path)
+    return {
+        str(year): {
+            "measures": measures_fingerprint(measures[year]) if year in measures else None,
+            "scores": scores_fingerprint(scores[year]) if year in scores else None,
+        }
+        for year in sorted(set(measures) | set(scores))
+    }
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. FICHIERS D'UNE ANNÉE
+# ═════════════════════════════════════════════════════════════
+
+def counter_totals(measures_path, year):
+    """Table Arrow (point_id, total) triée : somme du flux par compteur sur l'année."""
+    table = read_measures(measures_path, columns=["point_id", "flux"], start=f"{year}-01-01", end=f"{year}-12-31")
+    table = table.filter(pc.is_valid(table.column("point_id")))
+    totals = table.group_by("point_id").aggregate([("flux", "sum")]).sort_by("point_id")
+    return totals.rename_columns(["point_id", "total"])
+
+
+def counters_json(totals):
+    """{"point_id":total,...} compact, depuis les deux colonnes (totaux entiers comme l'export historique)."""
+    ids = totals.column("point_id").cast("string").to_pylist()
+    values = pc.fill_null(totals.column("total"), 0).cast("int64").to_pylist()
+    return json.dumps(dict(zip(ids, values)), ensure_ascii=False, separators=(",", ":"))
+
+
+def scores_json(year_dir):
+    """Tableau JSON des lignes des fichiers de scores de l'année, recopiées sans les relire objet par objet."""
+    lines = []
+    for path in _data_files(year_dir, ".json"):
+        with open(path, encoding="utf-8") as f:
+            lines.extend(line.strip() for line in f if line.strip())
+    return "[" + ",\n".join(lines) + "]"
+
+
+def _write_text(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)
+    return len(text.encode("utf-8"))
+
+
+def export_year(year, measures_path, scores_path, output_dir, sources):
+    """Écrit les fichiers de l'année présents dans `sources` ; retourne l'entrée du manifeste."""
+    entry = {"sources": sources, "files": {}}
+    if sources["scores"] is not None:
+        name = f"{SCORES_DIR}/{year}.json"
+        text = scores_json(os.path.join(scores_path, f"year={year}"))
+        entry["files"]["scores"] = {"path": name, "bytes": _write_text(os.path.join(output_dir, name), text)}
+    if sources["measures"] is not None:
+        name = f"{COUNTERS_DIR}/{year}.json"
+        totals = counter_totals(measures_path, year)
+        entry["files"]["counters"] = {"path": name, "rows": totals.num_rows,
+                                      "bytes": _write_text(os.path.join(output_dir, name), counters_json(totals))}
+    return entry
+
+
+def _remove_year(output_dir, entry):
+    for info in entry.get("files", {}).values():
+        path = os.path.join(output_dir, info["path"])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _moved(year, entry):
+    """Entrée du manifeste écrite avant le déplacement des scores dans scores/ (<année>.json à la racine)."""
+    scores = (entry or {}).get("files", {}).get("scores")
+    return scores is not None and scores["path"] != f"{SCORES_DIR}/{year}.json"
+
+
+def assemble_velo_par_annee(output_dir, years):
+    """velo_par_annee.json {année: {point_id: total}} par concaténation des fichiers annuels."""
+    parts = []
+    for year in sorted(years):
+        path = os.path.join(output_dir, COUNTERS_DIR, f"{year}.json")
+        if os.path.exists(path):
+            parts.append(f'"{year}":' + Path(path).read_text(encoding="utf-8"))
+    return _write_text(os.path.join(output_dir, "velo_par_annee.json"), "{" + ",\n".join(parts) + "}")
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. EXPORT INCRÉMENTAL
+# ═════════════════════════════════════════════════════════════
+
+def export(measures_path, scores_path, output_dir, jobs=DEFAULT_JOBS, full=False, metrics=None):
+    """
+    Met les fichiers annuels à jour ; retourne la liste des années réécrites.
+    `metrics` (src/common/telemetry.py) reçoit les lignes de totaux écrites.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    previous_years = manifest.get("years", {})
+    done = {} if full else dict(previous_years)
+
+    current = source_fingerprints(measures_path, scores_path)
+    changed = [y for y in current if done.get(y, {}).get("sources") != current[y] or _moved(y, done.get(y))]
+    removed = [y for y in previous_years if y not in current]
+    print(f"✓ {len(current):,} année(s), {len(changed):,} à réécrire, {len(removed):,} à supprimer")
+
+    for year in removed:
+        _remove_year(output_dir, previous_years[year])
+        done.pop(year, None)
+    if full:
+        shutil.rmtree(os.path.join(output_dir, COUNTERS_DIR), ignore_errors=True)
+        shutil.rmtree(os.path.join(output_dir, SCORES_DIR), ignore_errors=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {
+            pool.submit(export_year, int(y), measures_path, scores_path, output_dir, current[y]): y
+            for y in changed
+        }
+        for future in as_completed(futures):
+            year = futures[future]
+            previous = previous_years.get(year)
+            entry = future.result()
+            # Fichier d'une source disparue pour l'année, ou d'un ancien emplacement : supprimé
+            if previous is not None:
+                _remove_year(output_dir, {"files": {k: v for k, v in previous.get("files", {}).items()
+                                                    if entry["files"].get(k, {}).get("path") != v["path"]}})
+            done[year] = entry
+            # Manifeste mis à jour après chaque année : une exécution interrompue reprend là
+            manifest["years"] = done
+            save_manifest(manifest_path, manifest)
+            if metrics is not None and "counters" in entry["files"]:
+                metrics.rows_out = (metrics.rows_out or 0) + entry["files"]["counters"]["rows"]
+            print(f"  {year}: {', '.join(entry['files']) or 'aucune source'}")
+
+    if changed or removed or not os.path.exists(os.path.join(output_dir, "velo_par_annee.json")):
+        assemble_velo_par_annee(output_dir, done)
+
+    manifest["years"] = done
+    manifest["sources"] = {"measures": str(measures_path), "scores": str(scores_path)}
+    manifest["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    save_manifest(manifest_path, manifest)
+    return sorted(changed)
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Export annuel viz2 : scores par année et totaux des compteurs")
+    parser.add_argument("--measures",
+                        default=str(PROJECT_ROOT / config["paths"]["silver_dir"] / "silver_measures_union_compact"))
+    parser.add_argument("--scores", default=str(PROJECT_ROOT / "amenagement_scoring_yearly_json"))
+    parser.add_argument("--output", default=str(PROJECT_ROOT / "src" / "viz2" / "src" / "data"))
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="années exportées en parallèle")
+    parser.add_argument("--full", action="store_true", help="ignorer le manifeste et tout réécrire")
+    args = parser.parse_args()
+
+    with RunReport("yearly_export") as report:
+        with report.stage("yearly_export") as st:
+            st.read(args.measures, args.scores)
+            years = export(args.measures, args.scores, args.output, jobs=args.jobs, full=args.full, metrics=st)
+            st.add(years_rewritten=len(years))
+            st.wrote(os.path.join(args.output, "velo_par_annee.json"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Module: Géométries des aménagements, bronze → silver en un seul passage
+────────────────────────────────────────────────────────────────────────
+Remplace les deux lectures `json.load` complètes du GeoJSON bronze
+(add_geom_coordinates.py et add_centroids_to_amenagements.py) et la
+SparkSession démarrée uniquement pour un `.toPandas()`.
+
+Principe:
+  - Le fichier est lu par blocs et les features sont décodées une à une
+    (`json.JSONDecoder.raw_decode`) : la mémoire est bornée par la taille
+    d'un bloc + d'un lot, quelle que soit la taille du fichier.
+  - Par lot de features, le noyau géométrique (src/common/geometry.py)
+    calcule en NumPy centroïde, bbox, longueur (m) et nombre de sommets.
+  - Les lots sont écrits au fil de l'eau dans silver_amenagement_geometry,
+    puis joints à silver_amenagements par identifiant (gid = amenagement_id).
+
+Input:
+  - data/bronze/metropole-de-lyon_pvo_patrimoine_voirie.pvoamenagementcyclable.json
+  - data/silver/silver_amenagements/ (Parquet)
+
+Output:
+  - data/silver/silver_amenagement_geometry/ (Parquet, 1 ligne par feature)
+  - data/silver/silver_amenagements_with_coordinates/ (Parquet)
+    colonnes ajoutées: geometry, bbox_*, centroid_lat, centroid_lon,
+    length_geom_m, n_vertices
+
+Usage:
+  python -m src.ingestion_silver.amenagement_geometry [--batch-size 5000]
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.geometry import (
+    MULTILINESTRING_TYPE, flatten_lines, from_lambert93, line_bounds, line_measures, to_lambert93,
+)
+
+BRONZE_FILE = "metropole-de-lyon_pvo_patrimoine_voirie.pvoamenagementcyclable.json"
+
+GEOMETRY_SCHEMA = pa.schema([
+    ("gid", pa.string()),
+    ("geometry", MULTILINESTRING_TYPE),
+    ("bbox_min_lon", pa.float64()),
+    ("bbox_min_lat", pa.float64()),
+    ("bbox_max_lon", pa.float64()),
+    ("bbox_max_lat", pa.float64()),
+    ("centroid_lat", pa.float64()),
+    ("centroid_lon", pa.float64()),
+    ("length_geom_m", pa.float64()),
+    ("n_vertices", pa.int32()),
+])
+
+_WHITESPACE = " \t\n\r"
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. LECTURE EN FLUX DES FEATURES
+# ═════════════════════════════════════════════════════════════
+
+def iter_features(path, block_size=1 << 20):
+    """
+    Itère sur les features d'une FeatureCollection sans charger le fichier.
+
+    Le tableau "features" est parcouru objet par objet ; le tampon ne garde
+    que la partie non encore décodée (au plus une feature + un bloc).
+    """
+    decoder = json.JSONDecoder()
+
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        # Début du tableau "features"
+        while True:
+            key = buf.find('"features"')
+            start = buf.find("[", key) if key >= 0 else -1
+            if start >= 0:
+                buf = buf[start + 1:]
+                break
+            block = f.read(block_size)
+            if not block:
+                raise ValueError(f"Pas de tableau 'features' dans {path}")
+            if key < 0:
+                buf = buf[-len('"features"'):]
+            buf += block
+
+        pos, eof = 0, False
+        while True:
+            while pos < len(buf) and (buf[pos] in _WHITESPACE or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+
+            try:
+                feature, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Feature coupée par la fin du bloc : on lit la suite
+                if eof:
+                    raise
+                block = f.read(block_size)
+                eof = not block
+                buf, pos = buf[pos:] + block, 0
+                continue
+
+            yield feature
+            pos = end
+
+
+def gid_key(value):
+    """Clé de jointure commune gid / amenagement_id ("123", jamais "123.0")."""
+    if value is None:
+        return None
+    try:
+        return str(int(float(value)))
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def _feature_coordinates(feature):
+    geometry = feature.get("geometry") or {}
+    coords = geometry.get("coordinates")
+    if not coords:
+        return None
+    if geometry.get("type") == "LineString":
+        return [coords]
+    if geometry.get("type") == "MultiLineString":
+        return coords
+    return None
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. MESURES PAR LOT
+# ═════════════════════════════════════════════════════════════
+
+def geometry_batch(features):
+    """RecordBatch GEOMETRY_SCHEMA pour une liste de features GeoJSON."""
+    gids = [gid_key((feature.get("properties") or {}).get("gid")) for feature in features]
+    geometry = pa.array([_feature_coordinates(feature) for feature in features], type=MULTILINESTRING_TYPE)
+
+    n = len(features)
+    owner, part, lon, lat = flatten_lines(geometry)
+    x, y = to_lambert93(lon, lat)
+    length, n_vertices, cx, cy = line_measures(owner, part, x, y, n)
+    centroid_lon, centroid_lat = from_lambert93(cx, cy)
+    bbox = line_bounds(owner, lon, lat, n)
+
+    empty = n_vertices == 0
+    centroid_lat[empty] = np.nan
+    centroid_lon[empty] = np.nan
+    length[empty] = np.nan
+
+    columns = [pa.array(gids, type=pa.string()), geometry]
+    columns += [pa.array(values, from_pandas=True) for values in (*bbox, centroid_lat, centroid_lon, length)]
+    columns.append(pa.array(n_vertices.astype(np.int32)))
+    return pa.RecordBatch.from_arrays(columns, schema=GEOMETRY_SCHEMA)
+
+
+def extract_geometries(bronze_path, output_path, batch_size=5000):
+    """
+    Décode le GeoJSON bronze en un passage et écrit silver_amenagement_geometry
+    lot par lot. Retourne le nombre de features écrites.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    n_features = 0
+
+    with pq.ParquetWriter(output_path, GEOMETRY_SCHEMA, compression="snappy") as writer:
+        batch = []
+        for feature in iter_features(bronze_path):
+            batch.append(feature)
+            if len(batch) >= batch_size:
+                writer.write_batch(geometry_batch(batch))
+                n_features += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(geometry_batch(batch))
+            n_features += len(batch)
+
+    return n_features
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. JOINTURE AVEC silver_amenagements
+# ═════════════════════════════════════════════════════════════
+
+def join_geometries(amenagements, geometries):
+    """
+    Ajoute les colonnes de `geometries` (GEOMETRY_SCHEMA) à la table
+    `amenagements` par amenagement_id = gid ; null si pas de tracé.
+
+    Jointure par `take` sur l'index des gid : la colonne géométrie est
+    recopiée telle quelle, sans conversion en objets Python.
+    """
+    ids = pa.array([gid_key(v) for v in amenagements.column("amenagement_id").to_pylist()], type=pa.string())
+    geometries = geometries.filter(pc.is_valid(geometries.column("gid")))
+    gids = geometries.column("gid").combine_chunks()
+
+    # En cas de doublon de gid, la dernière feature l'emporte (comme l'ancien dict)
+    last = np.unique(gids.to_numpy(zero_copy_only=False)[::-1], return_index=True)[1]
+    keep = np.sort(len(gids) - 1 - last)
+    geometries = geometries.take(pa.array(keep))
+
+    rows = pc.index_in(ids, value_set=geometries.column("gid").combine_chunks())
+    added = geometries.drop_columns(["gid"]).take(rows)
+
+    names = [name for name in amenagements.schema.names if name not in added.schema.names and name != "coordiantes"]
+    out = amenagements.select(names)
+    for field, column in zip(added.schema, added.columns):
+        out = out.append_column(field, column)
+    return out
+
+
+def build_silver_geometry(bronze_file, silver_dir, output_name="silver_amenagements_with_coordinates",
+                          batch_size=5000):
+    """Étape complète bronze → silver ; retourne la table écrite."""
+    geometry_path = f"{silver_dir}/silver_amenagement_geometry/part-0.parquet"
+    n_features = extract_geometries(bronze_file, geometry_path, batch_size=batch_size)
+    print(f"✓ Bronze GeoJSON: {n_features:,} features → {geometry_path}")
+
+    geometries = pq.read_table(geometry_path, memory_map=True)
+    amenagements = pq.read_table(f"{silver_dir}/silver_amenagements")
+    print(f"✓ silver_amenagements: {amenagements.num_rows:,} rows")
+
+    table = join_geometries(amenagements, geometries)
+    n_with = int(pc.sum(pc.greater(table.column("n_vertices").fill_null(0), 0)).as_py() or 0)
+    print(f"✓ Avec coordonnées: {n_with:,} / {table.num_rows:,}")
+
+    output_dir = f"{silver_dir}/{output_name}"
+    if os.path.isfile(output_dir):
+        os.remove(output_dir)  # ancien format : un seul fichier à la place du dossier
+    os.makedirs(output_dir, exist_ok=True)
+    pq.write_table(table, f"{output_dir}/part-0.parquet", compression="snappy")
+    print(f"✓ Saved {output_name} to {output_dir}")
+    return table
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Géométries des aménagements (bronze → silver)")
+    parser.add_argument("--bronze-file", default=str(PROJECT_ROOT / config["paths"]["bronze_dir"] / BRONZE_FILE))
+    parser.add_argument("--silver-dir", default=str(PROJECT_ROOT / config["paths"]["silver_dir"]))
+    parser.add_argument("--output-name", default="silver_amenagements_with_coordinates")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    build_silver_geometry(args.bronze_file, args.silver_dir, args.output_name, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Module: Contrats des tables silver
+──────────────────────────────────
+Règles de config/schemas.md appliquées aux tables silver telles qu'elles
+sont écrites (Nettoyage.ipynb, src/ingestion_silver/pipeline.py,
+scripts/add_geom_coordinates.py). Moteur : src/common/contracts.py.
+
+Sévérités:
+  - error : la table est inutilisable en aval (clé nulle ou dupliquée,
+    coordonnées hors bornes, clé étrangère cassée dans une table agrégée)
+  - warn  : anomalie de la source conservée telle quelle (mesures brutes
+    négatives ou sur un channel inconnu, filtrées ensuite par daily_clean)
+
+Input:
+  - data/silver/<table>/ (Parquet, partitions date= pour les mesures)
+
+Output:
+  - rapport par table (stdout, ou JSON avec --json) ; code retour 1 si une
+    règle "error" échoue
+
+Usage:
+  python -m src.ingestion_silver.checks [--silver-dir data/silver] [--tables silver_sites ...] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.contracts import WARN, Allowed, Contract, ForeignKey, InRange, NotNull, Unique, validate
+
+LAT_RANGE = (-90, 90)
+LON_RANGE = (-180, 180)
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. CONTRATS
+# ═════════════════════════════════════════════════════════════
+
+SILVER_CONTRACTS = {
+    "silver_sites": Contract(
+        "silver_sites",
+        rules=[
+            Unique(["site_id"]),
+            NotNull("site_id"),
+            InRange("lat", *LAT_RANGE),
+            InRange("lon", *LON_RANGE),
+        ],
+    ),
+    "silver_channels": Contract(
+        "silver_channels",
+        rules=[
+            Unique(["channel_id"]),
+            NotNull("channel_id"),
+            ForeignKey("site_id", "silver_sites"),
+        ],
+    ),
+    "silver_amenagements_with_coordinates": Contract(
+        "silver_amenagements_with_coordinates",
+        columns={"amenagement_id": "string", "geometry": "list"},
+        rules=[
+            Unique(["amenagement_id"]),
+            NotNull("amenagement_id"),
+            InRange("centroid_lat", *LAT_RANGE),
+            InRange("centroid_lon", *LON_RANGE),
+            InRange("length_geom_m", min=0),
+        ],
+    ),
+    "silver_measures": Contract(
+        "silver_measures",
+        columns={"ts_start": "timestamp", "is_valid": "boolean"},
+        rules=[
+            NotNull(["channel_id", "ts_start"]),
+            Unique(["channel_id", "ts_start"], severity=WARN),
+            InRange("flux", min=0, severity=WARN),
+            InRange("hour", 0, 23),
+            ForeignKey("channel_id", "silver_channels", severity=WARN),
+        ],
+    ),
+    "silver_measures_daily_clean": Contract(
+        "silver_measures_daily_clean",
+        rules=[
+            Unique(["channel_id", "date"]),
+            NotNull(["channel_id", "flux"]),
+            InRange("flux", min=0),
+            ForeignKey("channel_id", "silver_channels"),
+        ],
+    ),
+    "silver_measures_union": Contract(
+        "silver_measures_union",
+        key=["point_id", "date"],
+        rules=[
+            NotNull(["point_id", "point_type"]),
+            Allowed("point_type", ["auto", "manual"]),
+            InRange("flux", min=0),
+            InRange("lat", *LAT_RANGE),
+            InRange("lon", *LON_RANGE),
+        ],
+    ),
+}
+
+# Tables réécrites partition par partition par src/ingestion_silver/pipeline.py
+MEASURE_TABLES = ["silver_measures", "silver_measures_daily_clean", "silver_measures_union"]
+
+
+def measure_contracts(union_name="silver_measures_union"):
+    """(nom du répertoire, contrat) des tables de mesures ; la table union peut être renommée."""
+    return [(union_name if t == "silver_measures_union" else t, SILVER_CONTRACTS[t]) for t in MEASURE_TABLES]
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. VALIDATION
+# ═════════════════════════════════════════════════════════════
+
+def validate_silver(silver_dir, tables=None):
+    """Rapports des tables présentes sous silver_dir (toutes par défaut)."""
+    reports = []
+    for name in tables or SILVER_CONTRACTS:
+        path = os.path.join(silver_dir, name)
+        if not os.path.exists(path):
+            print(f"⚠️ {name} absente, ignorée")
+            continue
+        reports.append(validate(SILVER_CONTRACTS[name], path, base_dir=silver_dir))
+    return reports
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Validation des contrats silver")
+    parser.add_argument("--silver-dir", default=str(PROJECT_ROOT / config["paths"]["silver_dir"]))
+    parser.add_argument("--tables", nargs="+", choices=sorted(SILVER_CONTRACTS), default=None)
+    parser.add_argument("--json", action="store_true", help="rapport JSON sur stdout")
+    args = parser.parse_args()
+
+    reports = validate_silver(args.silver_dir, args.tables)
+    if args.json:
+        print(json.dumps([r.to_dict() for r in reports], indent=2, ensure_ascii=False, default=str))
+    else:
+        for report in reports:
+            print(report.summary())
+    sys.exit(0 if all(r.ok for r in reports) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Module: Compaction des mesures (partitions date= → year=/month= triées)
+───────────────────────────────────────────────────────────────────────
+Les tables de mesures sont écrites partition par jour (`date=YYYY-MM-DD`,
+Spark `.partitionBy("date")` ou src/ingestion_silver/pipeline.py) : des
+milliers de petits fichiers sur 2014–2025. C'est le bon format pour
+réécrire un jour, pas pour lire : chaque lecteur paie le listing et
+l'ouverture de chaque fichier.
+
+Principe:
+  - La table source n'est pas modifiée (l'ingestion continue d'y réécrire
+    des jours) ; une copie orientée lecture est maintenue à côté :
+        <table>_compact/year=YYYY/month=MM/part-0.parquet
+  - Dans chaque mois, les lignes sont triées par (point_id, date) (par
+    (channel_id, ts_start) pour silver_measures) et écrites en row groups
+    de ROW_GROUP_ROWS lignes : les statistiques min/max de chaque row group
+    couvrent une plage étroite de compteurs, et un filtre sur point_id ou
+    date ne lit que les row groups concernés.
+  - `date` devient une colonne de type date (comme le lit Spark depuis les
+    répertoires date=) ; year et month sont des colonnes de partition.
+  - Incrémental : un manifeste garde l'empreinte (taille, mtime) des
+    fichiers source de chaque mois ; seuls les mois modifiés sont réécrits,
+    les mois disparus de la source sont supprimés.
+
+Input:
+  - data/silver/<table>/date=YYYY-MM-DD/*.parquet
+
+Output:
+  - data/silver/<table>_compact/year=YYYY/month=MM/part-0.parquet
+  - data/silver/<table>_compact/_compaction_manifest.json
+
+Usage:
+  python -m src.ingestion_silver.compaction --tables silver_measures_union silver_measures_union2 [--full]
+  python -m src.ingestion_silver.compaction --tables silver_measures --row-group-rows 65536
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.telemetry import RunReport
+from src.ingestion_silver.pipeline import load_manifest, save_manifest
+
+MANIFEST_NAME = "_compaction_manifest.json"
+SUFFIX = "_compact"
+ROW_GROUP_ROWS = 32_768
+
+# Clé de tri par table (défaut : tables union, une ligne par point et par jour)
+SORT_KEYS = {"silver_measures": ["channel_id", "ts_start"]}
+DEFAULT_SORT_KEY = ["point_id", "date"]
+
+_DATE_DIR = re.compile(r"(?:^|/)date=(\d{4})-(\d{2})-\d{2}(?:/|$)")
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. FICHIERS SOURCE PAR MOIS
+# ═════════════════════════════════════════════════════════════
+
+def month_files(src_dir):
+    """{"YYYY-MM": {chemin relatif: [taille, mtime_ns]}} des fichiers Parquet de la source."""
+    months = {}
+    for root, dirs, names in os.walk(src_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(("_", ".")))
+        for name in sorted(names):
+            if name.startswith(("_", ".")) or not name.endswith(".parquet"):
+                continue
+            rel = os.path.relpath(os.path.join(root, name), src_dir).replace(os.sep, "/")
+            match = _DATE_DIR.search(rel)
+            if match is None:
+                raise ValueError(f"{src_dir}: {rel} hors d'une partition date=YYYY-MM-DD")
+            stat = os.stat(os.path.join(root, name))
+            months.setdefault(f"{match[1]}-{match[2]}", {})[rel] = [stat.st_size, stat.st_mtime_ns]
+    return months
+
+
+def _month_dir(dst_dir, month):
+    year, mm = month.split("-")
+    return os.path.join(dst_dir, f"year={year}", f"month={mm}")
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. RÉÉCRITURE D'UN MOIS
+# ═════════════════════════════════════════════════════════════
+
+def _as_date(column):
+    """Colonne de partition date (string, date ou timestamp) → date32."""
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        column = pc.strptime(column, format="%Y-%m-%d", unit="s")
+    return column.cast(pa.date32())
+
+
+def compact_month(src_dir, files, dst_dir, month, sort_by, row_group_rows=ROW_GROUP_ROWS):
+    """Réécrit un mois : lecture des fichiers du mois, tri, écriture en row groups ; retourne le nombre de lignes."""
+    dataset = ds.dataset(
+        [os.path.join(src_dir, rel) for rel in sorted(files)],
+        format="parquet",
+        partitioning=ds.partitioning(flavor="hive"),
+        partition_base_dir=str(src_dir),
+    )
+    table = dataset.to_table()
+    table = table.set_column(table.schema.get_field_index("date"), "date", _as_date(table.column("date")))
+    table = table.sort_by([(c, "ascending") for c in sort_by])
+
+    path = _month_dir(dst_dir, month)
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    pq.write_table(table, os.path.join(tmp_path, "part-0.parquet"), row_group_size=row_group_rows,
+                   write_statistics=True)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+
+def compact(src_dir, dst_dir, sort_by=DEFAULT_SORT_KEY, row_group_rows=ROW_GROUP_ROWS, full=False, metrics=None):
+    """
+    Met la copie compactée à jour ; retourne la liste des mois réécrits.
+    `metrics` (src/common/telemetry.py) reçoit les lignes réécrites.
+    """
+    manifest_path = os.path.join(dst_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    name = os.path.basename(os.path.normpath(str(src_dir)))
+    state = {} if full else manifest["sources"].get(name, {})
+    done = dict(state.get("months", {}))
+    if done and state.get("sort_by") != list(sort_by):
+        print("⚠️ Clé de tri modifiée → réécriture complète")
+        done = {}
+
+    current = month_files(src_dir)
+    changed = sorted(m for m in current if done.get(m) != current[m])
+    removed = sorted(m for m in done if m not in current)
+    print(f"✓ {src_dir}: {len(current):,} mois, {len(changed):,} à réécrire, {len(removed):,} à supprimer")
+
+    os.makedirs(dst_dir, exist_ok=True)
+    for month in removed:
+        shutil.rmtree(_month_dir(dst_dir, month), ignore_errors=True)
+        done.pop(month, None)
+
+    for month in changed:
+        n_rows = compact_month(src_dir, current[month], dst_dir, month, sort_by, row_group_rows)
+        # Manifeste mis à jour après chaque mois : une exécution interrompue reprend là
+        done[month] = current[month]
+        manifest["sources"][name] = {**state, "sort_by": list(sort_by), "months": done}
+        save_manifest(manifest_path, manifest)
+        if metrics is not None:
+            metrics.rows_out = (metrics.rows_out or 0) + n_rows
+
+    manifest["sources"][name] = {
+        "source": str(src_dir),
+        "sort_by": list(sort_by),
+        "months": done,
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    save_manifest(manifest_path, manifest)
+    return changed
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. LECTURE AVEC ÉLAGAGE
+# ═════════════════════════════════════════════════════════════
+
+def measures_filter(point_ids=None, start=None, end=None, key="point_id"):
+    """
+    Filtre pyarrow.dataset pour une table compactée : les bornes de période
+    élaguent les partitions year=/month=, puis les statistiques min/max des
+    row groups (key, date) évitent de lire les row groups hors sujet.
+    start / end : dates incluses (date ou "YYYY-MM-DD").
+    """
+    expr = None
+
+    def _and(e):
+        nonlocal expr
+        expr = e if expr is None else expr & e
+
+    if point_ids is not None:
+        _and(ds.field(key).isin([str(p) for p in point_ids]))
+    year, month = ds.field("year"), ds.field("month")
+    if start is not None:
+        start = date.fromisoformat(str(start))
+        _and((year > start.year) | ((year == start.year) & (month >= start.month)))
+        _and(ds.field("date") >= pa.scalar(start, pa.date32()))
+    if end is not None:
+        end = date.fromisoformat(str(end))
+        _and((year < end.year) | ((year == end.year) & (month <= end.month)))
+        _and(ds.field("date") <= pa.scalar(end, pa.date32()))
+    return expr
+
+
+def read_measures(path, columns=None, point_ids=None, start=None, end=None, key="point_id"):
+    """Table Arrow des mesures d'une table compactée, restreinte aux compteurs / à la période demandés."""
+    dataset = ds.dataset(str(path), format="parquet", partitioning="hive")
+    return dataset.to_table(columns=columns, filter=measures_filter(point_ids, start, end, key))
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Compaction des tables de mesures en partitions mensuelles triées")
+    parser.add_argument("--silver-dir", default=str(PROJECT_ROOT / config["paths"]["silver_dir"]))
+    parser.add_argument("--tables", nargs="+", default=["silver_measures_union", "silver_measures_union2"])
+    parser.add_argument("--row-group-rows", type=int, default=ROW_GROUP_ROWS)
+    parser.add_argument("--full", action="store_true", help="ignorer le manifeste et tout réécrire")
+    args = parser.parse_args()
+
+    with RunReport("compaction") as report:
+        for table in args.tables:
+            src_dir = os.path.join(args.silver_dir, table)
+            dst_dir = src_dir + SUFFIX
+            with report.stage(table) as st:
+                st.read(src_dir)
+                months = compact(src_dir, dst_dir, SORT_KEYS.get(table, DEFAULT_SORT_KEY),
+                                 args.row_group_rows, full=args.full, metrics=st)
+                st.add(months_rewritten=len(months))
+
+
+if __name__ == "__main__":
+    main()
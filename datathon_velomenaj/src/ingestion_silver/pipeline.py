@@ -0,0 +1,469 @@
+"""
+Module: Ingestion incrémentale des mesures de comptage (bronze → silver)
+────────────────────────────────────────────────────────────────────────
+Remplace la reconstruction complète (`mode("overwrite")`) de Nettoyage.ipynb
+pour silver_measures, silver_measures_daily_clean et la partie automatique
+de silver_measures_union.
+
+Principe:
+  - Un manifeste (data/silver/_ingestion_manifest.json) garde, par source :
+      * le watermark par channel (dernier `start_datetime` ingéré) ;
+      * une empreinte par jour (nombre de lignes, somme des comptages).
+  - Passe 1 (colonnes channel_id / start_datetime / count uniquement) :
+    on détermine les jours touchés = jours contenant des lignes plus
+    récentes que le watermark de leur channel, ou dont l'empreinte a changé
+    (lignes arrivées en retard, corrections, suppressions).
+  - Passe 2 : les lignes sont préfiltrées sur `start_datetime[:10]` (chaîne
+    brute, côté Arrow) avant tout parsing ; seules les lignes de ces jours
+    sont nettoyées, et seules les partitions `date=` correspondantes sont
+    réécrites dans les 3 tables.
+    Pour un rafraîchissement quotidien, le coût passe de tout l'historique
+    2014–2025 à un seul jour.
+
+  - Les lignes "manual" de silver_measures_union viennent de
+    silver_measures_union_manual (préparée par Nettoyage.ipynb) : seuls les
+    jours dont ces lignes ont changé sont réécrits, lignes "auto" conservées.
+    Ce module est le seul à écrire les 3 tables ; le notebook ne les
+    réécrit plus.
+
+Les partitions sont au format Hive (`date=YYYY-MM-DD/part-0.parquet`),
+lisibles par Spark comme par pyarrow/pandas.
+
+Input:
+  - data/bronze/comptage/measures/measures.csv
+  - data/silver/silver_channels/, data/silver/silver_sites/ (Parquet)
+  - data/silver/silver_measures_union_manual/ (Parquet, lignes "manual")
+
+Output:
+  - data/silver/silver_measures/            (partitionné par date)
+  - data/silver/silver_measures_daily_clean/ (partitionné par date)
+  - data/silver/silver_measures_union/      (partitionné par date, lignes "auto" et "manual")
+
+Usage:
+  python -m src.ingestion_silver.pipeline [--full] [--max-dates-per-pass 366]
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.contracts import enforce
+from src.common.telemetry import RunReport
+from src.ingestion_silver.checks import measure_contracts
+
+MEASURES_CSV = "comptage/measures/measures.csv"
+MANIFEST_NAME = "_ingestion_manifest.json"
+SOURCE_NAME = "measures"
+MANUAL_SOURCE = "manual_union"
+MANUAL_UNION = "silver_measures_union_manual"  # lignes "manual" préparées par Nettoyage.ipynb
+DATE_MIN, DATE_MAX = "2014-01-01", "2025-12-01"  # fenêtre de silver_measures_daily_clean (Nettoyage.ipynb)
+TIMEZONE = "Europe/Paris"
+
+BLOCK_SIZE = 64 << 20  # 64 Mo de CSV par lot
+
+MEASURES_COLUMNS = ["channel_id", "ts_start", "ts_end", "flux", "hour", "is_valid"]
+DAILY_COLUMNS = ["channel_id", "flux", "is_valid"]
+UNION_COLUMNS = ["point_id", "point_type", "flux", "lat", "lon", "direction", "vehicule_type"]
+
+_TZ_SUFFIX = re.compile(r"(Z|[+-]\d{2}:?\d{2})$")
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. MANIFESTE
+# ═════════════════════════════════════════════════════════════
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {"sources": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    """Écriture atomique (fichier temporaire puis renommage)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. LECTURE DU CSV BRONZE
+# ═════════════════════════════════════════════════════════════
+
+def iter_csv_batches(csv_path, columns, block_size=BLOCK_SIZE, raw_days=None):
+    """
+    Lots pandas d'un CSV lu en flux (colonnes en string, typage ensuite).
+
+    raw_days : si fourni, seules les lignes dont `start_datetime[:10]`
+    (chaîne brute, avant tout parsing) est dans cet ensemble sont gardées ;
+    le filtre est appliqué côté Arrow, avant la conversion pandas.
+    """
+    reader = pv.open_csv(
+        csv_path,
+        read_options=pv.ReadOptions(block_size=block_size),
+        convert_options=pv.ConvertOptions(
+            include_columns=columns,
+            column_types={name: pa.string() for name in columns},
+        ),
+    )
+    value_set = pa.array(sorted(raw_days), type=pa.string()) if raw_days is not None else None
+    for batch in reader:
+        if value_set is not None:
+            day = pc.utf8_slice_codeunits(batch.column("start_datetime"), 0, 10)
+            batch = batch.filter(pc.fill_null(pc.is_in(day, value_set=value_set), False))
+            if batch.num_rows == 0:
+                continue
+        yield batch.to_pandas()
+
+
+def raw_day_candidates(dates):
+    """
+    Jours bruts (`start_datetime[:10]`) pouvant donner un des jours locaux
+    `dates` : le jour lui-même et ses voisins, car un horodatage avec
+    décalage (Z, +01:00...) peut changer de jour une fois converti en
+    Europe/Paris. Le filtre exact sur `date` se fait après nettoyage.
+    """
+    out = set()
+    for date in dates:
+        day = pd.Timestamp(date)
+        out |= {(day + pd.Timedelta(days=k)).strftime("%Y-%m-%d") for k in (-1, 0, 1)}
+    return out
+
+
+def parse_timestamps(values):
+    """
+    Strings ISO 8601 → datetime64 naïf en heure locale (comme `to_timestamp`
+    de Spark avec une session en Europe/Paris).
+    """
+    values = pd.Series(values, dtype="string")
+    sample = values.dropna()
+    if len(sample) and _TZ_SUFFIX.search(sample.iloc[0]):
+        ts = pd.to_datetime(values, errors="coerce", utc=True, format="ISO8601")
+        return ts.dt.tz_convert(TIMEZONE).dt.tz_localize(None)
+    return pd.to_datetime(values, errors="coerce", format="ISO8601")
+
+
+def scan_source(csv_path, block_size=BLOCK_SIZE):
+    """
+    Passe 1 : empreinte par jour et watermark par channel.
+
+    Retourne (fingerprints, watermarks) :
+      - fingerprints : {"YYYY-MM-DD": [n_rows, flux_sum]}
+      - watermarks   : {channel_id: "YYYY-MM-DDTHH:MM:SS"}
+    """
+    per_day, per_channel = [], []
+    for pdf in iter_csv_batches(csv_path, ["channel_id", "start_datetime", "count"], block_size):
+        ts = parse_timestamps(pdf["start_datetime"])
+        counts = pd.to_numeric(pdf["count"], errors="coerce").fillna(0)
+        day = ts.dt.strftime("%Y-%m-%d")
+
+        per_day.append(pd.DataFrame({"date": day, "count": counts}).groupby("date")["count"].agg(["size", "sum"]))
+        per_channel.append(pd.DataFrame({"channel_id": pdf["channel_id"], "ts": ts}).groupby("channel_id")["ts"].max())
+
+    if not per_day:
+        return {}, {}
+
+    days = pd.concat(per_day).groupby(level=0).sum()
+    channels = pd.concat(per_channel).groupby(level=0).max().dropna()
+
+    fingerprints = {d: [int(n), float(s)] for d, n, s in zip(days.index, days["size"], days["sum"])}
+    watermarks = {c: ts.isoformat() for c, ts in channels.items()}
+    return fingerprints, watermarks
+
+
+def affected_dates(fingerprints, watermarks, state):
+    """
+    Jours à (re)construire par rapport à l'état précédent du manifeste :
+    jours nouveaux, jours dont l'empreinte a changé, jours disparus, et
+    jours postérieurs au watermark d'un channel.
+    """
+    previous = state.get("fingerprints", {})
+    dates = {d for d, fp in fingerprints.items() if previous.get(d) != fp}
+    dates |= set(previous) - set(fingerprints)
+
+    # Jours entre l'ancien et le nouveau watermark de chaque channel
+    previous_wm = state.get("watermarks", {})
+    for channel, wm in watermarks.items():
+        old = previous_wm.get(channel)
+        if old is not None and wm > old:
+            start, end = old[:10], wm[:10]
+            dates |= {d for d in fingerprints if start <= d <= end}
+
+    return sorted(dates)
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. NETTOYAGE (mêmes règles que Nettoyage.ipynb)
+# ═════════════════════════════════════════════════════════════
+
+def clean_measures(pdf):
+    """Lignes bronze → silver_measures (+ colonne date en string)."""
+    out = pd.DataFrame({
+        "channel_id": pdf["channel_id"].astype("string"),
+        "ts_start": parse_timestamps(pdf["start_datetime"]),
+        "ts_end": parse_timestamps(pdf["end_datetime"]),
+        "flux": pd.to_numeric(pdf["count"], errors="coerce").astype("Int32"),
+    })
+    out["date"] = out["ts_start"].dt.strftime("%Y-%m-%d")
+    out["hour"] = out["ts_start"].dt.hour.astype("Int32")
+    out["is_valid"] = (out["flux"].notna() & (out["flux"] >= 0) & out["channel_id"].notna()).fillna(False).astype(bool)
+    return out
+
+
+def daily_clean(pdf_measures, channel_ids):
+    """silver_measures → silver_measures_daily_clean (1 ligne = channel × jour, DATE_MIN ≤ date ≤ DATE_MAX)."""
+    m = pdf_measures[
+        pdf_measures["channel_id"].notna() & pdf_measures["date"].notna()
+        & (pdf_measures["date"] >= DATE_MIN) & (pdf_measures["date"] <= DATE_MAX)
+        & pdf_measures["flux"].notna() & (pdf_measures["flux"] >= 0)
+        & pdf_measures["channel_id"].isin(channel_ids)
+    ]
+    daily = m.groupby(["channel_id", "date"], as_index=False)["flux"].sum()
+    daily["flux"] = daily["flux"].astype("Int32")
+    daily["is_valid"] = True
+    return daily
+
+
+def union_auto(pdf_daily, channels, sites):
+    """Partie automatique de silver_measures_union (1 ligne = site × jour)."""
+    bike = channels[channels["is_bike_channel"].fillna(False).astype(bool)][["channel_id", "site_id"]]
+    auto = pdf_daily.merge(bike, on="channel_id").merge(sites[["site_id", "lat", "lon"]], on="site_id")
+    # dropna=False : comme le groupBy Spark, un site sans coordonnées reste dans l'union
+    auto = auto.groupby(["site_id", "date", "lat", "lon"], as_index=False, dropna=False)["flux"].sum()
+
+    return pd.DataFrame({
+        "point_id": auto["site_id"].astype("string"),
+        "point_type": "auto",
+        "date": auto["date"],
+        "flux": auto["flux"].astype("Int32"),
+        "lat": auto["lat"],
+        "lon": auto["lon"],
+        "direction": pd.Series(None, index=auto.index, dtype="string"),
+        "vehicule_type": pd.Series(None, index=auto.index, dtype="string"),
+    })
+
+
+# ═════════════════════════════════════════════════════════════
+# 4. ÉCRITURE DES PARTITIONS
+# ═════════════════════════════════════════════════════════════
+
+def _partition_dir(table_dir, date):
+    return os.path.join(table_dir, f"date={date}")
+
+
+def write_partitions(pdf, table_dir, dates, columns, keep=None):
+    """
+    Remplace les partitions `date=` listées par les lignes de `pdf`.
+
+    - Les jours sans ligne voient leur partition supprimée.
+    - keep(pdf_existant) → lignes existantes à conserver (ex. lignes
+      "manual" de la table union, produites par une autre étape).
+    """
+    groups = dict(tuple(pdf.groupby("date"))) if len(pdf) else {}
+    for date in dates:
+        path = _partition_dir(table_dir, date)
+        part = groups.get(date, pdf.iloc[0:0])[columns]
+
+        if keep is not None and os.path.isdir(path):
+            existing = pq.read_table(path).to_pandas()
+            part = pd.concat([keep(existing)[columns], part], ignore_index=True)
+
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        if len(part) == 0:
+            continue
+
+        os.makedirs(path)
+        tmp_path = os.path.join(path, "part-0.parquet.tmp")
+        pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp_path)
+        os.replace(tmp_path, os.path.join(path, "part-0.parquet"))
+
+
+def _day_digest(part):
+    """Empreinte du contenu d'un jour : nombre de lignes + hash des lignes triées."""
+    part = part.sort_values(list(part.columns), kind="stable").reset_index(drop=True)
+    return f"{len(part)}:{int(pd.util.hash_pandas_object(part, index=False).sum()):x}"
+
+
+def read_manual_union(silver_dir):
+    """Lignes "manual" (UNION_COLUMNS + date string) écrites par Nettoyage.ipynb ; None si absente."""
+    path = os.path.join(silver_dir, MANUAL_UNION)
+    if not os.path.exists(path):
+        return None
+    pdf = ds.dataset(path, format="parquet", partitioning="hive").to_table().to_pandas()
+    pdf["date"] = pd.to_datetime(pdf["date"].astype(str)).dt.strftime("%Y-%m-%d")
+    for name in ("point_id", "point_type", "direction", "vehicule_type"):
+        pdf[name] = pdf[name].astype("string")
+    pdf["flux"] = pdf["flux"].astype("Int32")
+    return pdf[["date"] + UNION_COLUMNS]
+
+
+def merge_manual(silver_dir, union_name, manifest, full=False):
+    """
+    Fusionne silver_measures_union_manual dans la table union : seules les
+    partitions des jours dont les lignes manuelles ont changé (ou disparu)
+    sont réécrites, en gardant leurs lignes "auto". Met à jour `manifest`
+    (source MANUAL_SOURCE) ; retourne la liste des jours réécrits.
+    """
+    pdf = read_manual_union(silver_dir)
+    if pdf is None:
+        return []
+    current = {date: _day_digest(part) for date, part in pdf.groupby("date")}
+    previous = {} if full else manifest["sources"].get(MANUAL_SOURCE, {}).get("fingerprints", {})
+    dates = sorted(d for d in set(current) | set(previous) if current.get(d) != previous.get(d))
+
+    if dates:
+        write_partitions(
+            pdf, os.path.join(silver_dir, union_name), dates, UNION_COLUMNS,
+            keep=lambda existing: existing[existing["point_type"] == "auto"],
+        )
+        union_contract = dict(measure_contracts(union_name))[union_name]
+        enforce([(union_contract, os.path.join(silver_dir, union_name))],
+                base_dir=silver_dir, filter=ds.field("date").isin(dates))
+        print(f"✓ Lignes manuelles : {len(dates):,} jour(s) réécrit(s) dans {union_name}")
+
+    manifest["sources"][MANUAL_SOURCE] = {
+        "source": os.path.join(silver_dir, MANUAL_UNION),
+        "fingerprints": current,
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    return dates
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# ═════════════════════════════════════════════════════════════
+# 5. ORCHESTRATION
+# ═════════════════════════════════════════════════════════════
+
+def run(csv_path, silver_dir, full=False, max_dates_per_pass=366, union_name="silver_measures_union",
+        block_size=BLOCK_SIZE, metrics=None):
+    """
+    Ingestion incrémentale ; retourne la liste des jours reconstruits.
+    `metrics` (src/common/telemetry.py) reçoit les lignes lues et écrites.
+
+    Les jours touchés sont traités par paquets de `max_dates_per_pass`
+    (une lecture CSV par paquet) : la mémoire reste bornée même pour une
+    reconstruction complète. Seule la passe 1 parse tous les horodatages ;
+    chaque paquet ne nettoie que les lignes de ses jours (préfiltre sur la
+    chaîne brute, voir raw_day_candidates). Le manifeste est mis à jour après chaque
+    paquet, donc une exécution interrompue reprend où elle s'était arrêtée.
+    Les contrats de src/ingestion_silver/checks.py sont vérifiés sur chaque
+    paquet avant la mise à jour du manifeste (ContractViolation sinon).
+    Les lignes "manual" de la table union sont fusionnées ensuite (merge_manual).
+    """
+    manifest_path = os.path.join(silver_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    state = {} if full else manifest["sources"].get(SOURCE_NAME, {})
+
+    fingerprints, watermarks = scan_source(csv_path, block_size)
+    dates = affected_dates(fingerprints, watermarks, state)
+    print(f"✓ Scan: {len(fingerprints):,} jours, {len(watermarks):,} channels, {len(dates):,} jours à reconstruire")
+
+    done = dict(state.get("fingerprints", {}))
+    if dates:
+        channels = pd.read_parquet(os.path.join(silver_dir, "silver_channels"))
+        channels["channel_id"] = channels["channel_id"].astype("string")
+        sites = pd.read_parquet(os.path.join(silver_dir, "silver_sites"))
+        channel_ids = set(channels["channel_id"].dropna())
+    columns = ["channel_id", "start_datetime", "end_datetime", "count"]
+
+    for chunk in _chunks(dates, max_dates_per_pass):
+        wanted = set(chunk)
+        parts = []
+        # Préfiltre sur la chaîne brute : seules les lignes des jours du
+        # paquet (et de leurs voisins) sont parsées et nettoyées
+        for pdf in iter_csv_batches(csv_path, columns, block_size, raw_days=raw_day_candidates(chunk)):
+            measures = clean_measures(pdf)
+            parts.append(measures[measures["date"].isin(wanted)])
+        pdf_measures = pd.concat(parts, ignore_index=True)
+
+        pdf_daily = daily_clean(pdf_measures, channel_ids)
+        pdf_union = union_auto(pdf_daily, channels, sites)
+
+        write_partitions(pdf_measures, os.path.join(silver_dir, "silver_measures"), chunk, MEASURES_COLUMNS)
+        write_partitions(pdf_daily, os.path.join(silver_dir, "silver_measures_daily_clean"), chunk, DAILY_COLUMNS)
+        write_partitions(
+            pdf_union, os.path.join(silver_dir, union_name), chunk, UNION_COLUMNS,
+            keep=lambda existing: existing[existing["point_type"] != "auto"],
+        )
+
+        # Barrière : contrats vérifiés sur les seules partitions réécrites ;
+        # en cas d'échec le manifeste n'avance pas et le paquet sera refait
+        enforce(
+            [(contract, os.path.join(silver_dir, name)) for name, contract in measure_contracts(union_name)],
+            base_dir=silver_dir, filter=ds.field("date").isin(chunk),
+        )
+
+        for date in chunk:
+            if date in fingerprints:
+                done[date] = fingerprints[date]
+            else:
+                done.pop(date, None)
+        manifest["sources"][SOURCE_NAME] = {**state, "fingerprints": done}
+        save_manifest(manifest_path, manifest)
+        print(f"  ✓ {chunk[0]} → {chunk[-1]}: {len(pdf_measures):,} mesures, {len(pdf_daily):,} lignes journalières")
+        if metrics is not None:
+            metrics.rows_in = (metrics.rows_in or 0) + len(pdf_measures)
+            metrics.rows_out = (metrics.rows_out or 0) + len(pdf_measures) + len(pdf_daily) + len(pdf_union)
+
+    manifest["sources"][SOURCE_NAME] = {
+        "source": str(csv_path),
+        "watermarks": watermarks,
+        "fingerprints": done,
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    save_manifest(manifest_path, manifest)
+
+    manual_dates = merge_manual(silver_dir, union_name, manifest, full=full)
+    save_manifest(manifest_path, manifest)
+    return sorted(set(dates) | set(manual_dates))
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Ingestion incrémentale silver_measures")
+    parser.add_argument("--measures-csv", default=str(PROJECT_ROOT / config["paths"]["bronze_dir"] / MEASURES_CSV))
+    parser.add_argument("--silver-dir", default=str(PROJECT_ROOT / config["paths"]["silver_dir"]))
+    parser.add_argument("--union-name", default="silver_measures_union")
+    parser.add_argument("--max-dates-per-pass", type=int, default=366)
+    parser.add_argument("--full", action="store_true", help="ignorer le manifeste et tout reconstruire")
+    args = parser.parse_args()
+
+    with RunReport("ingestion_silver") as report:
+        with report.stage("silver_measures") as st:
+            st.read(args.measures_csv)
+            dates = run(args.measures_csv, args.silver_dir, full=args.full,
+                        max_dates_per_pass=args.max_dates_per_pass, union_name=args.union_name, metrics=st)
+            st.add(dates_rebuilt=len(dates))
+    if dates:
+        print(f"✓ {len(dates):,} partitions reconstruites ({dates[0]} → {dates[-1]})")
+    else:
+        print("✓ Rien à faire : silver à jour")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Module: Exécution du pipeline par graphe d'étapes avec cache par empreinte
+──────────────────────────────────────────────────────────────────────────
+Remplace l'enchaînement à la main (Nettoyage → géométries → usage spatial →
+scoring → prédiction → DataViz) où chaque étape relisait et réécrivait tout.
+
+Principe:
+  - config/pipeline.yml déclare chaque étape : commande, entrées, sorties,
+    fichiers de code, paramètres. Les dépendances se déduisent des chemins
+    (une étape dépend de celle qui produit l'une de ses entrées).
+  - Empreinte d'une étape = hash(commande rendue, paramètres, contenu des
+    fichiers de code, contenu des entrées). Les hash de fichiers sont mis en
+    cache par (taille, mtime) : un gros CSV inchangé n'est pas relu.
+  - Une étape est sautée si son empreinte et celle de ses sorties sont
+    identiques au dernier succès. Une étape relancée dont les sorties ne
+    changent pas (même contenu) ne relance pas l'aval.
+  - Les étapes prêtes (amont terminé) tournent en parallèle (--jobs).
+
+Input:
+  - config/pipeline.yml, config/config.yml (section `params`)
+
+Output:
+  - data/_pipeline/state.json (empreintes, cache des hash de fichiers)
+  - data/_pipeline/logs/<étape>.log (sortie de chaque commande)
+  - data/_runs/<run_id>/ (rapports d'exécution des étapes, src/common/telemetry.py)
+
+Usage:
+  python -m src.orchestration.dag [--jobs 2] [--dry-run]
+  python -m src.orchestration.dag --only scoring dataviz [--force scoring]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.telemetry import RUN_ID_ENV
+
+PIPELINE_FILE = PROJECT_ROOT / "config" / "pipeline.yml"
+CONFIG_FILE = PROJECT_ROOT / "config" / "config.yml"
+CHUNK_SIZE = 1 << 20
+ABSENT = "absent"
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. GRAPHE DES ÉTAPES
+# ═════════════════════════════════════════════════════════════
+
+class Stage:
+    """Une étape de config/pipeline.yml, commande rendue avec ses paramètres."""
+
+    def __init__(self, name, spec, global_params):
+        self.name = name
+        self.inputs = [os.path.normpath(p) for p in spec.get("inputs", [])]
+        self.outputs = [os.path.normpath(p) for p in spec.get("outputs", [])]
+        self.code = [os.path.normpath(p) for p in spec.get("code", [])]
+        self.params = dict(spec.get("params", {}) or {})
+        try:
+            self.cmd = " ".join(spec["cmd"].split()).format(**{**global_params, **self.params})
+        except KeyError as e:
+            raise ValueError(f"Étape {name!r} : paramètre {e} absent de `params`") from None
+        self.upstream = set()
+
+
+def _under(path, root):
+    """path est root ou se trouve sous root."""
+    return path == root or path.startswith(root + os.sep)
+
+
+def load_pipeline(pipeline_file=PIPELINE_FILE, config_file=CONFIG_FILE):
+    """(stages par nom, ordre topologique, spec brute)."""
+    with open(pipeline_file, encoding="utf-8") as f:
+        spec = yaml.safe_load(f)
+    with open(config_file, encoding="utf-8") as f:
+        global_params = (yaml.safe_load(f) or {}).get("params", {}) or {}
+
+    stages = {name: Stage(name, s, global_params) for name, s in spec["stages"].items()}
+
+    producers = {}
+    for stage in stages.values():
+        for out in stage.outputs:
+            clash = next((p for p in producers if _under(out, p) or _under(p, out)), None)
+            if clash:
+                raise ValueError(f"Sortie {out!r} de {stage.name!r} chevauche {clash!r} de {producers[clash]!r}")
+            producers[out] = stage.name
+
+    for stage in stages.values():
+        for path in stage.inputs:
+            for out, producer in producers.items():
+                if producer != stage.name and (_under(path, out) or _under(out, path)):
+                    stage.upstream.add(producer)
+
+    return stages, topological_order(stages), spec
+
+
+def topological_order(stages):
+    """Ordre de Kahn (ordre du fichier à égalité) ; ValueError si cycle."""
+    remaining = {name: set(s.upstream) for name, s in stages.items()}
+    order = []
+    while remaining:
+        ready = [name for name, up in remaining.items() if not up]
+        if not ready:
+            raise ValueError(f"Cycle entre les étapes : {sorted(remaining)}")
+        for name in ready:
+            order.append(name)
+            del remaining[name]
+        for up in remaining.values():
+            up.difference_update(ready)
+    return order
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. EMPREINTES (contenu des fichiers, cache par taille + mtime)
+# ═════════════════════════════════════════════════════════════
+
+class Fingerprinter:
+    """
+    Hash de contenu des fichiers et répertoires. Le cache (chemin → taille,
+    mtime_ns, hash) est persisté avec l'état : seuls les fichiers modifiés
+    depuis le dernier passage sont relus.
+    """
+
+    def __init__(self, root, cache=None):
+        self.root = Path(root)
+        self.cache = dict(cache or {})
+        self._lock = threading.Lock()
+
+    def file_digest(self, path):
+        st = os.stat(path)
+        key = os.path.relpath(path, self.root)
+        with self._lock:
+            hit = self.cache.get(key)
+        if hit and hit["size"] == st.st_size and hit["mtime_ns"] == st.st_mtime_ns:
+            return hit["digest"]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self.cache[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": digest}
+        return digest
+
+    def path_digest(self, rel_path):
+        """Fichier, répertoire (fichiers triés, cachés exclus) ou ABSENT."""
+        path = self.root / rel_path
+        if path.is_file():
+            return self.file_digest(path)
+        if not path.is_dir():
+            return ABSENT
+
+        h = hashlib.sha256()
+        for dirpath, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(names):
+                if name.startswith("."):
+                    continue
+                file_path = os.path.join(dirpath, name)
+                h.update(os.path.relpath(file_path, path).encode())
+                h.update(self.file_digest(file_path).encode())
+        return h.hexdigest()
+
+    def digests(self, paths):
+        return {p: self.path_digest(p) for p in paths}
+
+    def stage_fingerprint(self, stage):
+        """Empreinte des entrées d'une étape (à calculer une fois l'amont terminé)."""
+        payload = {
+            "cmd": stage.cmd,
+            "params": stage.params,
+            "code": self.digests(stage.code),
+            "inputs": self.digests(stage.inputs),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    """Écriture atomique (fichier temporaire puis renommage)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. EXÉCUTION
+# ═════════════════════════════════════════════════════════════
+
+def is_fresh(stage, fingerprint, record, fp):
+    """Même empreinte d'entrée et sorties inchangées depuis le dernier succès."""
+    if not record or record.get("fingerprint") != fingerprint:
+        return False
+    return record.get("outputs") == fp.digests(stage.outputs)
+
+
+def run_command(stage, log_dir):
+    """Lance la commande depuis la racine du projet ; sortie dans log_dir/<étape>.log."""
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{stage.name}.log")
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        log.write(f"$ {stage.cmd}\n")
+        log.flush()
+        argv = shlex.split(stage.cmd)
+        if argv[0] == "python":
+            argv[0] = sys.executable  # même interpréteur (et venv) que le runner
+        proc = subprocess.run(
+            argv, cwd=PROJECT_ROOT, stdout=log, stderr=subprocess.STDOUT,
+            env={**os.environ, "PYTHONPATH": str(PROJECT_ROOT)},
+        )
+    return proc.returncode, time.perf_counter() - start, log_path
+
+
+def run_pipeline(stages, order, state, state_path, log_dir, only=None, force=(), jobs=1, dry_run=False):
+    """
+    Exécute les étapes périmées dans l'ordre du graphe, `jobs` à la fois.
+    Retourne {étape: "skipped" | "ran" | "failed" | "blocked" | "pending"}.
+    """
+    selected = [name for name in order if only is None or name in only]
+    fp = Fingerprinter(PROJECT_ROOT, state.get("files"))
+    records = state.setdefault("stages", {})
+    status = {}
+
+    if dry_run:
+        changed = set()  # étapes qui seraient relancées
+        for name in selected:
+            stage = stages[name]
+            if name in force or stage.upstream & changed:
+                reason = "forcé" if name in force else "amont relancé"
+            elif is_fresh(stage, fp.stage_fingerprint(stage), records.get(name), fp):
+                status[name] = "skipped"
+                print(f"  ✓ {name:<16} à jour")
+                continue
+            else:
+                reason = "entrées, code ou paramètres modifiés"
+            status[name] = "pending"
+            changed.add(name)
+            print(f"  → {name:<16} à exécuter ({reason})")
+        return status
+
+    lock = threading.Lock()
+
+    def process(name):
+        try:
+            return process_stage(name)
+        except Exception:
+            # Une exception du runner (empreinte, lancement, état) marque l'étape
+            # en échec au lieu d'interrompre le pool ; trace dans le journal.
+            log_path = os.path.join(log_dir, f"{name}.log")
+            os.makedirs(log_dir, exist_ok=True)
+            with open(log_path, "a", encoding="utf-8") as log:
+                log.write(traceback.format_exc())
+            print(f"  ❌ {name:<16} échec du runner → {log_path}")
+            return "failed"
+
+    def process_stage(name):
+        stage = stages[name]
+        fingerprint = fp.stage_fingerprint(stage)
+        if name not in force and is_fresh(stage, fingerprint, records.get(name), fp):
+            print(f"  ✓ {name:<16} à jour")
+            return "skipped"
+
+        print(f"  ▶ {name:<16} {stage.cmd}")
+        code, seconds, log_path = run_command(stage, log_dir)
+        if code != 0:
+            print(f"  ❌ {name:<16} échec (code {code}, {seconds:.1f}s) → {log_path}")
+            return "failed"
+
+        outputs = fp.digests(stage.outputs)
+        missing = [p for p, d in outputs.items() if d == ABSENT]
+        if missing:
+            print(f"  ⚠️ {name:<16} sorties absentes : {', '.join(missing)}")
+        with lock:
+            records[name] = {
+                "fingerprint": fingerprint,
+                "outputs": outputs,
+                "seconds": round(seconds, 3),
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            state["files"] = fp.cache
+            save_state(state_path, state)
+        print(f"  ✅ {name:<16} {seconds:.1f}s")
+        return "ran"
+
+    pending = list(selected)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            for name in list(pending):
+                upstream = stages[name].upstream & set(selected)
+                if any(status.get(u) in ("failed", "blocked") for u in upstream):
+                    status[name] = "blocked"
+                    pending.remove(name)
+                    print(f"  ⏸ {name:<16} bloquée (amont en échec)")
+                elif all(u in status for u in upstream) and len(running) < max(1, jobs):
+                    pending.remove(name)
+                    running[pool.submit(process, name)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                status[running.pop(future)] = future.result()
+
+    state["files"] = fp.cache
+    save_state(state_path, state)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline bronze → DataViz avec cache par empreinte")
+    parser.add_argument("--pipeline", default=str(PIPELINE_FILE))
+    parser.add_argument("--only", nargs="+", help="n'exécuter que ces étapes (l'amont est supposé à jour)")
+    parser.add_argument("--force", nargs="+", default=[], help="relancer ces étapes même à jour")
+    parser.add_argument("--jobs", type=int, default=2, help="étapes exécutées en parallèle")
+    parser.add_argument("--dry-run", action="store_true", help="afficher les étapes périmées sans rien lancer")
+    args = parser.parse_args()
+
+    stages, order, spec = load_pipeline(args.pipeline)
+    unknown = set(args.only or []) | set(args.force)
+    unknown -= set(stages)
+    if unknown:
+        parser.error(f"étapes inconnues : {', '.join(sorted(unknown))}")
+
+    state_path = str(PROJECT_ROOT / spec.get("state_file", "data/_pipeline/state.json"))
+    log_dir = str(PROJECT_ROOT / spec.get("log_dir", "data/_pipeline/logs"))
+    state = load_state(state_path)
+    # Rapports d'exécution des étapes regroupés sous data/_runs/<run_id>/
+    os.environ.setdefault(RUN_ID_ENV, time.strftime("%Y%m%dT%H%M%S"))
+
+    print(f"🔗 {len(order)} étapes : {' → '.join(order)}")
+    start = time.perf_counter()
+    status = run_pipeline(
+        stages, order, state, state_path, log_dir,
+        only=set(args.only) if args.only else None, force=set(args.force),
+        jobs=args.jobs, dry_run=args.dry_run,
+    )
+    counts = {s: sum(1 for v in status.values() if v == s) for s in sorted(set(status.values()))}
+    print(f"✓ {counts} en {time.perf_counter() - start:.1f}s")
+    if any(v in ("failed", "blocked") for v in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Module: Inférence vectorisée du Random Forest sur une grille haute résolution
+─────────────────────────────────────────────────────────────────────────────
+Prediction_2.ipynb entraîne un RandomForestClassifier Spark puis score une
+grille 50 × 50 construite en Python et envoyée à Spark (~300 m par maille).
+Ici, les arbres entraînés sont exportés en tableaux NumPy plats et la grille
+est scorée sans Spark :
+
+  - export : le modèle Spark est sauvegardé (`model.write()`), puis les
+    nœuds sont relus depuis son Parquet `data/` (treeID, nodeData) : pas
+    d'appel py4j nœud par nœud ;
+  - forêt plate : un tableau par attribut de nœud (feature, seuil, fils
+    gauche/droit, masque des catégories à gauche, distribution de classes
+    normalisée), tous les arbres concaténés ;
+  - parcours : toutes les lignes d'un lot × tous les arbres avancent d'un
+    niveau à chaque itération (profondeur max ≤ maxDepth), sans boucle
+    Python par ligne ni par arbre (`predict_proba`) ;
+  - grille : les features hors lat/lon étant fixes, chaque arbre découpe la
+    grille en rectangles ; chaque feuille remplit son bloc du raster
+    (`grid_votes`), sans parcours maille par maille ;
+  - probabilité : même calcul que Spark (moyenne des distributions de
+    classes normalisées des feuilles, puis normalisation) ;
+  - sortie : raster memmap float32 (lat × lon) de P(classe 1) + JSON des axes.
+
+Les caractéristiques non géographiques (type d'aménagement, réseau) sont
+fixes sur la grille : on part d'un vecteur `template` (features d'une ligne
+produite par le pipeline Spark) dont seules les colonnes lat/lon varient.
+
+Output:
+  - models/prediction_rf.npz (forêt plate + template)
+  - exports/prediction_grid/probability.npy (+ grid.json)
+  - predictions_heatmap_lyon_2.json (top N mailles, même format qu'avant)
+
+Usage:
+  python -m src.prediction.grid_inference [--model models/prediction_rf.npz]
+         [--resolution-m 25] [--bbox 45.70 45.85 4.75 4.95] [--top 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+METERS_PER_DEG_LAT = 111_320.0
+DEFAULT_BBOX = (45.70, 45.85, 4.75, 4.95)  # lat_min, lat_max, lon_min, lon_max (Prediction_2)
+DEFAULT_BATCH = 100_000
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. FORÊT PLATE
+# ═════════════════════════════════════════════════════════════
+
+class FlatForest:
+    """
+    Arbres concaténés en tableaux NumPy.
+
+    Nœud i : feature[i], threshold[i] (split continu : gauche si x <= seuil),
+    categorical[i] + left_mask[i] (split catégoriel : gauche si le bit
+    int(x) est à 1), left[i] / right[i] (-1 pour une feuille), value[i]
+    (distribution de classes normalisée de la feuille).
+    """
+
+    FIELDS = ("feature", "threshold", "categorical", "left_mask", "left", "right", "value", "roots")
+
+    def __init__(self, feature, threshold, categorical, left_mask, left, right, value, roots, template=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.categorical = np.asarray(categorical, dtype=bool)
+        self.left_mask = np.asarray(left_mask, dtype=np.uint64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.template = None if template is None else np.asarray(template, dtype=np.float64)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_spark_data(cls, model_dir):
+        """Forêt depuis un RandomForestClassificationModel sauvegardé (Parquet `data/`)."""
+        table = pq.read_table(os.path.join(model_dir, "data"))
+        tree_ids = np.asarray(table.column("treeID").to_numpy(), dtype=np.int64)
+        nodes = table.column("nodeData").combine_chunks()
+
+        node_ids = nodes.field("id").to_numpy(zero_copy_only=False).astype(np.int64)
+        left_child = nodes.field("leftChild").to_numpy(zero_copy_only=False).astype(np.int64)
+        right_child = nodes.field("rightChild").to_numpy(zero_copy_only=False).astype(np.int64)
+        stats = nodes.field("impurityStats").to_pylist()
+        split = nodes.field("split")
+        split_feature = split.field("featureIndex").to_numpy(zero_copy_only=False)
+        split_values = split.field("leftCategoriesOrThreshold").to_pylist()
+        num_categories = split.field("numCategories").to_numpy(zero_copy_only=False)
+
+        # Position globale de chaque nœud : arbres triés, puis id de nœud
+        order = np.lexsort((node_ids, tree_ids))
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        index = {(t, i): p for t, i, p in zip(tree_ids.tolist(), node_ids.tolist(), position.tolist())}
+        tree_start = {}
+        for tree, pos in zip(tree_ids[order].tolist(), range(len(order))):
+            tree_start.setdefault(tree, pos)
+
+        n = len(order)
+        n_classes = max(len(s) for s in stats)
+        feature = np.zeros(n, dtype=np.int32)
+        threshold = np.zeros(n)
+        categorical = np.zeros(n, dtype=bool)
+        left_mask = np.zeros(n, dtype=np.uint64)
+        left = np.full(n, -1, dtype=np.int32)
+        right = np.full(n, -1, dtype=np.int32)
+        value = np.zeros((n, n_classes))
+
+        for k in range(n):
+            i = position[k]
+            tree = int(tree_ids[k])
+            if left_child[k] >= 0:
+                left[i], right[i] = index[tree, int(left_child[k])], index[tree, int(right_child[k])]
+                feature[i] = split_feature[k]
+                if num_categories[k] >= 0:
+                    if num_categories[k] > 64:
+                        raise ValueError("Split catégoriel à plus de 64 catégories non géré")
+                    categorical[i] = True
+                    mask = 0
+                    for category in split_values[k]:
+                        mask |= 1 << int(category)
+                    left_mask[i] = mask
+                else:
+                    threshold[i] = split_values[k][0]
+            else:
+                counts = np.asarray(stats[k], dtype=np.float64)
+                total = counts.sum()
+                if total > 0:
+                    value[i, :len(counts)] = counts / total
+
+        roots = np.array([tree_start[t] for t in sorted(tree_start)], dtype=np.int32)
+        return cls(feature, threshold, categorical, left_mask, left, right, value, roots)
+
+    @classmethod
+    def from_spark_model(cls, rf_model, work_dir=None):
+        """Sauvegarde le modèle Spark dans un répertoire local puis relit ses nœuds."""
+        with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+            path = os.path.join(tmp, "rf_model")
+            rf_model.write().overwrite().save("file:" + os.path.abspath(path))
+            return cls.from_spark_data(path)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {name: getattr(self, name) for name in self.FIELDS}
+        if self.template is not None:
+            arrays["template"] = self.template
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(*(data[name] for name in cls.FIELDS),
+                       template=data["template"] if "template" in data else None)
+
+    # ─────────────────────────────────────────────────────────
+    # Parcours vectorisé
+    # ─────────────────────────────────────────────────────────
+
+    def leaves(self, X):
+        """Indice de la feuille atteinte, (n_échantillons, n_arbres)."""
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        while True:
+            internal = self.left[node] >= 0
+            if not internal.any():
+                return node
+            x = X[rows, self.feature[node]]
+            go_left = np.where(
+                self.categorical[node],
+                ((self.left_mask[node] >> np.clip(x, 0, 63).astype(np.uint64)) & np.uint64(1)) == 1,
+                x <= self.threshold[node],
+            )
+            step = np.where(go_left, self.left[node], self.right[node])
+            node = np.where(internal, step, node)
+
+    def grid_votes(self, template, lats, lons, lat_index=0, lon_index=1):
+        """
+        Votes (lat × lon × classes) de la forêt sur une grille régulière.
+
+        Les autres features valent `template` sur toute la grille : chaque
+        arbre se réduit à un découpage de la grille en rectangles (splits
+        lat/lon → searchsorted sur les axes triés, autres splits → branche
+        fixe). Chaque feuille ajoute sa distribution à un bloc contigu du
+        raster : coût O(feuilles + mailles) par arbre, sans parcours par maille.
+        """
+        votes = np.zeros((len(lats), len(lons), self.value.shape[1]), dtype=np.float32)
+        axes = {lat_index: lats, lon_index: lons}
+        for root in self.roots.tolist():
+            stack = [(root, 0, len(lats), 0, len(lons))]
+            while stack:
+                node, r0, r1, c0, c1 = stack.pop()
+                if r0 >= r1 or c0 >= c1:
+                    continue
+                if self.left[node] < 0:
+                    votes[r0:r1, c0:c1] += self.value[node].astype(np.float32)
+                    continue
+                f = int(self.feature[node])
+                left, right = int(self.left[node]), int(self.right[node])
+                if f in axes and not self.categorical[node]:
+                    k = int(np.searchsorted(axes[f], self.threshold[node], side="right"))
+                    if f == lat_index:
+                        k = min(max(k, r0), r1)
+                        stack += [(left, r0, k, c0, c1), (right, k, r1, c0, c1)]
+                    else:
+                        k = min(max(k, c0), c1)
+                        stack += [(left, r0, r1, c0, k), (right, r0, r1, k, c1)]
+                elif f in axes:
+                    raise ValueError("Split catégoriel sur lat/lon : utiliser predict_proba")
+                else:
+                    x = template[f]
+                    if self.categorical[node]:
+                        go_left = (int(self.left_mask[node]) >> int(min(max(x, 0), 63))) & 1
+                    else:
+                        go_left = x <= self.threshold[node]
+                    stack.append((left if go_left else right, r0, r1, c0, c1))
+        return votes
+
+    def predict_proba(self, X, batch_size=DEFAULT_BATCH):
+        """Probabilités par classe, même agrégation que RandomForestClassificationModel."""
+        X = np.asarray(X, dtype=np.float64)
+        out = np.empty((len(X), self.value.shape[1]))
+        for start in range(0, len(X), batch_size):
+            votes = self.value[self.leaves(X[start:start + batch_size])].sum(axis=1)
+            total = votes.sum(axis=1, keepdims=True)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[start:start + batch_size] = np.where(total > 0, votes / total, 0.0)
+        return out
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. GRILLE ET RASTER
+# ═════════════════════════════════════════════════════════════
+
+def grid_axes(bbox, resolution_m):
+    """Axes lat (croissant) et lon d'une grille de pas ~resolution_m mètres."""
+    lat_min, lat_max, lon_min, lon_max = bbox
+    dlat = resolution_m / METERS_PER_DEG_LAT
+    dlon = resolution_m / (METERS_PER_DEG_LAT * np.cos(np.radians((lat_min + lat_max) / 2)))
+    lats = np.arange(lat_min, lat_max + dlat / 2, dlat)
+    lons = np.arange(lon_min, lon_max + dlon / 2, dlon)
+    return lats, lons
+
+
+def predict_grid(forest, bbox, resolution_m, output_dir, lat_index=0, lon_index=1, template=None):
+    """
+    Score toutes les mailles et écrit `probability.npy` (memmap float32,
+    lat × lon) + `grid.json`. Retourne (raster, lats, lons).
+    """
+    template = forest.template if template is None else np.asarray(template, dtype=np.float64)
+    if template is None:
+        raise ValueError("Vecteur de features `template` requis (non stocké dans le modèle)")
+
+    lats, lons = grid_axes(bbox, resolution_m)
+    os.makedirs(output_dir, exist_ok=True)
+    raster_path = os.path.join(output_dir, "probability.npy")
+    raster = np.lib.format.open_memmap(raster_path, mode="w+", dtype=np.float32, shape=(len(lats), len(lons)))
+
+    votes = forest.grid_votes(template, lats, lons, lat_index, lon_index)
+    total = votes.sum(axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        raster[:] = np.where(total > 0, votes[:, :, 1] / total, 0.0)
+    raster.flush()
+
+    with open(os.path.join(output_dir, "grid.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "raster": "probability.npy",
+            "shape": [len(lats), len(lons)],
+            "lat0": float(lats[0]), "dlat": float(lats[1] - lats[0]) if len(lats) > 1 else 0.0,
+            "lon0": float(lons[0]), "dlon": float(lons[1] - lons[0]) if len(lons) > 1 else 0.0,
+            "resolution_m": resolution_m,
+            "n_trees": forest.n_trees,
+        }, f, indent=2)
+    return raster, lats, lons
+
+
+def top_cells(raster, lats, lons, n=50):
+    """Les n mailles de plus forte probabilité, au format predictions_heatmap_lyon_2.json."""
+    flat = np.asarray(raster).ravel()
+    n = min(n, len(flat))
+    best = np.argpartition(-flat, n - 1)[:n]
+    best = best[np.argsort(-flat[best], kind="stable")]
+    i, j = np.unravel_index(best, raster.shape)
+    return [
+        {"centroid_lat": float(lats[a]), "centroid_lon": float(lons[b]),
+         "prob_success": float(flat[k]), "recommendation": f"Top-{n} Potential"}
+        for a, b, k in zip(i, j, best)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Heatmap de recommandation par inférence vectorisée du RF")
+    parser.add_argument("--model", default=str(PROJECT_ROOT / "models" / "prediction_rf.npz"))
+    parser.add_argument("--resolution-m", type=float, default=25.0)
+    parser.add_argument("--bbox", type=float, nargs=4, default=list(DEFAULT_BBOX),
+                        metavar=("LAT_MIN", "LAT_MAX", "LON_MIN", "LON_MAX"))
+    parser.add_argument("--output-dir", default=str(PROJECT_ROOT / "exports" / "prediction_grid"))
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--top-output", default=str(PROJECT_ROOT / "predictions_heatmap_lyon_2.json"))
+    args = parser.parse_args()
+
+    forest = FlatForest.load(args.model)
+    raster, lats, lons = predict_grid(forest, args.bbox, args.resolution_m, args.output_dir)
+    print(f"✅ Raster {raster.shape[0]} × {raster.shape[1]} ({raster.size:,} mailles, {args.resolution_m:g} m) "
+          f"→ {args.output_dir}")
+
+    candidates = top_cells(raster, lats, lons, args.top)
+    with open(args.top_output, "w", encoding="utf-8") as f:
+        json.dump(candidates, f, indent=4)
+    print(f"✅ Top-{args.top} candidates exported to: {args.top_output}")
+
+
+if __name__ == "__main__":
+    main()
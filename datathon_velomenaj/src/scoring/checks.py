@@ -0,0 +1,124 @@
+"""
+Module: Contrats des tables gold (usage, score, profils)
+────────────────────────────────────────────────────────
+Règles de config/schemas.md pour les sorties de
+04_spatial_usage_direct_measures.ipynb, lues par le scoring, pour
+gold_amenagement_score (src/scoring/impact.py) et pour gold_usage_profile
+(src/spatial_usage/usage_cube.py). Les mêmes contrôles remplacent les
+asserts pandas du notebook (une passe Arrow au lieu d'un groupby par
+règle). Moteur : src/common/contracts.py.
+
+Input:
+  - data/gold/gold_link_amenagement_point/
+  - data/gold/gold_flow_amenagement_daily/
+  - data/gold/gold_amenagement_score/
+  - data/gold/gold_usage_profile/
+
+Output:
+  - rapport par table (stdout, ou JSON avec --json) ; code retour 1 si une
+    règle "error" échoue
+
+Usage:
+  python -m src.scoring.checks [--gold-dir data/gold] [--silver-dir data/silver] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.contracts import Allowed, Contract, ForeignKey, InRange, NotNull, Unique, validate
+
+GOLD_CONTRACTS = {
+    "gold_link_amenagement_point": Contract(
+        "gold_link_amenagement_point",
+        rules=[
+            Unique(["amenagement_id", "point_id"]),
+            NotNull(["amenagement_id", "point_id", "weight"]),
+            InRange("distance_m", min=0),
+            InRange("weight", min=0, max=1),
+            # Référence silver : base_dir = répertoire silver
+            ForeignKey("amenagement_id", "silver_amenagements_with_coordinates"),
+        ],
+    ),
+    "gold_flow_amenagement_daily": Contract(
+        "gold_flow_amenagement_daily",
+        columns={"amenagement_id": "string", "date": "date", "flux_estime": "number", "n_channels": "integer"},
+        rules=[
+            Unique(["amenagement_id", "date"]),
+            NotNull(["amenagement_id", "date", "flux_estime"]),
+            InRange("flux_estime", min=0),
+            InRange("n_channels", min=1),
+        ],
+    ),
+    "gold_amenagement_score": Contract(
+        "gold_amenagement_score",
+        columns={"amenagement_id": "string", "score_pertinence": "number", "classe": "string",
+                 "delta_pct": "number", "after_mean": "number", "confidence": "string"},
+        rules=[
+            Unique(["amenagement_id"]),
+            NotNull(["amenagement_id", "confidence"]),
+            InRange("score_pertinence", min=0, max=100),
+            Allowed("classe", ["Pertinent", "Mitigé", "Sous-utilisé"]),
+            Allowed("confidence", ["élevée", "moyenne", "faible", "insuffisante"]),
+            InRange("after_mean", min=0),
+        ],
+    ),
+    "gold_usage_profile": Contract(
+        "gold_usage_profile",
+        columns={"point_id": "string", "weekend_ratio": "number", "peak_ratio": "number", "profile": "string"},
+        rules=[
+            Unique(["point_id"]),
+            NotNull(["point_id"]),
+            InRange("weekday_daily", min=0),
+            InRange("weekend_ratio", min=0),
+            InRange("peak_ratio", min=0),
+            InRange("peak_share", min=0, max=1),
+            InRange("profile_stability", min=-1, max=1),
+            Allowed("profile", ["Pendulaire", "Loisir", "Mixte"]),
+        ],
+    ),
+}
+
+
+def validate_gold(gold_dir, silver_dir, tables=None):
+    """Rapports des tables gold présentes ; les clés étrangères pointent vers silver_dir."""
+    reports = []
+    for name in tables or GOLD_CONTRACTS:
+        path = os.path.join(gold_dir, name)
+        if not os.path.exists(path):
+            print(f"⚠️ {name} absente, ignorée")
+            continue
+        reports.append(validate(GOLD_CONTRACTS[name], path, base_dir=silver_dir))
+    return reports
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Validation des contrats gold (usage)")
+    parser.add_argument("--gold-dir", default=str(PROJECT_ROOT / config["paths"]["gold_dir"]))
+    parser.add_argument("--silver-dir", default=str(PROJECT_ROOT / config["paths"]["silver_dir"]))
+    parser.add_argument("--tables", nargs="+", choices=sorted(GOLD_CONTRACTS), default=None)
+    parser.add_argument("--json", action="store_true", help="rapport JSON sur stdout")
+    args = parser.parse_args()
+
+    reports = validate_gold(args.gold_dir, args.silver_dir, args.tables)
+    if args.json:
+        print(json.dumps([r.to_dict() for r in reports], indent=2, ensure_ascii=False, default=str))
+    else:
+        for report in reports:
+            print(report.summary())
+    sys.exit(0 if all(r.ok for r in reports) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Module: Stock dense (aménagement × jour) de gold_flow_amenagement_daily
+───────────────────────────────────────────────────────────────────────
+Chaque analyse des flux journaliers (Scoring2, scores annuels, exports)
+relit le format long (amenagement_id, date, flux_estime, n_channels) et
+le regroupe. Ici la table est matérialisée une fois sous forme dense, en
+fichiers mappés en mémoire :
+  - flux.npy       float32 (aménagement × jour), 0 si pas de mesure
+  - n_channels.npy uint16  (aménagement × jour)
+  - valid.npy      uint8   masque de validité, 1 bit par jour (bit k de
+                   l'octet j = jour 8·j + k, comme le bitmap du scoring)
+  - ids.arrow      index des aménagements (ligne i = ids[i], Arrow IPC)
+  - meta.json      nombre de lignes / jours utilisés, fichiers intégrés
+La colonne j correspond au jour BITMAP_EPOCH + j (src/scoring/pipeline.py).
+
+Principe:
+  - Lecture : `np.load(mmap_mode="r")` ; une fenêtre (aménagements × jours)
+    est une tranche du fichier, lue sans regroupement ni job Spark :
+    moyenne d'un aménagement sur 2019–2021 = une ligne, un mois pour tous
+    = un bloc de colonnes.
+  - Mise à jour incrémentale (comme l'état du scoring) : seuls les
+    fichiers Parquet pas encore intégrés sont lus et leurs cellules
+    écrites en place. Les matrices ont une capacité en avance (lignes ×1,5,
+    jours par blocs de DAY_CHUNK) : l'arrivée de nouveaux jours ou
+    aménagements ne réécrit les fichiers qu'au dépassement de capacité.
+  - Entrée partitionnée par jour (date=YYYY-MM-DD/, écrite par
+    src/spatial_usage/linking.py:write_flow_partitions, qui ne réécrit que
+    les jours modifiés) : un jour déjà intégré qui a changé ou disparu est
+    effacé puis réintégré, en place. Un fichier modifié hors partition
+    date= fait reconstruire le stock dans un répertoire temporaire, puis
+    substituer.
+
+Input:
+  - data/gold/gold_flow_amenagement_daily/date=YYYY-MM-DD/ (Parquet)
+
+Output:
+  - data/gold/gold_flow_store/
+
+Usage:
+  python -m src.scoring.flow_store update [--input ...] [--store ...] [--rebuild]
+  python -m src.scoring.flow_store query --ids 123 456 --start 2019-01-01 --end 2021-12-31
+  python -m src.scoring.flow_store query --start 2023-06-01 --end 2023-06-30 --output juin.parquet
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.telemetry import RunReport
+from src.scoring.pipeline import BITMAP_EPOCH, _day_offsets, input_dataset, list_input_files
+
+FLUX_FILE = "flux.npy"
+COUNT_FILE = "n_channels.npy"
+VALID_FILE = "valid.npy"
+IDS_FILE = "ids.arrow"
+META_FILE = "meta.json"
+
+DAY_CHUNK = 512          # capacité en jours : multiple de DAY_CHUNK (multiple de 8)
+MIN_ROWS = 1024
+ROW_GROWTH = 1.5
+MAX_CHANNELS = np.iinfo(np.uint16).max
+
+_DATE_PARTITION = re.compile(r"(?:^|/)date=(\d{4}-\d{2}-\d{2})/")
+
+
+def _to_day(value):
+    """date / "YYYY-MM-DD" / datetime64 → jours depuis BITMAP_EPOCH."""
+    return int((np.datetime64(value, "D") - BITMAP_EPOCH).astype(np.int64))
+
+
+def _atomic_json(path, data):
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. LECTURE (FENÊTRES SUR LES MATRICES MAPPÉES)
+# ═════════════════════════════════════════════════════════════
+
+class FlowStore:
+    """
+    Stock dense ouvert en lecture (mode "r") ou en écriture (mode "r+").
+    Les lignes au-delà de n_entities et les colonnes au-delà de n_days
+    sont de la capacité réservée, jamais renvoyées.
+    """
+
+    def __init__(self, path, mode="r"):
+        self.path = str(path)
+        with open(os.path.join(self.path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.flux = np.load(os.path.join(self.path, FLUX_FILE), mmap_mode=mode)
+        self.n_channels = np.load(os.path.join(self.path, COUNT_FILE), mmap_mode=mode)
+        self.valid = np.load(os.path.join(self.path, VALID_FILE), mmap_mode=mode)
+        ids = feather.read_table(os.path.join(self.path, IDS_FILE), memory_map=True).column("amenagement_id")
+        self.ids = pd.Index(ids.to_pylist()[:self.meta["n_entities"]], dtype=object)
+
+    @property
+    def n_entities(self):
+        return self.meta["n_entities"]
+
+    @property
+    def n_days(self):
+        return self.meta["n_days"]
+
+    def dates(self, start=0, stop=None):
+        stop = self.n_days if stop is None else stop
+        return (BITMAP_EPOCH + np.arange(start, stop)).astype("datetime64[D]")
+
+    def _columns(self, start, end):
+        """[c0, c1) des jours start..end inclus, bornés aux jours du stock."""
+        c0 = 0 if start is None else max(0, _to_day(start))
+        c1 = self.n_days if end is None else min(self.n_days, _to_day(end) + 1)
+        return c0, max(c0, c1)
+
+    def _rows(self, ids):
+        if ids is None:
+            return slice(0, self.n_entities)
+        rows = self.ids.get_indexer([str(i) for i in ids])
+        if (rows < 0).any():
+            missing = [i for i, r in zip(ids, rows) if r < 0]
+            raise KeyError(f"Aménagements absents du stock : {missing[:5]}")
+        return rows
+
+    def _valid_bits(self, rows, c0, c1):
+        """Masque booléen (lignes × [c0, c1)) depuis les octets du bitmap."""
+        packed = self.valid[rows, c0 // 8:(c1 + 7) // 8]
+        bits = np.unpackbits(packed, axis=1, bitorder="little")
+        return bits[:, c0 % 8:c0 % 8 + (c1 - c0)].astype(bool)
+
+    def block(self, r0, r1):
+        """(flux, valid, n_channels) bruts des lignes [r0, r1) sur tous les jours : parcours par blocs."""
+        rows = slice(r0, min(r1, self.n_entities))
+        return (np.asarray(self.flux[rows, :self.n_days]), self._valid_bits(rows, 0, self.n_days),
+                np.asarray(self.n_channels[rows, :self.n_days]))
+
+    def window(self, start=None, end=None, ids=None):
+        """
+        (ids, dates, flux, valid) : tranche dense des aménagements `ids`
+        (tous par défaut) sur start..end inclus. flux est float32, NaN hors masque.
+        """
+        c0, c1 = self._columns(start, end)
+        rows = self._rows(ids)
+        flux = np.array(self.flux[rows, c0:c1], dtype=np.float32)
+        valid = self._valid_bits(rows, c0, c1)
+        flux[~valid] = np.nan
+        return self.ids[rows], self.dates(c0, c1), flux, valid
+
+    def series(self, amenagement_id, start=None, end=None):
+        """Flux journalier d'un aménagement (jours mesurés seulement), indexé par date."""
+        _, dates, flux, valid = self.window(start, end, [amenagement_id])
+        return pd.Series(flux[0, valid[0]], index=pd.DatetimeIndex(dates[valid[0]], name="date"), name="flux_estime")
+
+    def mean(self, start=None, end=None, ids=None):
+        """Moyenne du flux par aménagement sur start..end (jours mesurés), nombre de jours mesurés."""
+        ids, _, flux, valid = self.window(start, end, ids)
+        n_days = valid.sum(axis=1)
+        total = np.where(valid, flux, 0.0).sum(axis=1, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n_days > 0, total / n_days, np.nan)
+        return pd.DataFrame({"amenagement_id": ids, "mean_flux": mean, "n_days": n_days})
+
+    def to_long(self, start=None, end=None, ids=None):
+        """Retour au format long de gold_flow_amenagement_daily (cellules valides seulement)."""
+        c0, c1 = self._columns(start, end)
+        counts = np.asarray(self.n_channels[self._rows(ids), c0:c1])
+        row_ids, dates, flux, valid = self.window(start, end, ids)
+        r, d = np.nonzero(valid)
+        return pd.DataFrame({
+            "amenagement_id": row_ids[r],
+            "date": dates[d],
+            "flux_estime": flux[r, d].astype(np.float64),
+            "n_channels": counts[r, d].astype(np.int64),
+        })
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. ÉCRITURE INCRÉMENTALE
+# ═════════════════════════════════════════════════════════════
+
+def _create(path, rows, days):
+    os.makedirs(path, exist_ok=True)
+    _resize(path, rows, days)
+    feather.write_feather(pa.table({"amenagement_id": pa.array([], pa.string())}), os.path.join(path, IDS_FILE))
+    _atomic_json(os.path.join(path, META_FILE), {"n_entities": 0, "n_days": 0, "folded": {}})
+
+
+def _resize(path, rows, days):
+    """(Ré)alloue les matrices à (rows, days) en recopiant l'existant (croissance en fin seulement)."""
+    for name, dtype, width in ((FLUX_FILE, np.float32, days), (COUNT_FILE, np.uint16, days),
+                               (VALID_FILE, np.uint8, days // 8)):
+        target = os.path.join(path, name)
+        tmp = f"{target}.tmp.npy"
+        new = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(rows, width))
+        if os.path.exists(target):
+            old = np.load(target, mmap_mode="r")
+            new[:old.shape[0], :old.shape[1]] = old
+            del old
+        new.flush()
+        del new
+        os.replace(tmp, target)
+
+
+class _Writer:
+    """Écritures en place dans un stock ouvert en r+ ; agrandit les matrices au besoin."""
+
+    def __init__(self, path):
+        self.path = path
+        self.store = FlowStore(path, mode="r+")
+        self.ids = list(self.store.ids)
+        self.row = {amenagement_id: i for i, amenagement_id in enumerate(self.ids)}
+        self.n_days = self.store.n_days
+
+    def _ensure(self, rows, days):
+        cap_rows, cap_days = self.store.flux.shape
+        if rows <= cap_rows and days <= cap_days:
+            return
+        new_rows = cap_rows if rows <= cap_rows else max(rows, int(cap_rows * ROW_GROWTH), MIN_ROWS)
+        new_days = cap_days if days <= cap_days else -(-days // DAY_CHUNK) * DAY_CHUNK
+        meta = self.store.meta
+        del self.store
+        _resize(self.path, new_rows, new_days)
+        self.store = FlowStore(self.path, mode="r+")
+        self.store.meta = meta
+
+    def write(self, amenagement_ids, day_offsets, flux, n_channels):
+        if len(flux) == 0:
+            return
+        if day_offsets.min() < 0:
+            raise ValueError(f"Date antérieure à BITMAP_EPOCH ({BITMAP_EPOCH})")
+        for amenagement_id in dict.fromkeys(amenagement_ids):
+            if amenagement_id not in self.row:
+                self.row[amenagement_id] = len(self.ids)
+                self.ids.append(amenagement_id)
+        rows = np.array([self.row[a] for a in amenagement_ids], dtype=np.int64)
+        self.n_days = max(self.n_days, int(day_offsets.max()) + 1)
+        self._ensure(len(self.ids), self.n_days)
+
+        s = self.store
+        s.flux[rows, day_offsets] = flux
+        s.n_channels[rows, day_offsets] = np.clip(n_channels, 0, MAX_CHANNELS)
+        bits = (1 << (day_offsets % 8)).astype(np.uint8)
+        np.bitwise_or.at(s.valid, (rows, day_offsets // 8), bits)
+
+    def clear_days(self, day_offsets):
+        """Efface les colonnes des jours donnés (partition date= remplacée), pour toutes les lignes."""
+        days = np.array(sorted(d for d in day_offsets if 0 <= d < self.store.flux.shape[1]), dtype=np.int64)
+        if len(days) == 0:
+            return
+        s = self.store
+        s.flux[:, days] = 0
+        s.n_channels[:, days] = 0
+        for day in days:
+            s.valid[:, day // 8] &= np.uint8(0xFF ^ (1 << int(day % 8)))
+
+    def commit(self, folded):
+        s = self.store
+        for array in (s.flux, s.n_channels, s.valid):
+            array.flush()
+        ids_path = os.path.join(self.path, IDS_FILE)
+        feather.write_feather(pa.table({"amenagement_id": pa.array(self.ids, pa.string())}), f"{ids_path}.tmp")
+        os.replace(f"{ids_path}.tmp", ids_path)
+        _atomic_json(os.path.join(self.path, META_FILE),
+                     {"n_entities": len(self.ids), "n_days": self.n_days, "folded": folded})
+
+
+def write_files(writer, input_dir, paths):
+    """Écrit les lignes des fichiers `paths` ; mêmes filtres que le scoring. Retourne le nombre de lignes."""
+    if not paths:
+        return 0
+    n_rows = 0
+    for batch in input_dataset(input_dir, paths).to_batches(
+            columns=["amenagement_id", "date", "flux_estime", "n_channels"]):
+        flux = pc.cast(batch.column("flux_estime"), pa.float64())
+        keep = pc.fill_null(pc.and_(pc.is_valid(batch.column("amenagement_id")), pc.greater_equal(flux, 0.0)), False)
+        batch = batch.filter(keep)
+        if batch.num_rows == 0:
+            continue
+        writer.write(
+            batch.column("amenagement_id").cast(pa.string()).to_pylist(),
+            _day_offsets(batch.column("date")),
+            pc.cast(batch.column("flux_estime"), pa.float32()).to_numpy(zero_copy_only=False),
+            pc.fill_null(batch.column("n_channels"), 0).to_numpy(zero_copy_only=False),
+        )
+        n_rows += batch.num_rows
+    return n_rows
+
+
+def _partition_day(path):
+    """Jour de la partition `date=YYYY-MM-DD` contenant le fichier, None hors partition."""
+    match = _DATE_PARTITION.search(path.replace(os.sep, "/"))
+    return _to_day(match[1]) if match else None
+
+
+def update(input_dir, store_dir, rebuild=False):
+    """
+    Intègre les nouveaux fichiers de gold_flow_amenagement_daily ;
+    retourne (nombre de fichiers, nombre de lignes) intégrés.
+
+    Un fichier déjà intégré qui a changé ou disparu dans une partition
+    `date=` ne remplace que ce jour ; hors partition, le stock est reconstruit.
+    """
+    current = list_input_files(input_dir)
+    folded, replaced = {}, set()
+    if not rebuild and os.path.exists(os.path.join(store_dir, META_FILE)):
+        with open(os.path.join(store_dir, META_FILE), encoding="utf-8") as f:
+            folded = json.load(f)["folded"]
+        stale = [p for p, meta in folded.items() if current.get(p) != meta]
+        stale_days = {_partition_day(p) for p in stale}
+        if None in stale_days:
+            print(f"⚠️ {len(stale)} fichier(s) déjà intégré(s) modifié(s) ou supprimé(s) → reconstruction complète")
+            rebuild = True
+        elif stale_days:
+            # Partitions date= réécrites : colonnes du jour effacées, puis tous
+            # les fichiers de ces partitions réintégrés
+            print(f"✓ {len(stale_days)} jour(s) déjà intégré(s) modifié(s) ou supprimé(s) → remplacés")
+            replaced = stale_days
+            folded = {p: meta for p, meta in folded.items() if _partition_day(p) not in replaced}
+
+    target = store_dir
+    if rebuild or not os.path.exists(os.path.join(store_dir, META_FILE)):
+        # Reconstruction à côté, substituée à la fin : le stock existant reste lisible
+        target = f"{os.path.normpath(store_dir)}.tmp"
+        shutil.rmtree(target, ignore_errors=True)
+        _create(target, MIN_ROWS, DAY_CHUNK)
+        folded, replaced = {}, set()
+
+    new_files = sorted(p for p in current if p not in folded)
+    writer = _Writer(target)
+    writer.clear_days(replaced)
+    n_rows = write_files(writer, input_dir, new_files)
+    folded.update({p: current[p] for p in new_files})
+    writer.commit(folded)
+    del writer
+
+    if target != store_dir:
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.replace(target, store_dir)
+    return len(new_files), n_rows
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+    gold_dir = PROJECT_ROOT / config["paths"]["gold_dir"]
+
+    parser = argparse.ArgumentParser(description="Stock dense mappé de gold_flow_amenagement_daily")
+    parser.add_argument("--store", default=str(gold_dir / "gold_flow_store"))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    up = sub.add_parser("update", help="intégrer les nouveaux fichiers")
+    up.add_argument("--input", default=str(gold_dir / "gold_flow_amenagement_daily"))
+    up.add_argument("--rebuild", action="store_true", help="ignorer le stock et tout reconstruire")
+
+    query = sub.add_parser("query", help="moyennes (ou format long avec --output) sur une fenêtre")
+    query.add_argument("--ids", nargs="+", default=None)
+    query.add_argument("--start", default=None, help="YYYY-MM-DD (inclus)")
+    query.add_argument("--end", default=None, help="YYYY-MM-DD (inclus)")
+    query.add_argument("--output", default=None, help="Parquet des lignes (amenagement_id, date, flux_estime, n_channels)")
+    args = parser.parse_args()
+
+    if args.command == "update":
+        with RunReport("flow_store") as report:
+            with report.stage("flow_store") as st:
+                n_files, st.rows_in = update(args.input, args.store, rebuild=args.rebuild)
+                store = FlowStore(args.store)
+                st.add(files=n_files, amenagements=store.n_entities, days=store.n_days)
+        print(f"✓ {n_files} nouveau(x) fichier(s), {st.rows_in:,} lignes ; "
+              f"stock {store.n_entities:,} aménagements × {store.n_days:,} jours")
+        return
+
+    store = FlowStore(args.store)
+    if args.output:
+        out = store.to_long(args.start, args.end, args.ids)
+        out.to_parquet(args.output, index=False)
+        print(f"✓ {len(out):,} lignes → {args.output}")
+    else:
+        print(store.mean(args.start, args.end, args.ids).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Module: Impact avant / après livraison (gold_amenagement_score)
+───────────────────────────────────────────────────────────────
+Calcule les champs du contrat `gold_amenagement_score` (config/schemas.md) :
+score_pertinence, classe, delta_pct, after_mean, confidence.
+
+Principe:
+  - Date d'ouverture : règle midyear (docs/module2_resume.md), livraison
+    l'année Y → ouverture le Y-07-01.
+  - Fenêtres : WINDOW_DAYS jours avant l'ouverture et WINDOW_DAYS jours
+    à partir de l'ouverture, sur la série journalière du stock dense
+    (src/scoring/flow_store.py).
+  - Tous les aménagements à la fois : par bloc de lignes, sommes cumulées
+    le long des jours (flux, jours mesurés, channels), puis chaque fenêtre
+    = différence de deux colonnes lues à des positions propres à chaque
+    ligne (take_along_axis). Aucun filtre par aménagement, aucun groupBy.
+  - delta_pct = (after_mean - before_mean) / before_mean · 100, si chaque
+    fenêtre a au moins MIN_DAYS jours mesurés et before_mean > 0.
+  - confidence (compteurs proches) : couverture = min(jours mesurés avant,
+    après) / WINDOW_DAYS, et nombre moyen de points de mesure contributeurs
+    (n_channels) :
+      élevée  : couverture >= 0.75 et >= 2 points en moyenne
+      moyenne : couverture >= 0.40
+      faible  : sinon ; insuffisante : delta non calculable
+  - score_pertinence = 100 · (W_DELTA · rang(delta_pct) + (1 - W_DELTA) · rang(after_mean)),
+    rangs centiles parmi les aménagements au delta calculable ;
+    classe : >= 60 Pertinent, >= 40 Mitigé, sinon Sous-utilisé.
+
+Input:
+  - data/gold/gold_flow_store/ (stock dense de gold_flow_amenagement_daily)
+  - data/silver/silver_amenagements/ (amenagement_id, annee_livraison ou anneelivraison)
+
+Output:
+  - data/gold/gold_amenagement_score/part-0.parquet
+  - data/_runs/<run_id>/impact.json (rapport d'exécution)
+
+Usage:
+  python -m src.scoring.impact [--window-days 365] [--store ...] [--amenagements ...] [--output ...]
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.contracts import enforce
+from src.common.telemetry import RunReport
+from src.scoring.checks import GOLD_CONTRACTS
+from src.scoring.flow_store import FlowStore, _to_day
+from src.scoring.ranking import percent_rank
+
+WINDOW_DAYS = 365
+MIN_DAYS = 30
+W_DELTA = 0.5
+BLOCK_ROWS = 1024
+
+YEAR_COLUMNS = ("annee_livraison", "anneelivraison")  # contrat / nom réel de la table silver
+CLASSES = [(60.0, "Pertinent"), (40.0, "Mitigé"), (-np.inf, "Sous-utilisé")]
+SCORE_SCHEMA = pa.schema([
+    ("amenagement_id", pa.string()),
+    ("score_pertinence", pa.float64()),
+    ("classe", pa.string()),
+    ("delta_pct", pa.float64()),
+    ("after_mean", pa.float64()),
+    ("confidence", pa.string()),
+    ("annee_livraison", pa.int64()),
+    ("before_mean", pa.float64()),
+    ("n_days_before", pa.int64()),
+    ("n_days_after", pa.int64()),
+    ("n_channels_mean", pa.float64()),
+])
+SCORE_COLUMNS = SCORE_SCHEMA.names
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. ANNÉES DE LIVRAISON
+# ═════════════════════════════════════════════════════════════
+
+def delivery_years(amenagements_path):
+    """Série annee_livraison (Int64) indexée par amenagement_id (string)."""
+    dataset = ds.dataset(str(amenagements_path), format="parquet", partitioning="hive")
+    year_col = next((c for c in YEAR_COLUMNS if c in dataset.schema.names), None)
+    if year_col is None:
+        raise ValueError(f"{amenagements_path}: aucune colonne {' / '.join(YEAR_COLUMNS)}")
+    table = dataset.to_table(columns=["amenagement_id", year_col]).to_pandas()
+    years = pd.to_numeric(table[year_col], errors="coerce").astype("Int64")
+    return pd.Series(years.to_numpy(), index=table["amenagement_id"].astype(str), name="annee_livraison")
+
+
+def opening_days(years):
+    """Ouverture au 1er juillet de l'année de livraison (jours depuis l'époque du stock) ; -1 si inconnue."""
+    days = np.full(len(years), -1, dtype=np.int64)
+    known = years.notna().to_numpy()
+    days[known] = [_to_day(f"{int(y)}-07-01") for y in years[known]]
+    return days, known
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. FENÊTRES AVANT / APRÈS (TOUTES LIGNES À LA FOIS)
+# ═════════════════════════════════════════════════════════════
+
+def _cumsum0(values):
+    """Sommes cumulées le long des jours, précédées d'une colonne de zéros : somme [a, b) = cs[b] - cs[a]."""
+    out = np.zeros((values.shape[0], values.shape[1] + 1))
+    np.cumsum(values, axis=1, out=out[:, 1:])
+    return out
+
+
+def window_sums(store, open_day, window_days=WINDOW_DAYS, block_rows=BLOCK_ROWS):
+    """
+    Pour chaque ligne du stock (open_day aligné sur store.ids) : somme des
+    flux, jours mesurés et somme des n_channels, avant et après l'ouverture.
+    Retourne un dict de tableaux (n_entities,).
+    """
+    n, n_days = store.n_entities, store.n_days
+    keys = ("sum_before", "days_before", "channels_before", "sum_after", "days_after", "channels_after")
+    out = {k: np.zeros(n) for k in keys}
+
+    known = open_day >= 0
+    bounds = {
+        "before": (np.where(known, open_day - window_days, 0), np.where(known, open_day, 0)),
+        "after": (np.where(known, open_day, 0), np.where(known, open_day + window_days, 0)),
+    }
+    bounds = {side: tuple(np.clip(b, 0, n_days) for b in pair) for side, pair in bounds.items()}
+
+    for r0 in range(0, n, block_rows):
+        r1 = min(r0 + block_rows, n)
+        flux, valid, channels = store.block(r0, r1)
+        cumulative = {
+            "sum": _cumsum0(np.where(valid, flux, 0.0)),
+            "days": _cumsum0(valid),
+            "channels": _cumsum0(np.where(valid, channels, 0)),
+        }
+        for side, (start, stop) in bounds.items():
+            a, b = start[r0:r1, None], stop[r0:r1, None]
+            for name, cs in cumulative.items():
+                window = np.take_along_axis(cs, b, axis=1) - np.take_along_axis(cs, a, axis=1)
+                out[f"{name}_{side}"][r0:r1] = window[:, 0]
+    return out
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. CHAMPS DU CONTRAT
+# ═════════════════════════════════════════════════════════════
+
+def confidence_levels(days_before, days_after, channels_mean, window_days, computable):
+    coverage = np.minimum(days_before, days_after) / window_days
+    level = np.where((coverage >= 0.75) & (channels_mean >= 2), "élevée",
+                     np.where(coverage >= 0.40, "moyenne", "faible"))
+    return np.where(computable, level, "insuffisante")
+
+
+def impact_scores(store, years, window_days=WINDOW_DAYS):
+    """DataFrame SCORE_COLUMNS : une ligne par aménagement du stock dont l'année de livraison est connue."""
+    years = years[~years.index.duplicated()].reindex(store.ids)
+    open_day, known = opening_days(years)
+    w = window_sums(store, open_day, window_days)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        before_mean = np.where(w["days_before"] > 0, w["sum_before"] / w["days_before"], np.nan)
+        after_mean = np.where(w["days_after"] > 0, w["sum_after"] / w["days_after"], np.nan)
+        days = w["days_before"] + w["days_after"]
+        channels_mean = np.where(days > 0, (w["channels_before"] + w["channels_after"]) / days, np.nan)
+        computable = (w["days_before"] >= MIN_DAYS) & (w["days_after"] >= MIN_DAYS) & (before_mean > 0)
+        delta_pct = np.where(computable, (after_mean - before_mean) / before_mean * 100.0, np.nan)
+
+    # Rangs parmi les aménagements au delta calculable seulement
+    score = np.full(len(delta_pct), np.nan)
+    idx = np.flatnonzero(computable)
+    score[idx] = 100.0 * (W_DELTA * percent_rank(delta_pct[idx]) + (1 - W_DELTA) * percent_rank(after_mean[idx]))
+    classe = np.full(len(score), None, dtype=object)
+    for threshold, label in reversed(CLASSES):
+        classe[computable & (score >= threshold)] = label
+
+    out = pd.DataFrame({
+        "amenagement_id": store.ids.astype(str),
+        "score_pertinence": np.round(score, 2),
+        "classe": classe,
+        "delta_pct": np.round(delta_pct, 2),
+        "after_mean": np.round(after_mean, 2),
+        "confidence": confidence_levels(w["days_before"], w["days_after"], channels_mean, window_days, computable),
+        "annee_livraison": years.to_numpy(),
+        "before_mean": np.round(before_mean, 2),
+        "n_days_before": w["days_before"].astype(np.int64),
+        "n_days_after": w["days_after"].astype(np.int64),
+        "n_channels_mean": np.round(channels_mean, 2),
+    })
+    return out[known].reset_index(drop=True)[SCORE_COLUMNS]
+
+
+def write_scores(scores, output_dir):
+    """Contrat vérifié, puis écriture atomique de part-0.parquet."""
+    table = pa.Table.from_pandas(scores, schema=SCORE_SCHEMA, preserve_index=False)
+    enforce([(GOLD_CONTRACTS["gold_amenagement_score"], table)])
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, "part-0.parquet")
+    pq.write_table(table, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+    gold_dir = PROJECT_ROOT / config["paths"]["gold_dir"]
+    silver_dir = PROJECT_ROOT / config["paths"]["silver_dir"]
+
+    parser = argparse.ArgumentParser(description="Impact avant / après livraison → gold_amenagement_score")
+    parser.add_argument("--store", default=str(gold_dir / "gold_flow_store"))
+    parser.add_argument("--amenagements", default=str(silver_dir / "silver_amenagements"))
+    parser.add_argument("--output", default=str(gold_dir / "gold_amenagement_score"))
+    parser.add_argument("--window-days", type=int, default=WINDOW_DAYS)
+    args = parser.parse_args()
+
+    with RunReport("impact") as report:
+        with report.stage("impact") as st:
+            st.read(args.amenagements)
+            store = FlowStore(args.store)
+            scores = impact_scores(store, delivery_years(args.amenagements), args.window_days)
+            st.rows_in = store.n_entities
+            st.wrote(write_scores(scores, args.output))
+            st.add(**{f"classe_{k}": int(v) for k, v in scores["classe"].value_counts().items()})
+
+    print(f"✅ gold_amenagement_score: {len(scores):,} aménagements, "
+          f"{scores['score_pertinence'].notna().sum():,} avec un delta avant/après → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
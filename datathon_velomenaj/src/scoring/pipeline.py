@@ -0,0 +1,407 @@
+"""
+Module: Scoring global incrémental (moments fusionnables)
+──────────────────────────────────────────────────────────
+Seul écrivain du score global (formule des scores annuels de Scoring2.ipynb,
+sur tout l'historique), sans relire tout l'historique à chaque
+rafraîchissement.
+
+Principe:
+  - Une table d'état garde, par aménagement, des moments fusionnables
+    (n, moyenne, M2 de Welford/Chan) et un bitmap des jours observés
+    (1 bit par jour depuis BITMAP_EPOCH) :
+      * n_days_total    = popcount(bitmap)       (≡ countDistinct(date))
+      * mean_flux_global = moyenne                (≡ avg(flux_estime))
+      * std_flux_global  = sqrt(M2 / n)           (≡ stddev_pop(flux_estime))
+  - Seuls les fichiers Parquet de gold_flow_amenagement_daily pas encore
+    intégrés sont lus et fusionnés dans l'état : O(nouvelles données).
+  - usage_score, stability_score et score sont recalculés depuis l'état seul.
+  - Contrat avec le producteur : gold_flow_amenagement_daily est
+    partitionnée par jour (date=YYYY-MM-DD/) et seules les partitions dont
+    le contenu a changé sont réécrites (src/spatial_usage/linking.py,
+    write_flow_partitions). Un rafraîchissement n'ajoute donc que les
+    nouveaux jours.
+  - Si un fichier déjà intégré a changé ou disparu (correction d'un jour
+    passé), l'état est reconstruit depuis zéro : les moments ne se
+    "défusionnent" pas.
+
+Input:
+  - data/gold/gold_flow_amenagement_daily/ (Parquet, partitionné par date=)
+
+Output:
+  - data/gold/gold_score_state/ (état : part-0.parquet + _folded.json)
+  - amenagement_scoring_global_json_2/ (JSON lines: amenagement_id, score)
+  - data/_runs/<run_id>/scoring.json (rapport d'exécution, src/common/telemetry.py)
+
+Usage:
+  python -m src.scoring.pipeline [--rebuild] [--w-usage 0.65 --w-stab 0.35]
+  python -m src.scoring.pipeline --scan [--backend local|spark|auto]
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.backend import get_backend
+from src.common.contracts import enforce
+from src.common.telemetry import RunReport
+from src.scoring.checks import GOLD_CONTRACTS
+from src.scoring.ranking import percent_rank
+
+BITMAP_EPOCH = np.datetime64("2010-01-01", "D")
+ID_PREFIX = "pvo_patrimoine_voirie.pvoamenagementcyclable."
+
+W_USAGE = 0.65
+W_STAB = 0.35
+MIN_DAYS_TOTAL = 30
+
+STATE_FILE = "part-0.parquet"
+FOLDED_FILE = "_folded.json"
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. ÉTAT : MOMENTS + BITMAP DES JOURS
+# ═════════════════════════════════════════════════════════════
+
+class ScoreState:
+    """
+    Moments fusionnables par aménagement, en tableaux NumPy alignés sur `ids`.
+
+    bitmap[i] : octets little-endian (bit k de l'octet j = jour 8*j + k
+    depuis BITMAP_EPOCH) ; la largeur s'étend à la demande.
+    """
+
+    def __init__(self, ids=(), n=None, mean=None, m2=None, bitmap=None):
+        self.ids = list(ids)
+        self.row = {amenagement_id: i for i, amenagement_id in enumerate(self.ids)}
+        size = len(self.ids)
+        self.n = np.zeros(size, dtype=np.int64) if n is None else np.array(n, dtype=np.int64)
+        self.mean = np.zeros(size) if mean is None else np.array(mean, dtype=np.float64)
+        self.m2 = np.zeros(size) if m2 is None else np.array(m2, dtype=np.float64)
+        self.bitmap = np.zeros((size, 0), dtype=np.uint8) if bitmap is None else bitmap
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _rows(self, ids):
+        """Lignes d'état des ids (créées si nouvelles)."""
+        new = [amenagement_id for amenagement_id in dict.fromkeys(ids) if amenagement_id not in self.row]
+        if new:
+            for amenagement_id in new:
+                self.row[amenagement_id] = len(self.ids)
+                self.ids.append(amenagement_id)
+            pad = len(new)
+            self.n = np.concatenate([self.n, np.zeros(pad, dtype=np.int64)])
+            self.mean = np.concatenate([self.mean, np.zeros(pad)])
+            self.m2 = np.concatenate([self.m2, np.zeros(pad)])
+            self.bitmap = np.vstack([self.bitmap, np.zeros((pad, self.bitmap.shape[1]), dtype=np.uint8)])
+        return np.array([self.row[amenagement_id] for amenagement_id in ids], dtype=np.int64)
+
+    def fold(self, amenagement_ids, day_offsets, flux):
+        """
+        Fusionne un lot de lignes (amenagement_id, jour depuis l'époque, flux).
+
+        Moments du lot par groupe, puis fusion de Chan et al. avec l'état :
+        M2 = M2_a + M2_b + δ² · n_a · n_b / (n_a + n_b).
+        """
+        if len(flux) == 0:
+            return
+        codes, uniques = pd.factorize(pd.Series(amenagement_ids), sort=False)
+        rows = self._rows(list(uniques))
+
+        n_b = np.bincount(codes, minlength=len(uniques))
+        mean_b = np.bincount(codes, weights=flux, minlength=len(uniques)) / n_b
+        m2_b = np.bincount(codes, weights=(flux - mean_b[codes]) ** 2, minlength=len(uniques))
+
+        n_a, mean_a, m2_a = self.n[rows], self.mean[rows], self.m2[rows]
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        self.mean[rows] = mean_a + delta * n_b / n
+        self.m2[rows] = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+        self.n[rows] = n
+
+        # Bitmap des jours (countDistinct(date) ≡ nombre de bits à 1)
+        if day_offsets.min() < 0:
+            raise ValueError(f"Date antérieure à BITMAP_EPOCH ({BITMAP_EPOCH})")
+        width = int(day_offsets.max()) // 8 + 1
+        if width > self.bitmap.shape[1]:
+            grow = np.zeros((len(self.ids), width - self.bitmap.shape[1]), dtype=np.uint8)
+            self.bitmap = np.hstack([self.bitmap, grow])
+        bits = (1 << (day_offsets % 8)).astype(np.uint8)
+        np.bitwise_or.at(self.bitmap, (rows[codes], day_offsets // 8), bits)
+
+    def n_days(self):
+        return _POPCOUNT[self.bitmap].sum(axis=1)
+
+    def std(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(np.where(self.n > 0, self.m2 / self.n, np.nan))
+
+    def to_table(self):
+        return pa.table({
+            "amenagement_id": pa.array(self.ids, type=pa.string()),
+            "n": self.n,
+            "mean": self.mean,
+            "m2": self.m2,
+            "day_bitmap": pa.array([row.tobytes() for row in self.bitmap], type=pa.binary()),
+        })
+
+    @classmethod
+    def from_table(cls, table):
+        blobs = table.column("day_bitmap").to_pylist()
+        width = max((len(b) for b in blobs), default=0)
+        bitmap = np.zeros((len(blobs), width), dtype=np.uint8)
+        for i, blob in enumerate(blobs):
+            bitmap[i, :len(blob)] = np.frombuffer(blob, dtype=np.uint8)
+        return cls(
+            table.column("amenagement_id").to_pylist(),
+            table.column("n").to_numpy(),
+            table.column("mean").to_numpy(),
+            table.column("m2").to_numpy(),
+            bitmap,
+        )
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. LECTURE DES FICHIERS NON INTÉGRÉS
+# ═════════════════════════════════════════════════════════════
+
+def list_input_files(input_dir):
+    """{chemin relatif: [taille, mtime_ns]} des fichiers Parquet de l'entrée."""
+    files = {}
+    for root, dirs, names in os.walk(input_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(("_", "."))]
+        for name in names:
+            if name.startswith(("_", ".")) or not name.endswith(".parquet"):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files[os.path.relpath(path, input_dir)] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+def _day_offsets(dates):
+    """Colonne date (date32, timestamp ou string) → jours depuis BITMAP_EPOCH."""
+    if pa.types.is_string(dates.type) or pa.types.is_large_string(dates.type) or pa.types.is_dictionary(dates.type):
+        dates = pc.strptime(dates.cast(pa.string()), format="%Y-%m-%d", unit="s")
+    days = dates.cast(pa.date32()).to_numpy(zero_copy_only=False).astype("datetime64[D]")
+    return (days - BITMAP_EPOCH).astype(np.int64)
+
+
+def input_dataset(input_dir, paths):
+    """Dataset des fichiers `paths` (relatifs à input_dir), partitions Hive comprises."""
+    return ds.dataset(
+        [os.path.join(input_dir, p) for p in paths],
+        format="parquet",
+        partitioning=ds.partitioning(flavor="hive"),
+        partition_base_dir=str(input_dir),
+    )
+
+
+def fold_files(state, input_dir, paths):
+    """Fusionne les fichiers `paths` (relatifs à input_dir) ; retourne le nombre de lignes lues."""
+    if not paths:
+        return 0
+    dataset = input_dataset(input_dir, paths)
+    n_rows = 0
+    for batch in dataset.to_batches(columns=["amenagement_id", "date", "flux_estime"]):
+        # Mêmes filtres que Scoring2 : id non nul, flux >= 0
+        flux = pc.cast(batch.column("flux_estime"), pa.float64())
+        keep = pc.and_(pc.is_valid(batch.column("amenagement_id")), pc.greater_equal(flux, 0.0))
+        keep = pc.fill_null(keep, False)
+        batch = batch.filter(keep)
+        if batch.num_rows == 0:
+            continue
+
+        ids = batch.column("amenagement_id").cast(pa.string()).to_numpy(zero_copy_only=False)
+        state.fold(
+            ids,
+            _day_offsets(batch.column("date")),
+            pc.cast(batch.column("flux_estime"), pa.float64()).to_numpy(zero_copy_only=False),
+        )
+        n_rows += batch.num_rows
+    return n_rows
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. SCORES DEPUIS L'ÉTAT
+# ═════════════════════════════════════════════════════════════
+
+def score_columns(ids, n_days, mean, std, w_usage=W_USAGE, w_stab=W_STAB):
+    """DataFrame amenagement_id, n_days_total, mean/std, usage/stability/score (NaN si < MIN_DAYS_TOTAL)."""
+    mean = np.asarray(mean, dtype=np.float64)
+    std = np.asarray(std, dtype=np.float64)
+    n_days = np.asarray(n_days)
+
+    usage = percent_rank(mean)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stability = np.where(mean > 0, 1.0 - std / mean, 0.0)
+    stability = np.clip(np.nan_to_num(stability, nan=0.0), 0.0, 1.0)
+
+    score = w_usage * usage + w_stab * stability
+    score = np.where(n_days >= MIN_DAYS_TOTAL, score, np.nan)
+
+    return pd.DataFrame({
+        "amenagement_id": list(ids),
+        "n_days_total": n_days,
+        "mean_flux_global": mean,
+        "std_flux_global": std,
+        "usage_score": usage,
+        "stability_score": stability,
+        "score": score,
+    })
+
+
+def compute_scores(state, w_usage=W_USAGE, w_stab=W_STAB):
+    """Scores depuis l'état incrémental."""
+    return score_columns(state.ids, state.n_days(), state.mean, state.std(), w_usage, w_stab)
+
+
+def scan_scores(backend, input_dir, w_usage=W_USAGE, w_stab=W_STAB):
+    """
+    Scores par relecture complète, sur le backend choisi (src/common/backend.py) :
+    seule l'agrégation par aménagement s'exécute sur le backend.
+    """
+    daily = backend.read_parquet(input_dir, columns=["amenagement_id", "date", "flux_estime"])
+    daily = daily[daily["amenagement_id"].notnull() & (daily["flux_estime"] >= 0)]
+    daily = daily.assign(flux_estime=daily["flux_estime"].astype("float64"))
+
+    agg = daily.groupby("amenagement_id").agg(
+        n_days_total=("date", "nunique"),
+        n=("flux_estime", "count"),
+        mean_flux_global=("flux_estime", "mean"),
+        std_sample=("flux_estime", "std"),
+    ).reset_index()
+    agg = backend.to_pandas(agg)
+
+    # stddev_pop = écart-type échantillon · sqrt((n - 1) / n)
+    n = agg["n"].to_numpy(dtype=np.float64)
+    std = np.nan_to_num(agg["std_sample"].to_numpy(dtype=np.float64)) * np.sqrt((n - 1) / n)
+    return score_columns(agg["amenagement_id"].astype(str), agg["n_days_total"], agg["mean_flux_global"], std,
+                         w_usage, w_stab)
+
+
+def write_scores_json(scores, output_dir):
+    """Même format que les scores annuels de Scoring2 : JSON lines, id préfixé, score arrondi à 6 décimales."""
+    out = scores[scores["score"].notna()]
+    out = pd.DataFrame({
+        "amenagement_id": ID_PREFIX + out["amenagement_id"].astype(str),
+        "score": out["score"].round(6),
+    })
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.startswith("part-") or name.startswith("_SUCCESS"):
+            os.remove(os.path.join(output_dir, name))
+    tmp_path = os.path.join(output_dir, ".part-00000.json.tmp")
+    out.to_json(tmp_path, orient="records", lines=True, force_ascii=False)
+    os.replace(tmp_path, os.path.join(output_dir, "part-00000.json"))
+    return len(out)
+
+
+# ═════════════════════════════════════════════════════════════
+# 4. ORCHESTRATION
+# ═════════════════════════════════════════════════════════════
+
+def load_state(state_dir):
+    """(state, folded) ; état vide si absent."""
+    state_path = os.path.join(state_dir, STATE_FILE)
+    folded_path = os.path.join(state_dir, FOLDED_FILE)
+    if not (os.path.exists(state_path) and os.path.exists(folded_path)):
+        return ScoreState(), {}
+    with open(folded_path, encoding="utf-8") as f:
+        folded = json.load(f)
+    return ScoreState.from_table(pq.read_table(state_path)), folded
+
+
+def save_state(state_dir, state, folded):
+    """État puis liste des fichiers intégrés, chacun écrit de façon atomique."""
+    os.makedirs(state_dir, exist_ok=True)
+    state_path = os.path.join(state_dir, STATE_FILE)
+    pq.write_table(state.to_table(), f"{state_path}.tmp")
+    os.replace(f"{state_path}.tmp", state_path)
+
+    folded_path = os.path.join(state_dir, FOLDED_FILE)
+    with open(f"{folded_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(folded, f, indent=1, sort_keys=True)
+    os.replace(f"{folded_path}.tmp", folded_path)
+
+
+def refresh(input_dir, state_dir, rebuild=False):
+    """
+    Met l'état à jour avec les nouveaux fichiers d'entrée et retourne
+    (state, n_new_rows). Les nouveaux fichiers sont validés par le contrat
+    de src/scoring/checks.py avant fusion (ContractViolation sinon).
+    """
+    current = list_input_files(input_dir)
+    state, folded = (ScoreState(), {}) if rebuild else load_state(state_dir)
+
+    stale = [p for p, meta in folded.items() if current.get(p) != meta]
+    if stale:
+        print(f"⚠️ {len(stale)} fichier(s) déjà intégré(s) modifié(s) ou supprimé(s) → reconstruction complète")
+        state, folded = ScoreState(), {}
+
+    new_files = sorted(p for p in current if p not in folded)
+    if new_files:
+        # Barrière : les nouveaux fichiers respectent le contrat avant d'entrer dans l'état
+        enforce([(GOLD_CONTRACTS["gold_flow_amenagement_daily"], input_dataset(input_dir, new_files))])
+    n_rows = fold_files(state, input_dir, new_files)
+    folded.update({p: current[p] for p in new_files})
+
+    save_state(state_dir, state, folded)
+    print(f"✓ {len(new_files)} nouveau(x) fichier(s), {n_rows:,} lignes intégrées ; {len(state):,} aménagements en état")
+    return state, n_rows
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Scoring global incrémental")
+    parser.add_argument("--input", default=str(PROJECT_ROOT / config["paths"]["gold_dir"] / "gold_flow_amenagement_daily"))
+    parser.add_argument("--state-dir", default=str(PROJECT_ROOT / config["paths"]["gold_dir"] / "gold_score_state"))
+    parser.add_argument("--output", default=str(PROJECT_ROOT / "amenagement_scoring_global_json_2"))
+    parser.add_argument("--rebuild", action="store_true", help="ignorer l'état et tout recalculer")
+    parser.add_argument("--scan", action="store_true", help="relecture complète sur un backend, sans état")
+    parser.add_argument("--backend", default=None, help="local, spark ou auto (avec --scan)")
+    parser.add_argument("--w-usage", type=float, default=config["params"].get("w_usage", W_USAGE))
+    parser.add_argument("--w-stab", type=float, default=config["params"].get("w_stab", W_STAB))
+    args = parser.parse_args()
+
+    with RunReport("scoring") as report:
+        if args.scan:
+            backend = get_backend(args.backend, inputs=[args.input], app_name="Velomenaj_Scoring_Global")
+            with report.stage("scoring", backend) as st:
+                st.read(args.input)
+                scores = scan_scores(backend, args.input, args.w_usage, args.w_stab)
+                n_scored = write_scores_json(scores, args.output)
+                st.wrote(args.output, rows=n_scored)
+            backend.stop()
+        else:
+            with report.stage("scoring", "incremental") as st:
+                state, st.rows_in = refresh(args.input, args.state_dir, rebuild=args.rebuild)
+                scores = compute_scores(state, args.w_usage, args.w_stab)
+                n_scored = write_scores_json(scores, args.output)
+                st.wrote(args.output, rows=n_scored)
+                st.add(amenagements_in_state=len(state))
+
+    print(f"✅ Global Scores (v2) written to: {args.output}")
+    print(f"Total Scored Amenities: {n_scored}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Module: Rangs centiles et quantiles globaux (sans fenêtre mono-partition)
+──────────────────────────────────────────────────────────────────────────
+`F.percent_rank().over(Window.orderBy(...))` sans partitionBy ramène toutes
+les lignes dans une seule partition ("No Partition Defined for Window
+operation"). Ici le rang global est reconstruit par tranches de valeurs :
+
+  1. Bornes de tranches tirées d'approxQuantile (équilibrage seulement :
+     l'exactitude n'en dépend pas).
+  2. Chaque ligne reçoit sa tranche, fonction pure de la valeur : les ex æquo
+     tombent toujours dans la même tranche.
+  3. Comptage par (groupe, tranche) → petite table collectée → décalage
+     cumulé de chaque tranche (nombre de lignes dans les tranches inférieures).
+  4. rank() dans une fenêtre partitionBy(groupe, tranche) : tri distribué.
+  5. percent_rank = (décalage + rang local - 1) / (N_groupe - 1).
+
+Résultat identique à percent_rank() de Spark (ex æquo au rang le plus bas,
+NULLs en dernier). Le même principe donne un quantile exact
+(`spark_quantile`) : seule la tranche qui contient le rang cible est triée.
+
+Les variantes NumPy/pandas (`percent_rank`, `grouped_percent_rank`,
+`quantile`) servent au scoring local (src/scoring/pipeline.py).
+
+Usage:
+  from src.scoring.ranking import spark_percent_rank, spark_quantile
+  scored = spark_percent_rank(agg, "mean_flux_global", "usage_score")
+  yearly = spark_percent_rank(agg_year, "mean_flux", "usage_score", partition_by=["year"])
+  threshold = spark_quantile(df_full, "score", 0.9)
+"""
+
+import math
+
+import numpy as np
+
+DEFAULT_BUCKETS = 64
+BUCKET_COL = "_rank_bucket"
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. VERSION LOCALE (NumPy / pandas)
+# ═════════════════════════════════════════════════════════════
+
+def percent_rank(values):
+    """percent_rank() de Spark : (rang - 1) / (N - 1), ex æquo au rang le plus bas."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= 1:
+        return np.zeros(len(values))
+    # np.sort et searchsorted placent les NaN en dernier, comme asc_nulls_last
+    rank = np.searchsorted(np.sort(values), values, side="left")
+    return rank / (len(values) - 1)
+
+
+def grouped_percent_rank(df, value_col, partition_by):
+    """percent_rank() sur Window.partitionBy(partition_by).orderBy(value_col), en pandas."""
+    groups = df.groupby(partition_by, sort=False)[value_col]
+    rank = groups.rank(method="min", na_option="bottom")
+    size = groups.transform("size")
+    return ((rank - 1) / (size - 1)).where(size > 1, 0.0)
+
+
+def quantile(values, q):
+    """
+    Quantile exact, même convention qu'approxQuantile de Spark avec une
+    erreur nulle : élément de rang ceil(q · N) (NaN ignorés).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = np.sort(values[~np.isnan(values)])
+    if len(values) == 0:
+        return float("nan")
+    return float(values[max(math.ceil(q * len(values)), 1) - 1])
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. TRANCHES DE VALEURS (Spark)
+# ═════════════════════════════════════════════════════════════
+
+def _bucket_expr(value_col, boundaries):
+    """Tranche = nombre de bornes <= valeur ; NULL → dernière tranche."""
+    from pyspark.sql import functions as F
+
+    col = F.col(value_col)
+    bucket = F.lit(0)
+    for boundary in boundaries:
+        bucket = bucket + F.when(col >= F.lit(boundary), 1).otherwise(0)
+    return F.when(col.isNull(), F.lit(len(boundaries) + 1)).otherwise(bucket)
+
+
+def _boundaries(df, value_col, num_buckets, relative_error=0.01):
+    """Bornes distinctes approximativement équi-réparties (approxQuantile ignore les NULLs)."""
+    if num_buckets <= 1:
+        return []
+    probs = [i / num_buckets for i in range(1, num_buckets)]
+    return sorted(set(df.approxQuantile(value_col, probs, relative_error)))
+
+
+def _bucket_offsets(bucketed, partition_by):
+    """
+    {(groupe..., tranche): décalage} et {groupe: effectif} depuis les comptes
+    par tranche (au plus n_groupes × n_tranches lignes collectées). Une clé
+    de groupe NULL forme un groupe, comme dans Window.partitionBy.
+    """
+    counts = bucketed.groupBy(*partition_by, BUCKET_COL).count().collect()
+    offsets, totals = {}, {}
+    for row in sorted(counts, key=lambda r: tuple((r[c] is None, r[c]) for c in partition_by) + (r[BUCKET_COL],)):
+        group = tuple(row[c] for c in partition_by)
+        offsets[group + (row[BUCKET_COL],)] = totals.get(group, 0)
+        totals[group] = totals.get(group, 0) + row["count"]
+    return offsets, totals
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. RANG CENTILE ET QUANTILE DISTRIBUÉS (Spark)
+# ═════════════════════════════════════════════════════════════
+
+def spark_percent_rank(df, value_col, output_col, partition_by=(), num_buckets=DEFAULT_BUCKETS):
+    """
+    Ajoute `output_col` = percent_rank() de `value_col` (croissant, NULLs en
+    dernier), global ou par `partition_by`, sans fenêtre mono-partition.
+
+    L'entrée est persistée le temps des trois passes (bornes, comptes,
+    rangs) : un groupBy amont n'est calculé qu'une fois. Le résultat est
+    rendu persisté et matérialisé (`unpersist()` à la charge de l'appelant).
+    Les clés de groupe NULL sont jointes null-safe et forment un groupe.
+    """
+    from pyspark.sql import functions as F
+    from pyspark.sql.types import IntegerType, LongType, StructField, StructType
+    from pyspark.sql.window import Window
+
+    partition_by = list(partition_by)
+    owned = not df.is_cached
+    if owned:
+        df = df.persist()
+    try:
+        boundaries = _boundaries(df, value_col, num_buckets)
+        bucketed = df.withColumn(BUCKET_COL, _bucket_expr(value_col, boundaries))
+
+        offsets, totals = _bucket_offsets(bucketed, partition_by)
+        if not offsets:
+            return df.withColumn(output_col, F.lit(None).cast("double"))
+
+        # Clés renommées pour la jointure null-safe (eqNullSafe) : une jointure
+        # `on=` classique perdrait les lignes dont une clé de groupe est NULL
+        keys = [f"_rank_key{i}" for i in range(len(partition_by))]
+        schema = StructType(
+            [StructField(k, df.schema[c].dataType, True) for k, c in zip(keys, partition_by)]
+            + [StructField("_rank_bucket_key", IntegerType(), False),
+               StructField("_rank_offset", LongType(), False),
+               StructField("_rank_total", LongType(), False)]
+        )
+        offsets_df = df.sparkSession.createDataFrame(
+            [group_bucket + (offset, totals[group_bucket[:-1]]) for group_bucket, offset in offsets.items()],
+            schema,
+        )
+        condition = [bucketed[BUCKET_COL] == offsets_df["_rank_bucket_key"]]
+        condition += [bucketed[c].eqNullSafe(offsets_df[k]) for c, k in zip(partition_by, keys)]
+
+        w_local = Window.partitionBy(*partition_by, BUCKET_COL).orderBy(F.col(value_col).asc_nulls_last())
+        ranked = (
+            bucketed
+            .join(F.broadcast(offsets_df), on=condition, how="inner")
+            .drop(*keys, "_rank_bucket_key")
+            .withColumn("_rank_local", F.rank().over(w_local))
+        )
+        percent = F.when(
+            F.col("_rank_total") > 1,
+            (F.col("_rank_offset") + F.col("_rank_local") - 1) / (F.col("_rank_total") - 1),
+        ).otherwise(F.lit(0.0))
+
+        result = (
+            ranked
+            .withColumn(output_col, percent.cast("double"))
+            .drop(BUCKET_COL, "_rank_offset", "_rank_total", "_rank_local")
+            .persist()
+        )
+        result.count()  # matérialisé avant de libérer l'entrée
+        return result
+    finally:
+        if owned:
+            df.unpersist()
+
+
+def spark_quantile(df, value_col, q, num_buckets=DEFAULT_BUCKETS):
+    """
+    Quantile exact de `value_col` (NULLs ignorés), remplaçant approxQuantile :
+    seule la tranche contenant le rang ceil(q · N) est ramenée et triée.
+    L'entrée filtrée est persistée le temps des trois passes.
+    """
+    from pyspark.sql import functions as F
+
+    df = df.filter(F.col(value_col).isNotNull()).persist()
+    try:
+        boundaries = _boundaries(df, value_col, num_buckets)
+        bucketed = df.withColumn(BUCKET_COL, _bucket_expr(value_col, boundaries))
+
+        offsets, totals = _bucket_offsets(bucketed, [])
+        total = totals.get((), 0)
+        if total == 0:
+            return float("nan")
+
+        target = max(math.ceil(q * total), 1)
+        bucket = max(b for (b,), offset in offsets.items() if offset < target)
+        values = sorted(
+            row[0] for row in bucketed.filter(F.col(BUCKET_COL) == bucket).select(value_col).collect()
+        )
+        return float(values[target - offsets[(bucket,)] - 1])
+    finally:
+        df.unpersist()
@@ -0,0 +1,448 @@
+"""
+Module: Service de requêtes local pour les tableaux de bord
+───────────────────────────────────────────────────────────
+DataViz/app.js télécharge les GeoJSON complets (amenities, counters,
+predictions, tension) et viz2 embarque les fichiers par année
+(`src/data/scores/2014.json` … `2025.json`, `velo_par_annee.json`) dans le bundle.
+Ce service HTTP (bibliothèque standard) sert à la place les données de la
+vue courante.
+
+Principe:
+  - Au démarrage : chargement des couches DataViz/data/*.geojson et
+    construction d'un index spatial par couche (grille uniforme sur les
+    coordonnées "monde" Web Mercator, clés triées, même schéma que
+    AmenagementIndex dans src/spatial_usage/linking.py).
+  - Requêtes bbox : cellules de la grille couvertes → candidats → test
+    exact des emprises. La bbox demandée est arrondie vers l'extérieur aux
+    cellules de la grille : deux vues proches partagent la même clé de
+    cache (réponse légèrement plus large, jamais incomplète).
+  - Tuiles MVT à la demande : seules les features qui touchent la tuile
+    sont encodées (src/export/vector_tiles.py).
+  - Totaux annuels par compteur : lus dans la copie compactée des mesures
+    (partitions year=/month=), année par année, à la première demande
+    (même agrégat que src/export/yearly_export.py).
+  - Scores : gold_amenagement_score (src/scoring/impact.py) et score
+    global (amenagement_scoring_global_json_2), par identifiant.
+  - Chaque réponse est encodée une fois (JSON compact, gzip, ETag = empreinte
+    du contenu) puis gardée dans un cache LRU borné en octets ;
+    `If-None-Match` → 304. Les données sont lues au démarrage : relancer le
+    service après une mise à jour des tables.
+
+Endpoints (GET):
+  /health                                  couches, années, taille du cache
+  /layers/<couche>?bbox=lon0,lat0,lon1,lat1[&limit=N]   FeatureCollection
+  /tiles/<z>/<x>/<y>.pbf                   tuile MVT (204 si vide)
+  /counters/years                          années disponibles
+  /counters/<année>                        {point_id: total annuel}
+  /scores?ids=a,b,…   /scores/<id>         scores par aménagement
+  /scores/year/<année>                     fichier de scores annuel (viz2)
+  /stats                                   DataViz/data/stats.json
+
+Input:
+  - DataViz/data/*.geojson, DataViz/data/stats.json
+  - data/silver/silver_measures_union_compact/
+  - data/gold/gold_amenagement_score/, amenagement_scoring_global_json_2/
+  - src/viz2/src/data/scores/<année>.json (scores annuels)
+
+Output:
+  - réponses HTTP ; data/_runs/<run_id>/serving.json (chargement)
+
+Usage:
+  python -m src.serving.server [--host 127.0.0.1] [--port 8765] [--cache-mb 64]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.telemetry import RunReport
+from src.export.vector_tiles import (
+    BUFFER, DEFAULT_LAYERS, EXTENT, encode_tile, load_geojson_layers, prepare_layer, to_world,
+)
+from src.export.yearly_export import counter_totals, counters_json
+from src.scoring.pipeline import ID_PREFIX
+
+LAYERS = DEFAULT_LAYERS + ["predictions"]
+GRID_ZOOM = 14          # cellules de l'index et de l'arrondi des bbox (~1,7 km à Lyon)
+CACHE_BYTES = 64 << 20
+GZIP_LEVEL = 6
+
+Encoded = namedtuple("Encoded", "body etag content_type")
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. ENCODAGE ET CACHE LRU
+# ═════════════════════════════════════════════════════════════
+
+def encode(payload, content_type="application/json"):
+    """Corps gzip + ETag (empreinte du contenu non compressé) ; dict/list sérialisés en JSON compact."""
+    if not isinstance(payload, bytes):
+        payload = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    etag = '"' + hashlib.blake2b(payload, digest_size=12).hexdigest() + '"'
+    return Encoded(gzip.compress(payload, GZIP_LEVEL, mtime=0), etag, content_type)
+
+
+EMPTY_BODY = encode(b"").body  # tuile vide → 204
+
+
+class LRUCache:
+    """Réponses encodées par clé de requête ; éviction des moins récentes au-delà de max_bytes."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        # Calcul hors verrou : deux requêtes simultanées peuvent calculer la même clé
+        value = compute()
+        with self._lock:
+            if key not in self._items and len(value.body) <= self.max_bytes:
+                self._items[key] = value
+                self.bytes += len(value.body)
+                while self.bytes > self.max_bytes:
+                    _, old = self._items.popitem(last=False)
+                    self.bytes -= len(old.body)
+        return value
+
+    def stats(self):
+        return {"entries": len(self._items), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. INDEX SPATIAL DES COUCHES
+# ═════════════════════════════════════════════════════════════
+
+def _cell(w, zoom=GRID_ZOOM):
+    return np.floor(np.asarray(w) * (1 << zoom)).astype(np.int64)
+
+
+class LayerIndex:
+    """
+    Grille uniforme (tuiles du zoom GRID_ZOOM) sur les emprises des features
+    d'une couche, en coordonnées monde [0, 1] (y vers le sud).
+
+    Chaque feature est enregistrée dans toutes les cellules que couvre son
+    emprise ; une requête lit les plages [lo, hi) des cellules visitées dans
+    les clés triées, puis garde les emprises qui intersectent réellement.
+    """
+
+    def __init__(self, name, features):
+        self.name = name
+        self.features = features
+        self.prepared = prepare_layer(features)
+
+        boxes = np.array([
+            np.concatenate([np.concatenate(world).min(axis=0), np.concatenate(world).max(axis=0)])
+            for _, _, world, _ in self.prepared
+        ]).reshape(-1, 4)
+        self._x0, self._y0, self._x1, self._y1 = boxes.T
+
+        ix0, iy0, ix1, iy1 = _cell(self._x0), _cell(self._y0), _cell(self._x1), _cell(self._y1)
+        nx, ny = ix1 - ix0 + 1, iy1 - iy0 + 1
+        n_cells = nx * ny
+        entry = np.repeat(np.arange(len(boxes)), n_cells)
+        k = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        keys = self._cell_keys(ix0[entry] + k // ny[entry], iy0[entry] + k % ny[entry])
+
+        order = np.argsort(keys, kind="stable")
+        self._keys, self._entry = keys[order], entry[order]
+
+    def __len__(self):
+        return len(self.prepared)
+
+    @staticmethod
+    def _cell_keys(ix, iy):
+        return ix * (1 << GRID_ZOOM) + iy
+
+    def query(self, wx0, wy0, wx1, wy1):
+        """Indices (dans self.prepared, croissants) des features dont l'emprise intersecte la boîte monde."""
+        ix = np.arange(_cell(wx0), _cell(wx1) + 1)
+        iy = np.arange(_cell(wy0), _cell(wy1) + 1)
+        if len(ix) * len(iy) >= len(self._keys):
+            candidates = np.arange(len(self.prepared))
+        else:
+            keys = self._cell_keys(np.repeat(ix, len(iy)), np.tile(iy, len(ix)))
+            lo = np.searchsorted(self._keys, keys, side="left")
+            hi = np.searchsorted(self._keys, keys, side="right")
+            counts = hi - lo
+            run_start = np.repeat(np.cumsum(counts) - counts, counts)
+            candidates = np.unique(self._entry[np.repeat(lo, counts) + (np.arange(counts.sum()) - run_start)])
+        hit = ((self._x0[candidates] <= wx1) & (self._x1[candidates] >= wx0)
+               & (self._y0[candidates] <= wy1) & (self._y1[candidates] >= wy0))
+        return candidates[hit]
+
+    def bbox(self, minlon, minlat, maxlon, maxlat, limit=None):
+        """Features GeoJSON d'origine qui intersectent la bbox (lon/lat)."""
+        wx0, wy1 = to_world(minlon, minlat)
+        wx1, wy0 = to_world(maxlon, maxlat)
+        hits = self.query(float(wx0), float(wy0), float(wx1), float(wy1))[:limit]
+        return [self.features[self.prepared[i][0] - 1] for i in hits]
+
+    def tile_features(self, z, x, y, buffer=BUFFER, extent=EXTENT):
+        """Entrées prepare_layer qui touchent la tuile z/x/y (marge `buffer` comprise)."""
+        margin = buffer / extent
+        size = 1.0 / (1 << z)
+        hits = self.query((x - margin) * size, (y - margin) * size, (x + 1 + margin) * size, (y + 1 + margin) * size)
+        return [self.prepared[i] for i in hits]
+
+
+def snap_bbox(minlon, minlat, maxlon, maxlat, zoom=GRID_ZOOM):
+    """Bbox élargie aux bords des cellules de la grille : clé de cache stable pendant un déplacement."""
+    n = 1 << zoom
+    wx0, wy1 = to_world(minlon, minlat)
+    wx1, wy0 = to_world(maxlon, maxlat)
+    x0, x1 = math.floor(float(wx0) * n) / n, (math.floor(float(wx1) * n) + 1) / n
+    y0, y1 = math.floor(float(wy0) * n) / n, (math.floor(float(wy1) * n) + 1) / n
+    lon = lambda x: x * 360.0 - 180.0
+    lat = lambda y: math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return round(lon(x0), 6), round(lat(y1), 6), round(lon(x1), 6), round(lat(y0), 6)
+
+
+# ═════════════════════════════════════════════════════════════
+# 3. DONNÉES TABULAIRES (COMPTEURS, SCORES)
+# ═════════════════════════════════════════════════════════════
+
+def measure_years(measures_path):
+    """Années présentes dans une table compactée (répertoires year=YYYY)."""
+    if not os.path.isdir(measures_path):
+        return []
+    return sorted(int(m[1]) for m in (re.fullmatch(r"year=(\d{4})", d) for d in os.listdir(measures_path)) if m)
+
+
+def _raw_id(value):
+    value = str(value)
+    return value[len(ID_PREFIX):] if value.startswith(ID_PREFIX) else value
+
+
+def load_scores(impact_path, global_path):
+    """{amenagement_id (sans préfixe): enregistrement} depuis les deux sorties de scoring présentes."""
+    scores = {}
+    if os.path.isdir(impact_path):
+        impact = ds.dataset(impact_path, format="parquet").to_table().to_pandas()
+        impact = impact.astype(object).where(impact.notna(), None)
+        for record in impact.to_dict("records"):
+            scores[_raw_id(record["amenagement_id"])] = record
+    if os.path.isdir(global_path):
+        files = sorted(os.path.join(global_path, n) for n in os.listdir(global_path) if n.startswith("part-"))
+        for path in files:
+            for row in pd.read_json(path, lines=True, dtype={"amenagement_id": str}).itertuples(index=False):
+                key = _raw_id(row.amenagement_id)
+                scores.setdefault(key, {"amenagement_id": key})["score_global"] = float(row.score)
+    for key, record in scores.items():
+        record["amenagement_id"] = key
+    return scores
+
+
+# ═════════════════════════════════════════════════════════════
+# 4. SERVICE
+# ═════════════════════════════════════════════════════════════
+
+class NotFound(Exception):
+    pass
+
+
+class QueryService:
+    """Données chargées au démarrage + routage des requêtes vers des réponses encodées (mises en cache)."""
+
+    def __init__(self, layers_dir, measures_path, impact_path, global_path, year_scores_dir,
+                 cache_bytes=CACHE_BYTES, metrics=None):
+        self.layers_dir = layers_dir
+        self.measures_path = measures_path
+        self.year_scores_dir = year_scores_dir
+        self.layers = {name: LayerIndex(name, features)
+                       for name, features in load_geojson_layers(layers_dir, LAYERS).items()}
+        self.years = measure_years(measures_path)
+        self.scores = load_scores(impact_path, global_path)
+        self.cache = LRUCache(cache_bytes)
+        if metrics is not None:
+            metrics.rows_out = sum(len(index) for index in self.layers.values()) + len(self.scores)
+            metrics.add(layers={n: len(i) for n, i in self.layers.items()}, years=len(self.years),
+                        scores=len(self.scores))
+
+    def handle(self, path, query):
+        """(chemin, paramètres) → Encoded ; NotFound / ValueError pour les requêtes invalides."""
+        parts = [unquote(p) for p in path.strip("/").split("/") if p]
+        if parts == ["health"] or not parts:
+            return encode({"layers": {n: len(i) for n, i in self.layers.items()}, "counter_years": self.years,
+                           "scores": len(self.scores), "cache": self.cache.stats()})
+
+        key, compute = self._route(parts, query)
+        return self.cache.get_or_compute(key, compute)
+
+    def _route(self, parts, query):
+        head, rest = parts[0], parts[1:]
+        if head == "layers" and len(rest) == 1:
+            return self._layer(rest[0], query)
+        if head == "tiles" and len(rest) == 3 and rest[2].endswith(".pbf"):
+            z, x, y = int(rest[0]), int(rest[1]), int(rest[2][:-4])
+            if not (0 <= z <= 22 and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+                raise ValueError(f"tuile hors grille : {z}/{x}/{y}")
+            return ("tile", z, x, y), lambda: self._tile(z, x, y)
+        if head == "counters" and rest == ["years"]:
+            return ("counter_years",), lambda: encode(self.years)
+        if head == "counters" and len(rest) == 1:
+            year = int(rest[0])
+            if year not in self.years:
+                raise NotFound(f"année {year} absente de {self.measures_path}")
+            return ("counters", year), lambda: encode(
+                counters_json(counter_totals(self.measures_path, year)).encode("utf-8"))
+        if head == "scores" and len(rest) == 2 and rest[0] == "year":
+            path = os.path.join(self.year_scores_dir, f"{int(rest[1])}.json")
+            if not os.path.exists(path):
+                raise NotFound(path)
+            return ("year_scores", int(rest[1])), lambda: encode(Path(path).read_bytes())
+        if head == "scores" and len(rest) == 1:
+            record = self.scores.get(_raw_id(rest[0]))
+            if record is None:
+                raise NotFound(f"aménagement {rest[0]}")
+            return ("score", record["amenagement_id"]), lambda: encode(record)
+        if head == "scores" and not rest:
+            ids = sorted({_raw_id(i) for v in query.get("ids", []) for i in v.split(",") if i})
+            if not ids:
+                raise ValueError("paramètre ids requis")
+            return ("scores", tuple(ids)), lambda: encode({i: self.scores.get(i) for i in ids})
+        if head == "stats" and not rest:
+            path = os.path.join(self.layers_dir, "stats.json")
+            if not os.path.exists(path):
+                raise NotFound(path)
+            return ("stats",), lambda: encode(Path(path).read_bytes())
+        raise NotFound("/" + "/".join(parts))
+
+    def _layer(self, name, query):
+        index = self.layers.get(name)
+        if index is None:
+            raise NotFound(f"couche {name}")
+        limit = int(query["limit"][0]) if "limit" in query else None
+        if "bbox" not in query:
+            return ("layer", name, None, limit), lambda: encode(
+                {"type": "FeatureCollection", "features": index.features[:limit]}, "application/geo+json")
+        minlon, minlat, maxlon, maxlat = (float(v) for v in query["bbox"][0].split(","))
+        if not (minlon <= maxlon and minlat <= maxlat):
+            raise ValueError("bbox attendue : lon0,lat0,lon1,lat1")
+        bbox = snap_bbox(minlon, minlat, maxlon, maxlat)
+        return ("layer", name, bbox, limit), lambda: encode(
+            {"type": "FeatureCollection", "bbox": list(bbox), "features": index.bbox(*bbox, limit=limit)},
+            "application/geo+json")
+
+    def _tile(self, z, x, y):
+        prepared = {name: index.tile_features(z, x, y) for name, index in self.layers.items()}
+        prepared = {name: entries for name, entries in prepared.items() if entries}
+        return encode(encode_tile(prepared, z, x, y) if prepared else b"", "application/vnd.mapbox-vector-tile")
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            try:
+                response = service.handle(url.path, parse_qs(url.query))
+            except NotFound as e:
+                return self._error(404, f"introuvable : {e}")
+            except ValueError as e:
+                return self._error(400, str(e))
+
+            if_none_match = {tag.strip() for tag in (self.headers.get("If-None-Match") or "").split(",")}
+            if response.body == EMPTY_BODY:
+                status = 204
+            elif response.etag in if_none_match or "*" in if_none_match:
+                status = 304
+            else:
+                status = 200
+            self.send_response(status)
+            self.send_header("ETag", response.etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if status != 200:
+                return self.end_headers()
+
+            body = response.body
+            if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                self.send_header("Content-Encoding", "gzip")
+            else:
+                body = gzip.decompress(body)
+            self.send_header("Content-Type", response.content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status, message):
+            body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            if os.environ.get("VELOMENAJ_SERVING_LOG"):
+                super().log_message(fmt, *args)
+
+    return Handler
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+    gold_dir = PROJECT_ROOT / config["paths"]["gold_dir"]
+    silver_dir = PROJECT_ROOT / config["paths"]["silver_dir"]
+
+    parser = argparse.ArgumentParser(description="Service de requêtes local (bbox, tuiles, compteurs, scores)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--layers-dir", default=str(PROJECT_ROOT / "DataViz" / "data"))
+    parser.add_argument("--measures", default=str(silver_dir / "silver_measures_union_compact"))
+    parser.add_argument("--impact", default=str(gold_dir / "gold_amenagement_score"))
+    parser.add_argument("--global-scores", default=str(PROJECT_ROOT / "amenagement_scoring_global_json_2"))
+    parser.add_argument("--year-scores", default=str(PROJECT_ROOT / "src" / "viz2" / "src" / "data" / "scores"))
+    parser.add_argument("--cache-mb", type=int, default=CACHE_BYTES >> 20)
+    args = parser.parse_args()
+
+    with RunReport("serving") as report:
+        with report.stage("load") as st:
+            st.read(args.layers_dir)
+            service = QueryService(args.layers_dir, args.measures, args.impact, args.global_scores,
+                                   args.year_scores, cache_bytes=args.cache_mb << 20, metrics=st)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"✅ Service prêt sur http://{args.host}:{args.port} "
+          f"({', '.join(f'{n}: {len(i)}' for n, i in service.layers.items())})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
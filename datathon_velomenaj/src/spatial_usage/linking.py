@@ -0,0 +1,408 @@
+"""
+Module: Liaison spatiale points de mesure ↔ aménagements
+─────────────────────────────────────────────────────────
+Remplace la double boucle `iterrows()` du notebook
+04_spatial_usage_direct_measures (O(points × aménagements × sommets)).
+
+Principe:
+  - On construit UNE fois un index spatial (grille de hachage uniforme)
+    sur les segments des tracés des aménagements, projetés en Lambert-93.
+  - Chaque point de mesure ne regarde que les cellules voisines de la
+    sienne ; les distances point ↔ segment (exactes, en mètres) sont
+    calculées en lot avec NumPy (src/common/geometry.py).
+
+Input:
+  - data/silver/silver_amenagements_with_coordinates/ (Parquet)
+  - data/silver/silver_measures_union2_compact/ (Parquet, src/ingestion_silver/compaction.py)
+
+Output:
+  - data/gold/gold_link_amenagement_point/ (Parquet)
+    colonnes: amenagement_id, point_id, point_type, distance_m, weight
+  - data/gold/gold_flow_amenagement_daily/date=YYYY-MM-DD/ (write_flow_partitions,
+    appelée par le notebook 04) : seuls les jours modifiés sont réécrits
+  - data/_runs/<run_id>/linking.json (rapport d'exécution)
+
+Usage:
+  python -m src.spatial_usage.linking [--buffer-m 100] [--backend local|spark|auto]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.backend import get_backend
+from src.common.geometry import flatten_lines, point_segment_distance, segment_starts, to_lambert93
+from src.common.telemetry import RunReport
+from src.ingestion_silver.pipeline import load_manifest, save_manifest
+
+LINK_COLUMNS = ["amenagement_id", "point_id", "point_type", "distance_m", "weight"]
+FLOW_COLUMNS = ["amenagement_id", "date", "flux_estime", "n_points"]
+FLOW_PARTITION_COLUMNS = ["amenagement_id", "flux_estime", "n_channels"]
+PARTITIONS_MANIFEST = "_partitions.json"
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. INDEX SPATIAL (grille de hachage uniforme, Lambert-93)
+# ═════════════════════════════════════════════════════════════
+
+class AmenagementIndex:
+    """
+    Grille de hachage uniforme sur les segments des tracés, en Lambert-93.
+
+    Chaque segment est enregistré dans toutes les cellules que couvre sa
+    bounding box : un segment long aux sommets espacés est donc retrouvé
+    même si aucun de ses sommets n'est proche du point.
+
+    La taille de cellule (en mètres) est fixée à la construction ; une requête
+    avec un buffer plus grand élargit simplement l'anneau de cellules visitées.
+    L'index est réutilisable pour plusieurs lots de points et plusieurs buffers.
+    """
+
+    def __init__(self, amenagement_ids, geometries, cell_m=100.0):
+        self.amenagement_ids = np.asarray(amenagement_ids, dtype=object)
+        self.cell_m = float(cell_m)
+
+        owner, part, lon, lat = flatten_lines(geometries)
+        self.n_indexed = len(np.unique(owner))
+
+        x, y = to_lambert93(lon, lat)
+        starts = segment_starts(part)
+        # Les sommets isolés (LineString à 1 point) deviennent des segments nuls
+        lone = np.setdiff1d(np.arange(len(part)), np.concatenate([starts, starts + 1]))
+        ax = np.concatenate([x[starts], x[lone]])
+        ay = np.concatenate([y[starts], y[lone]])
+        bx = np.concatenate([x[starts + 1], x[lone]])
+        by = np.concatenate([y[starts + 1], y[lone]])
+        seg_owner = np.concatenate([owner[starts], owner[lone]])
+
+        # Cellules couvertes par la bounding box de chaque segment
+        ix0, iy0 = self._cells(np.minimum(ax, bx), np.minimum(ay, by))
+        ix1, iy1 = self._cells(np.maximum(ax, bx), np.maximum(ay, by))
+        nx, ny = ix1 - ix0 + 1, iy1 - iy0 + 1
+        n_cells = nx * ny
+
+        seg = np.repeat(np.arange(len(ax)), n_cells)
+        k = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        keys = self._cell_keys(ix0[seg] + k // ny[seg], iy0[seg] + k % ny[seg])
+
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        seg = seg[order]
+        self._owner = seg_owner[seg]
+        self._ax, self._ay, self._bx, self._by = ax[seg], ay[seg], bx[seg], by[seg]
+
+    @classmethod
+    def from_dataframe(cls, df, id_col="amenagement_id", geom_col="geometry", cell_m=100.0):
+        """pandas DataFrame ou pyarrow Table (géométrie Arrow lue sans passer par Python)."""
+        if isinstance(df, pa.Table):
+            return cls(df.column(id_col).to_numpy(), df.column(geom_col), cell_m=cell_m)
+        return cls(df[id_col].to_numpy(), df[geom_col].to_numpy(), cell_m=cell_m)
+
+    def __len__(self):
+        return self.n_indexed
+
+    def _cells(self, x, y):
+        ix = np.floor(np.asarray(x) / self.cell_m).astype(np.int64)
+        iy = np.floor(np.asarray(y) / self.cell_m).astype(np.int64)
+        return ix, iy
+
+    @staticmethod
+    def _cell_keys(ix, iy):
+        # Lambert-93 : x, y < 10^7 m, donc ix, iy < 2^24 pour des cellules >= 1 m
+        return ix * (1 << 24) + iy
+
+    def query(self, lat, lon, buffer_m, batch_size=4096):
+        """
+        Tous les aménagements à moins de `buffer_m` de chaque point.
+
+        Retourne (point_idx, amen_idx, distance_m) : une ligne par paire
+        (point, aménagement), avec la distance minimale au tracé.
+        """
+        x, y = to_lambert93(lon, lat)
+        x, y = np.atleast_1d(x), np.atleast_1d(y)
+        ring = int(np.ceil(buffer_m / self.cell_m))
+
+        out_p, out_a, out_d = [], [], []
+        for start in range(0, len(x), batch_size):
+            p, a, d = self._query_batch(x[start:start + batch_size], y[start:start + batch_size], buffer_m, ring)
+            out_p.append(p + start)
+            out_a.append(a)
+            out_d.append(d)
+
+        if not out_p:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float64)
+        return np.concatenate(out_p), np.concatenate(out_a), np.concatenate(out_d)
+
+    def _query_batch(self, x, y, buffer_m, ring):
+        ix, iy = self._cells(x, y)
+        offsets = np.arange(-ring, ring + 1)
+        dx, dy = np.meshgrid(offsets, offsets, indexing="ij")
+
+        # (n_points × n_cellules_voisines) clés à chercher
+        keys = self._cell_keys(ix[:, None] + dx.ravel(), iy[:, None] + dy.ravel())
+        lo = np.searchsorted(self._keys, keys.ravel(), side="left")
+        hi = np.searchsorted(self._keys, keys.ravel(), side="right")
+        counts = hi - lo
+
+        # Expansion des plages [lo, hi) en paires (point, segment) candidates
+        total = counts.sum()
+        point_of_key = np.repeat(np.arange(len(x)), keys.shape[1])
+        cand_point = np.repeat(point_of_key, counts)
+        run_start = np.repeat(np.cumsum(counts) - counts, counts)
+        cand = np.repeat(lo, counts) + (np.arange(total) - run_start)
+
+        dist = point_segment_distance(
+            x[cand_point], y[cand_point], self._ax[cand], self._ay[cand], self._bx[cand], self._by[cand]
+        )
+        keep = dist <= buffer_m
+        cand_point, cand_owner, dist = cand_point[keep], self._owner[cand[keep]], dist[keep]
+
+        if len(dist) == 0:
+            return cand_point, cand_owner, dist
+
+        # Distance minimale par paire (point, aménagement)
+        order = np.lexsort((dist, cand_owner, cand_point))
+        cand_point, cand_owner, dist = cand_point[order], cand_owner[order], dist[order]
+        first = np.ones(len(dist), dtype=bool)
+        first[1:] = (cand_point[1:] != cand_point[:-1]) | (cand_owner[1:] != cand_owner[:-1])
+
+        return cand_point[first], cand_owner[first], dist[first]
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. TABLE GOLD
+# ═════════════════════════════════════════════════════════════
+
+def link_points(pdf_points, index, buffer_m):
+    """
+    Construit gold_link_amenagement_point pour un lot de points de mesure.
+
+    Poids = 1 / (distance + 1) (évite la division par 0).
+    """
+    p, a, d = index.query(pdf_points["lat"].to_numpy(), pdf_points["lon"].to_numpy(), buffer_m)
+
+    # Type "string" et non astype(str) : un id ou un type nul reste nul (pas "nan")
+    links = pd.DataFrame({
+        "amenagement_id": pd.Series(index.amenagement_ids[a]).astype("string"),
+        "point_id": pd.Series(pdf_points["point_id"].to_numpy()[p]).astype("string"),
+        "point_type": pd.Series(pdf_points["point_type"].to_numpy()[p]).astype("string"),
+        "distance_m": d.astype(float),
+    })
+    links["weight"] = 1 / (links["distance_m"] + 1)
+
+    return links[LINK_COLUMNS]
+
+
+def _point_day_matrices(pdf_measures, point_index):
+    """
+    Matrices denses (point × jour) des mesures des points liés :
+    somme des flux (NaN comptés 0) et nombre de lignes. Le nombre de lignes
+    sert de masque de validité : un point ne pèse un jour donné que s'il y
+    a été mesuré, autant de fois qu'il a de lignes (comme dans la jointure).
+    """
+    m = pdf_measures[["point_id", "date", "flux"]]
+    point = point_index.get_indexer(m["point_id"])
+    m = m[point >= 0]
+    point = point[point >= 0]
+    day, days = pd.factorize(m["date"], sort=True)
+
+    cell = point.astype(np.int64) * len(days) + day
+    shape = (len(point_index), len(days))
+    flux = np.nan_to_num(m["flux"].to_numpy(dtype=np.float64, na_value=np.nan))
+    total = np.bincount(cell, weights=flux, minlength=shape[0] * shape[1]).reshape(shape)
+    count = np.bincount(cell, minlength=shape[0] * shape[1]).reshape(shape)
+    return total, count, days
+
+
+def flow_daily(pdf_measures, links, block_cells=1 << 20):
+    """
+    gold_flow_amenagement_daily : flux estimé par aménagement et par jour,
+    moyenne pondérée des points liés, Σ(flux × weight) / Σ(weight).
+
+    pdf_measures : point_id, date, flux ; links : amenagement_id, point_id, weight.
+
+    Formulation matricielle, sans jointure mesures × liens (qui multiplie
+    les lignes par le nombre de liens de chaque point) :
+      - W : matrice creuse (aménagement × point) des poids, en CSR
+        (liens triés par aménagement, `bounds` = début de chaque ligne) ;
+      - F, C : flux et masque de présence (point × jour), denses ;
+      - flux_estime = (W · F) / (W · C), n_points = (W ≠ 0) · (C > 0).
+    Le produit CSR × dense se fait par `np.add.reduceat` sur des blocs de
+    lignes de W : au plus ~`block_cells` valeurs (liens × jours) en mémoire,
+    et seules les cellules non vides (aménagement, jour) sont conservées.
+    """
+    links = links[["amenagement_id", "point_id", "weight"]]
+    amenagement, amenagements = pd.factorize(links["amenagement_id"], sort=True)
+    points = pd.Index(links["point_id"].unique())
+    total, count, days = _point_day_matrices(pdf_measures, points)
+
+    # CSR : liens triés par aménagement
+    order = np.argsort(amenagement, kind="stable")
+    row = amenagement[order]
+    col = points.get_indexer(links["point_id"].to_numpy()[order])
+    weight = links["weight"].to_numpy(dtype=np.float64)[order]
+    bounds = np.r_[np.flatnonzero(np.r_[True, row[1:] != row[:-1]]), len(row)] if len(row) else np.zeros(1, int)
+
+    links_per_block = max(1, block_cells // max(len(days), 1))
+    parts = []
+    r0 = 0
+    while r0 < len(bounds) - 1:
+        r1 = max(r0 + 1, np.searchsorted(bounds, bounds[r0] + links_per_block, side="right") - 1)
+        lo, hi = bounds[r0], bounds[r1]
+        starts = bounds[r0:r1] - lo
+        w, c = weight[lo:hi, None], col[lo:hi]
+        present = count[c]
+        weighted = np.add.reduceat(w * total[c], starts, axis=0)
+        weights = np.add.reduceat(w * present, starts, axis=0)
+        n_points = np.add.reduceat(present > 0, starts, axis=0)
+
+        a, d = np.nonzero(n_points)
+        parts.append((a + r0, d, weighted[a, d] / weights[a, d], n_points[a, d]))
+        r0 = r1
+
+    a, d, flux, n = (np.concatenate(x) for x in zip(*parts)) if parts else ([], [], [], [])
+    flow = pd.DataFrame({
+        "amenagement_id": amenagements[a],
+        "date": days[d],
+        "flux_estime": np.round(flux, 2),
+        "n_points": np.asarray(n, dtype=np.int64),
+    })
+    return flow[FLOW_COLUMNS]
+
+
+def write_flow_partitions(flow, output_dir):
+    """
+    Écrit gold_flow_amenagement_daily en partitions `date=YYYY-MM-DD/part-0.parquet`
+    (amenagement_id, flux_estime, n_channels) ; retourne la liste des jours réécrits.
+
+    Seules les partitions dont le contenu a changé sont réécrites (empreinte
+    par jour dans _partitions.json) ; celles des jours disparus sont
+    supprimées. Une partition inchangée garde donc ses fichiers (taille,
+    mtime) : les consommateurs incrémentaux (src/scoring/pipeline.py,
+    src/scoring/flow_store.py) n'intègrent que les jours nouveaux ou modifiés.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, PARTITIONS_MANIFEST)
+    previous = load_manifest(manifest_path).get("partitions", {})
+
+    flow = flow.rename(columns={"n_points": "n_channels"})
+    flow = flow.assign(date=pd.to_datetime(flow["date"]).dt.strftime("%Y-%m-%d"))
+    flow = flow.sort_values(["date", "amenagement_id"], kind="stable")
+    groups = dict(tuple(flow.groupby("date", sort=False))) if len(flow) else {}
+
+    # Ancien format (un seul fichier à la racine) : remplacé par les partitions
+    legacy = os.path.join(output_dir, "part-0.parquet")
+    if os.path.exists(legacy):
+        os.remove(legacy)
+
+    partitions, rewritten = {}, []
+    for date, part in groups.items():
+        part = part[FLOW_PARTITION_COLUMNS].reset_index(drop=True)
+        digest = f"{len(part)}:{int(pd.util.hash_pandas_object(part, index=False).sum()):x}"
+        partitions[date] = digest
+        path = os.path.join(output_dir, f"date={date}")
+        if previous.get(date) == digest and os.path.isdir(path):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        tmp_path = os.path.join(path, ".part-0.parquet.tmp")
+        pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp_path)
+        os.replace(tmp_path, os.path.join(path, "part-0.parquet"))
+        rewritten.append(date)
+
+    for date in set(previous) - set(partitions):
+        shutil.rmtree(os.path.join(output_dir, f"date={date}"), ignore_errors=True)
+
+    save_manifest(manifest_path, {"partitions": partitions})
+    return sorted(rewritten)
+
+
+def unique_points(pdf_measures, backend=None):
+    """
+    Points de mesure uniques : pour chaque point_id, on garde la combinaison
+    (point_type, lat, lon) la plus fréquente.
+
+    Le comptage s'exécute sur le backend des mesures (pandas ou Spark, voir
+    src/common/backend.py) ; le résultat, une ligne par combinaison, est local.
+
+    Les clés NULL sont comptées (comme le groupBy Spark du notebook) ; une
+    combinaison avec coordonnées est préférée à une combinaison sans. Les
+    points sans aucune coordonnée ne peuvent pas être liés : ils sont
+    écartés explicitement et leur nombre est affiché.
+    """
+    counts = (
+        pdf_measures.groupby(["point_id", "point_type", "lat", "lon"], dropna=False)
+        .size()
+        .reset_index(name="count")
+    )
+    if backend is not None:
+        counts = backend.to_pandas(counts)
+    counts = counts[counts["point_id"].notna()]
+    counts = counts.assign(_located=counts["lat"].notna() & counts["lon"].notna())
+    counts = counts.sort_values(["point_id", "_located", "count"], ascending=[True, False, False], kind="stable")
+    points = counts.drop_duplicates("point_id")
+
+    unlocated = points.loc[~points["_located"], "point_id"]
+    if len(unlocated):
+        examples = ", ".join(map(str, unlocated.head(5)))
+        print(f"⚠️ {len(unlocated)} point(s) de mesure sans coordonnées, non liés ({examples})")
+    points = points[points["_located"]]
+    return points[["point_id", "point_type", "lat", "lon"]].reset_index(drop=True)
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Liaison points de mesure ↔ aménagements")
+    parser.add_argument("--buffer-m", type=float, default=100.0)
+    parser.add_argument("--silver-dir", default=str(PROJECT_ROOT / config["paths"]["silver_dir"]))
+    parser.add_argument("--gold-dir", default=str(PROJECT_ROOT / config["paths"]["gold_dir"]))
+    parser.add_argument("--backend", default=None, help="local, spark ou auto (lecture des mesures)")
+    args = parser.parse_args()
+
+    measures_path = f"{args.silver_dir}/silver_measures_union2_compact"
+    backend = get_backend(args.backend, inputs=[measures_path], app_name="Velomenaj_Linking")
+
+    with RunReport("linking") as report:
+        amenagements_path = f"{args.silver_dir}/silver_amenagements_with_coordinates"
+
+        with report.stage("points", backend) as st:
+            st.read(amenagements_path, measures_path)
+            amenagements = pq.read_table(amenagements_path, columns=["amenagement_id", "geometry"])
+            measures = backend.read_parquet(measures_path, columns=["point_id", "point_type", "lat", "lon"])
+            pdf_points = unique_points(measures, backend)
+            st.rows_out = len(pdf_points)
+            backend.stop()
+
+        with report.stage("index") as st:
+            st.rows_in = amenagements.num_rows
+            index = AmenagementIndex.from_dataframe(amenagements, cell_m=args.buffer_m)
+            st.rows_out = len(index)
+            st.add(cell_m=index.cell_m)
+
+        with report.stage("link") as st:
+            st.rows_in = len(pdf_points)
+            gold_link_pdf = link_points(pdf_points, index, args.buffer_m)
+
+            link_path = f"{args.gold_dir}/gold_link_amenagement_point"
+            os.makedirs(link_path, exist_ok=True)
+            gold_link_pdf.to_parquet(f"{link_path}/part-0.parquet", index=False)
+            st.wrote(link_path)
+
+    print(f"✓ Saved gold_link_amenagement_point to {link_path} → {report.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Module: Cube d'usage heure × jour de semaine × mois (pendulaire / loisir)
+────────────────────────────────────────────────────────────────────────
+silver_measures garde l'heure de chaque mesure, mais silver_measures_daily_clean
+et les tables union ne gardent que des sommes journalières : le "Score de
+Fiabilité" (usage pendulaire vs loisir) n'était approché que par un
+coefficient de variation journalier. Ce module agrège une fois les mesures
+infra-journalières dans un cube compact, puis en tire des indicateurs de
+profil horaire.
+
+Principe:
+  - Cube : pour chaque site de comptage (point_id des tables union, channels
+    vélo regroupés comme dans union_auto), chaque mois, chaque jour de la
+    semaine (0 = lundi) et chaque heure : somme du flux et nombre de jours
+    observés. Au plus 7 × 24 lignes par site et par mois :
+        gold_usage_cube/month=YYYY-MM/part-0.parquet
+  - Incrémental, comme la compaction : un manifeste garde l'empreinte
+    (taille, mtime) des fichiers de silver_measures de chaque mois ; seuls
+    les mois modifiés sont réagrégés. Un changement de silver_channels
+    (sites, channels vélo) relance l'agrégation complète.
+  - Indicateurs par site, calculés sur le cube (jamais sur les mesures) :
+      weekday_hourly / weekend_hourly : flux moyen par heure d'un jour
+                                 ouvré / de week-end observé (24 valeurs)
+      weekday_daily, weekend_daily : flux journalier moyen
+      weekend_ratio            : weekend_daily / weekday_daily
+      peak_ratio               : heures de pointe (PEAK_HOURS) / milieu de
+                                 journée (MIDDAY_HOURS), jours ouvrés
+      peak_share               : part du flux ouvré dans les heures de pointe
+      profile_stability        : similarité cosinus moyenne entre le profil
+                                 ouvré de chaque mois et le profil global
+                                 (régularité, 1 = même forme chaque mois)
+      profile                  : Pendulaire (peak_ratio >= 1.5 et
+                                 weekend_ratio < 0.8), Loisir
+                                 (weekend_ratio >= 1.0), sinon Mixte ; nul
+                                 sous MIN_WEEKDAYS jours ouvrés observés
+  - Par aménagement : moyenne des indicateurs des points liés, pondérée par
+    `weight` de gold_link_amenagement_point (entrée du scoring et de la
+    prédiction).
+
+Input:
+  - data/silver/silver_measures/ (partitionné par date)
+  - data/silver/silver_channels/
+  - data/gold/gold_link_amenagement_point/ (optionnel)
+
+Output:
+  - data/gold/gold_usage_cube/month=YYYY-MM/part-0.parquet (+ _cube_manifest.json)
+  - data/gold/gold_usage_profile/part-0.parquet (1 ligne par site)
+  - data/gold/gold_usage_profile_amenagement/part-0.parquet (1 ligne par aménagement)
+  - data/_runs/<run_id>/usage_cube.json (rapport d'exécution)
+
+Usage:
+  python -m src.spatial_usage.usage_cube [--full] [--since 2022-01]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.contracts import enforce
+from src.common.telemetry import RunReport
+from src.ingestion_silver.compaction import month_files
+from src.ingestion_silver.pipeline import load_manifest, save_manifest
+from src.scoring.checks import GOLD_CONTRACTS
+
+MANIFEST_NAME = "_cube_manifest.json"
+SOURCE_NAME = "silver_measures"
+
+PEAK_HOURS = [7, 8, 17, 18]
+MIDDAY_HOURS = [10, 11, 12, 13, 14, 15]
+WEEKEND_DOW = 5  # samedi, dimanche : dow >= 5
+MIN_WEEKDAYS = 20
+MIN_MONTH_WEEKDAYS = 8
+COMMUTE_PEAK_RATIO = 1.5
+COMMUTE_WEEKEND_RATIO = 0.8
+LEISURE_WEEKEND_RATIO = 1.0
+
+CUBE_SCHEMA = pa.schema([
+    ("point_id", pa.string()),
+    ("dow", pa.int8()),
+    ("hour", pa.int8()),
+    ("flux", pa.int64()),
+    ("n_days", pa.int32()),
+])
+FEATURE_COLUMNS = ["weekday_daily", "weekend_daily", "weekend_ratio", "peak_ratio", "peak_share",
+                   "profile_stability"]
+
+
+# ═════════════════════════════════════════════════════════════
+# 1. AGRÉGATION D'UN MOIS
+# ═════════════════════════════════════════════════════════════
+
+def bike_sites(channels_path):
+    """Series channel_id → site_id des channels vélo (même sélection que union_auto)."""
+    channels = pd.read_parquet(channels_path, columns=["channel_id", "site_id", "is_bike_channel"])
+    bike = channels[channels["is_bike_channel"].fillna(False).astype(bool)].dropna(subset=["channel_id", "site_id"])
+    return pd.Series(bike["site_id"].astype(str).to_numpy(), index=bike["channel_id"].astype(str).to_numpy())
+
+
+def month_cube(src_dir, files, sites):
+    """Lignes CUBE_SCHEMA d'un mois : (site, jour de semaine, heure) → flux, jours observés."""
+    dataset = ds.dataset(
+        [os.path.join(src_dir, rel) for rel in sorted(files)],
+        format="parquet",
+        partitioning=ds.partitioning(flavor="hive"),
+        partition_base_dir=str(src_dir),
+    )
+    valid = ds.field("is_valid") & ds.field("flux").is_valid() & ds.field("hour").is_valid()
+    pdf = dataset.to_table(columns=["channel_id", "date", "hour", "flux"], filter=valid).to_pandas()
+
+    pdf["point_id"] = pdf["channel_id"].astype(str).map(sites)
+    pdf = pdf[pdf["point_id"].notna()]
+    pdf["date"] = pdf["date"].astype(str)
+
+    # Somme par (site, jour, heure) d'abord : un jour observé compte une fois par heure
+    hourly = pdf.groupby(["point_id", "date", "hour"], as_index=False, observed=True)["flux"].sum()
+    hourly["dow"] = pd.to_datetime(hourly["date"]).dt.dayofweek
+    cube = (
+        hourly.groupby(["point_id", "dow", "hour"], as_index=False, observed=True)
+        .agg(flux=("flux", "sum"), n_days=("date", "size"))
+        .sort_values(["point_id", "dow", "hour"])
+    )
+    return pa.Table.from_pandas(cube, schema=CUBE_SCHEMA, preserve_index=False)
+
+
+def _month_dir(cube_dir, month):
+    return os.path.join(cube_dir, f"month={month}")
+
+
+def _channels_fingerprint(channels_path):
+    out = {}
+    for root, _, names in os.walk(channels_path):
+        for name in sorted(n for n in names if n.endswith(".parquet")):
+            stat = os.stat(os.path.join(root, name))
+            out[os.path.relpath(os.path.join(root, name), channels_path)] = [stat.st_size, stat.st_mtime_ns]
+    return out
+
+
+def update_cube(measures_dir, channels_path, cube_dir, full=False, metrics=None):
+    """Met le cube à jour ; retourne la liste des mois réagrégés."""
+    manifest_path = os.path.join(cube_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    state = {} if full else manifest["sources"].get(SOURCE_NAME, {})
+    done = dict(state.get("months", {}))
+    channels_fp = _channels_fingerprint(channels_path)
+    if done and state.get("channels") != channels_fp:
+        print("⚠️ silver_channels modifiée → réagrégation complète")
+        done = {}
+
+    current = month_files(measures_dir)
+    changed = sorted(m for m in current if done.get(m) != current[m])
+    removed = sorted(m for m in done if m not in current)
+    print(f"✓ {measures_dir}: {len(current):,} mois, {len(changed):,} à réagréger, {len(removed):,} à supprimer")
+
+    os.makedirs(cube_dir, exist_ok=True)
+    for month in removed:
+        shutil.rmtree(_month_dir(cube_dir, month), ignore_errors=True)
+        done.pop(month, None)
+
+    sites = bike_sites(channels_path) if changed else None
+    for month in changed:
+        table = month_cube(measures_dir, current[month], sites)
+        path = _month_dir(cube_dir, month)
+        shutil.rmtree(f"{path}.tmp", ignore_errors=True)
+        os.makedirs(f"{path}.tmp")
+        pq.write_table(table, os.path.join(f"{path}.tmp", "part-0.parquet"))
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(f"{path}.tmp", path)
+
+        # Manifeste mis à jour après chaque mois : une exécution interrompue reprend là
+        done[month] = current[month]
+        manifest["sources"][SOURCE_NAME] = {**state, "channels": channels_fp, "months": done}
+        save_manifest(manifest_path, manifest)
+        if metrics is not None:
+            metrics.rows_out = (metrics.rows_out or 0) + table.num_rows
+
+    manifest["sources"][SOURCE_NAME] = {
+        "source": str(measures_dir),
+        "channels": channels_fp,
+        "months": done,
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    save_manifest(manifest_path, manifest)
+    return changed
+
+
+# ═════════════════════════════════════════════════════════════
+# 2. INDICATEURS PAR SITE (DEPUIS LE CUBE)
+# ═════════════════════════════════════════════════════════════
+
+def read_cube(cube_dir, since=None):
+    """Table du cube (+ colonne month), éventuellement à partir d'un mois "YYYY-MM"."""
+    dataset = ds.dataset(str(cube_dir), format="parquet", partitioning="hive")
+    return dataset.to_table(filter=None if since is None else ds.field("month") >= since)
+
+
+def profile_labels(weekend_ratio, peak_ratio, enough):
+    label = np.where((peak_ratio >= COMMUTE_PEAK_RATIO) & (weekend_ratio < COMMUTE_WEEKEND_RATIO), "Pendulaire",
+                     np.where(weekend_ratio >= LEISURE_WEEKEND_RATIO, "Loisir", "Mixte")).astype(object)
+    label[~enough] = None
+    return label
+
+
+def point_profiles(cube):
+    """Une ligne par site : profils horaires (24 valeurs) et indicateurs FEATURE_COLUMNS."""
+    point_id = cube.column("point_id").to_numpy(zero_copy_only=False).astype(str)
+    points, p = np.unique(point_id, return_inverse=True)
+    months, m = np.unique(cube.column("month").to_numpy(zero_copy_only=False).astype(str), return_inverse=True)
+    dow = cube.column("dow").to_numpy().astype(np.int64)
+    hour = cube.column("hour").to_numpy().astype(np.int64)
+    flux = cube.column("flux").to_numpy().astype(np.float64)
+    days = cube.column("n_days").to_numpy().astype(np.float64)
+    n_p, n_m = len(points), len(months)
+
+    # (site, week-end ?, heure) et (site, mois, heure) des jours ouvrés
+    weekend = (dow >= WEEKEND_DOW).astype(np.int64)
+    idx = (p * 2 + weekend) * 24 + hour
+    sums = np.bincount(idx, weights=flux, minlength=n_p * 48).reshape(n_p, 2, 24)
+    counts = np.bincount(idx, weights=days, minlength=n_p * 48).reshape(n_p, 2, 24)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hourly = np.where(counts > 0, sums / counts, np.nan)
+        wd, we = hourly[:, 0], hourly[:, 1]
+        weekday_daily = np.where(np.isnan(wd).all(axis=1), np.nan, np.nansum(wd, axis=1))
+        weekend_daily = np.where(np.isnan(we).all(axis=1), np.nan, np.nansum(we, axis=1))
+        weekend_ratio = weekend_daily / np.where(weekday_daily > 0, weekday_daily, np.nan)
+        midday = np.nanmean(wd[:, MIDDAY_HOURS], axis=1)
+        peak_ratio = np.nanmean(wd[:, PEAK_HOURS], axis=1) / np.where(midday > 0, midday, np.nan)
+        peak_share = np.nansum(wd[:, PEAK_HOURS], axis=1) / np.where(weekday_daily > 0, weekday_daily, np.nan)
+
+        # Régularité : forme du profil ouvré de chaque mois vs profil global
+        wd_rows = weekend == 0
+        midx = (p[wd_rows] * n_m + m[wd_rows]) * 24 + hour[wd_rows]
+        m_sums = np.bincount(midx, weights=flux[wd_rows], minlength=n_p * n_m * 24).reshape(n_p, n_m, 24)
+        m_days = np.bincount(midx, weights=days[wd_rows], minlength=n_p * n_m * 24).reshape(n_p, n_m, 24)
+        m_profile = np.where(m_days > 0, m_sums / m_days, 0.0)
+        ref = np.nan_to_num(wd)[:, None, :]
+        cosine = (m_profile * ref).sum(axis=2) / (np.linalg.norm(m_profile, axis=2) * np.linalg.norm(ref, axis=2))
+        usable = (m_days.max(axis=2) >= MIN_MONTH_WEEKDAYS) & np.isfinite(cosine)
+        n_usable = usable.sum(axis=1)
+        stability = np.where(n_usable > 0, np.where(usable, cosine, 0.0).sum(axis=1) / n_usable, np.nan)
+
+    # Jours observés : heure la mieux couverte
+    n_weekdays = counts[:, 0].max(axis=1).astype(np.int64)
+    n_weekend_days = counts[:, 1].max(axis=1).astype(np.int64)
+    enough = (n_weekdays >= MIN_WEEKDAYS) & np.isfinite(weekend_ratio) & np.isfinite(peak_ratio)
+
+    return pd.DataFrame({
+        "point_id": points,
+        "n_weekdays": n_weekdays,
+        "n_weekend_days": n_weekend_days,
+        "weekday_daily": np.round(weekday_daily, 2),
+        "weekend_daily": np.round(weekend_daily, 2),
+        "weekend_ratio": np.round(weekend_ratio, 4),
+        "peak_ratio": np.round(peak_ratio, 4),
+        "peak_share": np.round(peak_share, 4),
+        "profile_stability": np.round(stability, 4),
+        "profile": profile_labels(weekend_ratio, peak_ratio, enough),
+        "weekday_hourly": list(np.round(wd, 2).astype(np.float32)),
+        "weekend_hourly": list(np.round(we, 2).astype(np.float32)),
+    })
+
+
+def amenagement_profiles(profiles, links):
+    """Indicateurs par aménagement : moyenne pondérée (weight du lien) des sites liés qui ont un profil."""
+    pairs = links[["amenagement_id", "point_id", "weight"]].astype({"point_id": str}).merge(
+        profiles[profiles["profile"].notna()][["point_id"] + FEATURE_COLUMNS], on="point_id")
+    out = pd.DataFrame({"amenagement_id": pd.unique(pairs["amenagement_id"])})
+    grouped = pairs.groupby("amenagement_id", sort=False)
+    out["n_points"] = grouped.size().reindex(out["amenagement_id"]).to_numpy()
+    for col in FEATURE_COLUMNS:
+        w = pairs["weight"].where(pairs[col].notna(), 0.0)
+        num = (pairs[col].fillna(0.0) * w).groupby(pairs["amenagement_id"], sort=False).sum()
+        den = w.groupby(pairs["amenagement_id"], sort=False).sum()
+        out[col] = np.round((num / den.where(den > 0)).reindex(out["amenagement_id"]).to_numpy(), 4)
+    enough = np.isfinite(out["weekend_ratio"].to_numpy()) & np.isfinite(out["peak_ratio"].to_numpy())
+    out["profile"] = profile_labels(out["weekend_ratio"].to_numpy(), out["peak_ratio"].to_numpy(), enough)
+    return out.sort_values("amenagement_id").reset_index(drop=True)
+
+
+def _write_table(pdf, output_dir, contract=None):
+    table = pa.Table.from_pandas(pdf, preserve_index=False)
+    if contract is not None:
+        enforce([(contract, table)])
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, "part-0.parquet")
+    pq.write_table(table, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def main():
+    with open(PROJECT_ROOT / "config" / "config.yml") as f:
+        config = yaml.safe_load(f)
+    silver_dir = PROJECT_ROOT / config["paths"]["silver_dir"]
+    gold_dir = PROJECT_ROOT / config["paths"]["gold_dir"]
+
+    parser = argparse.ArgumentParser(description="Cube d'usage heure × jour × mois et profils pendulaire / loisir")
+    parser.add_argument("--measures", default=str(silver_dir / "silver_measures"))
+    parser.add_argument("--channels", default=str(silver_dir / "silver_channels"))
+    parser.add_argument("--links", default=str(gold_dir / "gold_link_amenagement_point"))
+    parser.add_argument("--gold-dir", default=str(gold_dir))
+    parser.add_argument("--since", default=None, help="profils calculés à partir de ce mois (YYYY-MM)")
+    parser.add_argument("--full", action="store_true", help="ignorer le manifeste et tout réagréger")
+    args = parser.parse_args()
+
+    cube_dir = os.path.join(args.gold_dir, "gold_usage_cube")
+    with RunReport("usage_cube") as report:
+        with report.stage("cube") as st:
+            st.read(args.measures, args.channels)
+            months = update_cube(args.measures, args.channels, cube_dir, full=args.full, metrics=st)
+            st.add(months_rewritten=len(months))
+
+        with report.stage("profiles") as st:
+            st.read(cube_dir)
+            cube = read_cube(cube_dir, args.since)
+            st.rows_in = cube.num_rows
+            profiles = point_profiles(cube)
+            st.wrote(_write_table(profiles, os.path.join(args.gold_dir, "gold_usage_profile"),
+                                  GOLD_CONTRACTS["gold_usage_profile"]), rows=len(profiles))
+            st.add(**{f"profile_{k}": int(v) for k, v in profiles["profile"].value_counts().items()})
+
+            if os.path.exists(args.links):
+                st.read(args.links)
+                links = pd.read_parquet(args.links, columns=["amenagement_id", "point_id", "weight"])
+                per_amenagement = amenagement_profiles(profiles, links)
+                st.wrote(_write_table(per_amenagement, os.path.join(args.gold_dir, "gold_usage_profile_amenagement")),
+                         rows=len(per_amenagement))
+            else:
+                print(f"⚠️ {args.links} absente : pas d'indicateurs par aménagement")
+
+    print(f"✅ Cube : {len(months):,} mois réagrégés ; profils : {len(profiles):,} sites "
+          f"({profiles['profile'].notna().sum():,} classés)")
+
+
+if __name__ == "__main__":
+    main()
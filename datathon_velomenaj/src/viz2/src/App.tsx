@@ -7,6 +7,7 @@ import { Label } from "@/components/ui/label";
 import infraData from "@/data/infra.json";
 import type { InfraData, ScoreEntry, ScoreMap } from "@/lib/types";
 import { createScoreMap } from "@/lib/types";
+import { yearScoresUrl } from "@/lib/api";
 import "leaflet/dist/leaflet.css";
 
 const typedInfraData = infraData as unknown as InfraData;
@@ -21,7 +22,7 @@ const maxYear = Math.max(...years);
 // Fetch score data using fetch API
 async function loadScoreData(year: number): Promise<ScoreMap> {
     try {
-        const response = await fetch(`/src/data/${year}.json`);
+        const response = await fetch(yearScoresUrl(year));
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
@@ -1,14 +1,10 @@
 import L from "leaflet";
-import { useMemo } from "react";
+import { useEffect, useMemo, useState } from "react";
 import { Marker } from "react-leaflet";
 import { Badge } from "@/components/ui/badge";
 import { MapPopupCard } from "./MapPopupCard";
 import type { ComptageFeature, LatLngTuple } from "@/lib/types";
-import veloParAnnee from "@/data/velo_par_annee.json";
-
-type VeloParAnneeData = Record<string, Record<string, number>>;
-
-const typedVeloParAnnee = veloParAnnee as VeloParAnneeData;
+import { loadCounterTotals, type CounterTotals } from "@/lib/api";
 
 const getHueFromData = (value: number, max: number) => {
     // 0 -> 140 (red), value == max -> 240 (green)
@@ -79,9 +75,17 @@ export function CountingLocationsLayer({
     selectedYear,
 }: CountingLocationsLayerProps) {
     // Get the data for the selected year
-    const yearData = useMemo(() => {
-        const yearKey = String(selectedYear);
-        return typedVeloParAnnee[yearKey] || {};
+    const [yearData, setYearData] = useState<CounterTotals>({});
+    useEffect(() => {
+        let cancelled = false;
+        loadCounterTotals(selectedYear)
+            .catch((): CounterTotals => ({}))
+            .then((data) => {
+                if (!cancelled) setYearData(data);
+            });
+        return () => {
+            cancelled = true;
+        };
     }, [selectedYear]);
 
     // Calculate the average for the year
@@ -0,0 +1,26 @@
+/**
+ * Service de requêtes local (src/serving/server.py)
+ *
+ * Avec VITE_API_URL (ex. `VITE_API_URL=http://127.0.0.1:8765 npm run dev`),
+ * les scores annuels et les totaux des compteurs sont demandés au service,
+ * année par année ; sinon les fichiers de src/data sont utilisés (chargés à
+ * la demande, hors du bundle principal) : scores/<année>.json et
+ * velo_par_annee.json, écrits par src/export/yearly_export.py.
+ */
+
+export type CounterTotals = Record<string, number>;
+
+export const API_URL: string | undefined = import.meta.env.VITE_API_URL;
+
+export function yearScoresUrl(year: number): string {
+    return API_URL ? `${API_URL}/scores/year/${year}` : `/src/data/scores/${year}.json`;
+}
+
+export async function loadCounterTotals(year: number): Promise<CounterTotals> {
+    if (API_URL) {
+        const response = await fetch(`${API_URL}/counters/${year}`);
+        return response.ok ? response.json() : {};
+    }
+    const { default: veloParAnnee } = await import("@/data/velo_par_annee.json");
+    return (veloParAnnee as Record<string, CounterTotals>)[String(year)] ?? {};
+}
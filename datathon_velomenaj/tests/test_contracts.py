@@ -0,0 +1,123 @@
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.common.contracts import (
+    WARN, Allowed, Contract, ContractViolation, ForeignKey, InRange, NotNull, Unique, enforce, validate,
+)
+from src.ingestion_silver.checks import SILVER_CONTRACTS
+from src.scoring.checks import GOLD_CONTRACTS
+
+
+def _write_partitions(table_dir, pdf):
+    for date, part in pdf.groupby("date"):
+        path = os.path.join(table_dir, f"date={date}")
+        os.makedirs(path)
+        pq.write_table(pa.Table.from_pandas(part.drop(columns="date"), preserve_index=False),
+                       os.path.join(path, "part-0.parquet"))
+
+
+def _rules(report):
+    return {v["rule"]: v for v in report.violations}
+
+
+def test_clean_table_passes():
+    flow = pd.DataFrame({
+        "amenagement_id": ["a", "a", "b"],
+        "date": ["2024-01-01", "2024-01-02", "2024-01-01"],
+        "flux_estime": [10.0, 0.0, 3.5],
+        "n_channels": [1, 2, 1],
+    })
+    report = validate(GOLD_CONTRACTS["gold_flow_amenagement_daily"], flow)
+    assert report.ok
+    assert report.rows == 3
+    assert report.violations == []
+
+
+def test_not_null_and_range_count_rows():
+    contract = Contract("t", rules=[NotNull("id"), InRange("flux", min=0, max=100)])
+    table = pa.table({"id": ["x", None, "z", None], "flux": [-1, 5, 101, None]})
+    report = validate(contract, table)
+    rules = _rules(report)
+    assert rules["not_null(id)"]["count"] == 2
+    # Un flux nul n'est pas hors bornes
+    assert rules["in_range(flux, 0, 100)"]["count"] == 2
+    assert [e["flux"] for e in rules["in_range(flux, 0, 100)"]["examples"]] == [-1, 101]
+    assert not report.ok
+
+
+def test_unique_spans_batches():
+    contract = Contract("t", rules=[Unique(["id", "date"])])
+    table = pa.table({"id": ["a", "b", "a", "a"], "date": ["d1", "d1", "d1", "d2"]})
+    report = validate(contract, table, batch_size=1)
+    assert report.batches == 4
+    violation = _rules(report)["unique(id, date)"]
+    assert violation["count"] == 1
+    assert violation["examples"] == [{"id": "a", "date": "d1", "count_all": 2}]
+
+
+def test_foreign_key_and_allowed(tmp_path):
+    pq.write_table(pa.table({"site_id": [1, 2]}), tmp_path / "sites.parquet")
+    contract = Contract("t", rules=[
+        ForeignKey("site_id", str(tmp_path / "sites.parquet")),
+        Allowed("kind", ["auto", "manual"]),
+    ])
+    table = pa.table({"site_id": ["1", "3", None], "kind": ["auto", "other", None]})
+    rules = _rules(validate(contract, table, base_dir=str(tmp_path)))
+    assert rules[f"foreign_key(site_id → {tmp_path / 'sites.parquet'}.site_id)"]["count"] == 1
+    assert rules["allowed(kind)"]["count"] == 1
+
+
+def test_missing_column_and_wrong_type():
+    table = pa.table({"amenagement_id": [1], "date": ["2024-01-01"], "flux_estime": [1.0]})
+    rules = _rules(validate(GOLD_CONTRACTS["gold_flow_amenagement_daily"], table))
+    assert rules["column(n_channels)"]["detail"] == "colonne absente"
+    assert "type(amenagement_id)" in rules
+    # Les règles sur une colonne absente sont ignorées, pas en erreur
+    assert "in_range(n_channels, 1, None)" not in rules
+
+
+def test_warn_does_not_fail():
+    contract = Contract("t", rules=[InRange("flux", min=0, severity=WARN)])
+    report = validate(contract, pa.table({"flux": [-3]}))
+    assert report.ok
+    assert report.violations[0]["severity"] == WARN
+
+
+def test_gate_on_rewritten_partitions(tmp_path):
+    silver = tmp_path / "silver"
+    os.makedirs(silver / "silver_channels")
+    pq.write_table(pa.table({"channel_id": ["c1"], "site_id": ["s1"]}),
+                   silver / "silver_channels" / "part-0.parquet")
+
+    daily = pd.DataFrame({
+        "channel_id": ["c1", "c1", "c9"],
+        "date": ["2024-01-01", "2024-01-02", "2024-01-03"],
+        "flux": [4, 5, 6],
+        "is_valid": True,
+    })
+    _write_partitions(silver / "silver_measures_daily_clean", daily)
+    contract = SILVER_CONTRACTS["silver_measures_daily_clean"]
+    source = str(silver / "silver_measures_daily_clean")
+
+    # Seules les partitions filtrées sont lues : le channel inconnu du 03 n'est pas vu
+    reports = enforce([(contract, source)], base_dir=str(silver),
+                      filter=ds.field("date").isin(["2024-01-01", "2024-01-02"]))
+    assert reports[0].rows == 2
+
+    with pytest.raises(ContractViolation) as excinfo:
+        enforce([(contract, source)], base_dir=str(silver))
+    report = excinfo.value.reports[0]
+    assert _rules(report)["foreign_key(channel_id → silver_channels.channel_id)"]["examples"] == [
+        {"channel_id": "c9", "date": "2024-01-03"}
+    ]
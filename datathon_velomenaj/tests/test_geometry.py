@@ -0,0 +1,67 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.export.geojson_writer import write_geojson
+from src.ingestion_silver.amenagement_geometry import GEOMETRY_SCHEMA, geometry_batch
+
+
+def _line(gid, coords):
+    return {"properties": {"gid": gid}, "geometry": {"type": "LineString", "coordinates": coords}}
+
+
+def test_batch_without_segments():
+    # Aucune ligne d'au moins deux sommets dans le lot : longueurs NaN, pas d'erreur
+    batch = geometry_batch([
+        {"properties": {"gid": 1}, "geometry": {"type": "Point", "coordinates": [4.83, 45.76]}},
+        {"properties": {"gid": 2}, "geometry": None},
+    ])
+    assert batch.schema == GEOMETRY_SCHEMA
+    assert batch.column("length_geom_m").to_pylist() == [None, None]
+    assert batch.column("n_vertices").to_pylist() == [0, 0]
+
+
+def test_batch_mixed_with_single_vertex_line():
+    batch = geometry_batch([
+        _line(1, [[4.83, 45.76]]),
+        _line(2, [[4.83, 45.76], [4.84, 45.76]]),
+    ])
+    length = batch.column("length_geom_m").to_pylist()
+    assert length[0] == 0.0
+    assert 700 < length[1] < 850
+
+
+def _strict_load(path):
+    # json.loads accepte NaN / Infinity par défaut : on les refuse comme un client JS
+    def reject(constant):
+        raise ValueError(f"constante JSON invalide : {constant}")
+    with open(path, encoding="utf-8") as f:
+        return json.loads(f.read(), parse_constant=reject)
+
+
+def test_geojson_drops_non_finite_coordinates(tmp_path):
+    lines = pa.table({
+        "id": [1, 2, 3, 4],
+        "geometry": pa.array([
+            [[4.83, 45.76], [4.84, 45.76]],
+            [[4.83, float("nan")], [4.84, 45.76]],
+            [[4.83, 45.76], [float("inf"), 45.76]],
+            [[4.85, 45.77], [4.86, 45.77]],
+        ]),
+    })
+    path = tmp_path / "lines.geojson"
+    assert write_geojson(lines, str(path), properties=["id"], geometry_col="geometry", precision=6) == 2
+    assert [f["properties"]["id"] for f in _strict_load(path)["features"]] == [1, 4]
+
+    points = pd.DataFrame({"id": [1, 2, 3], "lat": [45.76, np.nan, 45.76], "lon": [4.83, 4.83, -np.inf]})
+    path = tmp_path / "points.geojson"
+    assert write_geojson(points, str(path), properties=["id"]) == 1
+    assert [f["properties"]["id"] for f in _strict_load(path)["features"]] == [1]
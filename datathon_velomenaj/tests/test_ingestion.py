@@ -0,0 +1,78 @@
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.ingestion_silver.pipeline import MANUAL_UNION, run
+
+
+def _silver(tmp_path):
+    silver = tmp_path / "silver"
+    silver.mkdir()
+    pd.DataFrame({
+        "channel_id": ["c1", "c2"], "site_id": ["s1", "s2"], "is_bike_channel": [True, True],
+    }).to_parquet(silver / "silver_channels")
+    # s2 sans coordonnées : gardé dans l'union, comme le groupBy Spark
+    pd.DataFrame({"site_id": ["s1", "s2"], "lat": [45.7, None], "lon": [4.8, None]}).to_parquet(silver / "silver_sites")
+    manual = silver / MANUAL_UNION / "date=2024-01-02"
+    manual.mkdir(parents=True)
+    pq.write_table(pa.Table.from_pandas(pd.DataFrame({
+        "point_id": ["900000001"], "point_type": ["manual"], "flux": pd.array([12], dtype="int32"),
+        "lat": [45.77], "lon": [4.83], "direction": [None], "vehicule_type": ["vélo"],
+    }), preserve_index=False), manual / "part-0.parquet")
+    return silver
+
+
+def _write_csv(path, rows):
+    pd.DataFrame(rows, columns=["channel_id", "start_datetime", "end_datetime", "count"]).to_csv(path, index=False)
+
+
+def _mtimes(table_dir):
+    return {d: os.stat(os.path.join(table_dir, d, "part-0.parquet")).st_mtime_ns for d in sorted(os.listdir(table_dir))}
+
+
+def _union(silver):
+    return ds.dataset(str(silver / "silver_measures_union"), partitioning="hive").to_table().to_pandas()
+
+
+def test_late_row_rewrites_only_its_partitions(tmp_path):
+    silver = _silver(tmp_path)
+    csv = tmp_path / "measures.csv"
+    rows = [
+        (ch, f"2024-01-0{d}T{h:02d}:00:00", f"2024-01-0{d}T{h:02d}:15:00", 5)
+        for ch in ("c1", "c2") for d in (1, 2, 3) for h in (8, 17)
+    ]
+    rows.append(("c1", "2026-01-01T08:00:00", "2026-01-01T08:15:00", 7))  # hors fenêtre daily_clean
+    _write_csv(csv, rows)
+
+    assert run(str(csv), str(silver)) == ["2024-01-01", "2024-01-02", "2024-01-03", "2026-01-01"]
+    daily = pd.read_parquet(silver / "silver_measures_daily_clean")
+    assert "2026-01-01" not in set(daily["date"].astype(str))
+    before = {t: _mtimes(silver / t) for t in ("silver_measures", "silver_measures_daily_clean", "silver_measures_union")}
+    union = _union(silver)
+    assert set(union["point_id"]) == {"s1", "s2", "900000001"}
+    assert union.loc[union["point_id"] == "s2", "lat"].isna().all()
+
+    # Ligne arrivée en retard pour le 02 : seules les partitions du 02 sont réécrites
+    _write_csv(csv, rows + [("c1", "2024-01-02T12:00:00", "2024-01-02T12:15:00", 3)])
+    assert run(str(csv), str(silver)) == ["2024-01-02"]
+    for table, mtimes in before.items():
+        after = _mtimes(silver / table)
+        assert after.keys() == mtimes.keys()
+        assert [d for d in after if after[d] != mtimes[d]] == ["date=2024-01-02"]
+
+    union = _union(silver)
+    day2 = union[union["date"].astype(str) == "2024-01-02"].set_index("point_id")
+    assert day2.loc["s1", "flux"] == 13
+    assert day2.loc["900000001", "point_type"] == "manual" and day2.loc["900000001", "flux"] == 12
+
+    # Rien de nouveau : aucune partition réécrite
+    assert run(str(csv), str(silver)) == []
@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.ingestion_silver.amenagement_geometry import geometry_batch
+from src.spatial_usage.linking import AmenagementIndex, link_points
+
+
+def test_link_points_keeps_null_keys():
+    # Un point_id ou point_type nul reste nul dans les liens (pas la chaîne "nan")
+    batch = geometry_batch([
+        {"properties": {"gid": 7}, "geometry": {"type": "LineString", "coordinates": [[4.83, 45.76], [4.84, 45.76]]}},
+    ])
+    index = AmenagementIndex.from_dataframe(pa.Table.from_batches([batch]), id_col="gid")
+    points = pd.DataFrame({
+        "point_id": ["a", None],
+        "point_type": [None, "auto"],
+        "lat": [45.7601, 45.7601],
+        "lon": [4.835, 4.836],
+    })
+
+    links = link_points(points, index, 100)
+    assert links["amenagement_id"].tolist() == ["7", "7"]
+    assert links["point_id"].isna().tolist() == [False, True]
+    assert links["point_type"].isna().tolist() == [True, False]
+    assert "nan" not in set(links["point_id"].dropna()) | set(links["point_type"].dropna())